@@ -0,0 +1,265 @@
+# [Description]:
+#   - Benchmark suite: reference workloads at several sizes measuring
+#     setup time (build + compile), steps per second and peak memory.
+#     Results are written to JSON and can be compared against a stored
+#     baseline to flag regressions
+#   - Usage:
+#         python -m msim.benchmark --output results.json
+#         python -m msim.benchmark --baseline results.json
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+import numpy as np
+
+import msim.lib     as mlib
+import msim.helpers as mhelp
+
+# -------------------------------------------------------------------------
+# Workloads
+# -------------------------------------------------------------------------
+# Every workload builds a Subsystem with a float inport 'u' and a float
+# outport 'y' (size: number of blocks/levels)
+
+def buildGainChain(aSize: int):
+    # [u]--->[Gain_0]--->...--->[Gain_n]--->[y]
+    sys1   = mlib.Subsystem('gainChain',None)
+    portH  = sys1.addInport('u',float)
+    y      = sys1.addOutport('y',float)
+    for i in range(aSize):
+        gain1 = sys1.addBlock(mlib.Gain('gain' + str(i),float,1.0001,sys1))
+        gain1.connectTo('u',portH)
+        portH = gain1.getOutport('y')
+    y.connectTo(portH)
+    return sys1
+
+def buildSumFanIn(aSize: int):
+    # [u]--->[Gain_i]--->[Sum(+...+)]--->[y]
+    sys1 = mlib.Subsystem('sumFanIn',None)
+    u    = sys1.addInport('u',float)
+    y    = sys1.addOutport('y',float)
+    sum1 = sys1.addBlock(mlib.Sum('sum1',float,'+' * aSize,sys1))
+    for i in range(aSize):
+        gain1 = sys1.addBlock(mlib.Gain('gain' + str(i),float,float(i),sys1))
+        gain1.connectTo('u',u)
+        sum1.connectTo('u' + str(i),gain1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+def buildIntegratorBank(aSize: int):
+    # [u]--->[Integrator_i]--->[Sum(+...+)]--->[y]
+    sys1 = mlib.Subsystem('integratorBank',None)
+    u    = sys1.addInport('u',float)
+    y    = sys1.addOutport('y',float)
+    ic1  = sys1.addBlock(mlib.Constant('ic1',float,0.0,sys1))
+    r1   = sys1.addBlock(mlib.Constant('r1',bool,False,sys1))
+    sum1 = sys1.addBlock(mlib.Sum('sum1',float,'+' * aSize,sys1))
+    for i in range(aSize):
+        int1 = sys1.addBlock(mlib.Integrator('int' + str(i),0.001 * (i + 1),sys1))
+        int1.connectTo('uDot',u)
+        int1.connectTo('r',r1.getOutport('y'))
+        int1.connectTo('IC',ic1.getOutport('y'))
+        sum1.connectTo('u' + str(i),int1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+def buildSwitchLogic(aSize: int):
+    # [u]--->[Relational(>thr_i)]--->[Switch_i(u, -u)]--->[Sum]--->[y]
+    sys1 = mlib.Subsystem('switchLogic',None)
+    u    = sys1.addInport('u',float)
+    y    = sys1.addOutport('y',float)
+    neg1 = sys1.addBlock(mlib.Gain('neg1',float,-1.0,sys1))
+    sum1 = sys1.addBlock(mlib.Sum('sum1',float,'+' * aSize,sys1))
+    neg1.connectTo('u',u)
+    for i in range(aSize):
+        thr1 = sys1.addBlock(mlib.Constant('thr' + str(i),float,i / aSize,sys1))
+        gt1  = sys1.addBlock(mlib.Relational('gt' + str(i),float,'>',sys1))
+        sw1  = sys1.addBlock(mlib.Switch('sw' + str(i),float,sys1))
+        gt1.connectTo('u0',u)
+        gt1.connectTo('u1',thr1.getOutport('y'))
+        sw1.connectTo('sw',gt1.getOutport('y'))
+        sw1.connectTo('on',u)
+        sw1.connectTo('off',neg1.getOutport('y'))
+        sum1.connectTo('u' + str(i),sw1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+def buildConnectChain(aSize: int):
+    # Nested subsystems, the innermost Gain reads its input through
+    # aSize inports connected with Port.connectTo
+    #   [u]--->[level_0: [u]--->[level_1: ... [Gain]]]--->[y]
+    root   = mlib.Subsystem('connectChain',None)
+    u      = root.addInport('u',float)
+    y      = root.addOutport('y',float)
+    parent = root
+    for i in range(aSize):
+        level = parent.addBlock(mlib.Subsystem('level' + str(i),parent))
+        level.addInport('u',float).connectTo(u)
+        u     = level.getInport('u')
+        parent = level
+    gain1 = parent.addBlock(mlib.Gain('gain1',float,2.0,parent))
+    gain1.connectTo('u',u)
+    y.connectTo(gain1.getOutport('y'))
+    return root
+
+WORKLOADS = {'gainChain':      buildGainChain,
+             'sumFanIn':       buildSumFanIn,
+             'integratorBank': buildIntegratorBank,
+             'switchLogic':    buildSwitchLogic,
+             'connectChain':   buildConnectChain}
+
+# -------------------------------------------------------------------------
+# Measurement
+# -------------------------------------------------------------------------
+
+def createSimIn(samplesNo: int) -> dict:
+    simIn = dict()
+    simIn['time'] = np.arange(samplesNo,dtype=float) * 0.001
+    simIn['u']    = np.sin(simIn['time'] * 10.0)
+    return simIn
+
+def runWorkload(aName: str, aSize: int, samplesNo: int = 1000,
+                repeatsNo: int = 3, **kwargs) -> dict:
+    # [Description]: Benchmark one workload
+    # [Inputs]:
+    #   - repeatsNo: Timed runs (the best one is reported)
+    #   - kwargs: Forwarded to helpers.run (e.g. vectorized=True)
+    # [Outputs]:
+    #   - result: Dictionary with setupTime [s], runTime [s],
+    #             stepsPerSecond and peakMemory [bytes] (setup + run)
+    simIn = createSimIn(samplesNo)
+
+    # Setup (build + compile):
+    tStart = time.perf_counter()
+    model  = WORKLOADS[aName](aSize)
+    model.compile()
+    setupTime = time.perf_counter() - tStart
+
+    # Run time (first run is a warm up):
+    runTimes = []
+    for _ in range(repeatsNo + 1):
+        model.reset()
+        tStart = time.perf_counter()
+        mhelp.run(model,simIn,**kwargs)
+        runTimes.append(time.perf_counter() - tStart)
+    runTime = min(runTimes[1:])
+
+    # Peak memory, separate pass (tracemalloc slows execution down):
+    tracemalloc.start()
+    model = WORKLOADS[aName](aSize)
+    model.compile()
+    mhelp.run(model,simIn,**kwargs)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'workload':       aName,
+            'size':           aSize,
+            'samplesNo':      samplesNo,
+            'setupTime':      setupTime,
+            'runTime':        runTime,
+            'stepsPerSecond': samplesNo / runTime,
+            'peakMemory':     peakMemory}
+
+def runSuite(workloads: Optional[list] = None, sizes: Optional[list] = None,
+             samplesNo: int = 1000, repeatsNo: int = 3, **kwargs) -> dict:
+    # [Description]: Benchmark every workload at every size
+    # [Outputs]:
+    #   - suite: {'meta': environment, 'results': list of runWorkload}
+    workloads = list(WORKLOADS.keys()) if workloads is None else workloads
+    sizes     = [10,100,1000] if sizes is None else sizes
+
+    results = [runWorkload(aName,aSize,samplesNo,repeatsNo,**kwargs)
+               for aName in workloads for aSize in sizes]
+    meta    = {'python':   platform.python_version(),
+               'numpy':    np.__version__,
+               'platform': platform.platform(),
+               'options':  kwargs}
+    return {'meta':meta,'results':results}
+
+def compareResults(aSuite: dict, aBaseline: dict, aTol: float = 0.2) -> list:
+    # [Description]: Regressions of aSuite against aBaseline
+    # [Inputs]:
+    #   - aTol: Allowed relative change (0.2: 20% slower/larger)
+    # [Outputs]:
+    #   - regressions: List of dictionaries (workload, size, metric,
+    #                  baseline, value, change). Only results present in
+    #                  both suites are compared
+    baseline = {(iResult['workload'],iResult['size']):iResult
+                for iResult in aBaseline['results']}
+
+    # Metric -> True if higher is better:
+    metrics = {'stepsPerSecond':True,'setupTime':False,'peakMemory':False}
+
+    regressions = []
+    for iResult in aSuite['results']:
+        iBase = baseline.get((iResult['workload'],iResult['size']))
+        if(iBase is None):
+            continue
+        for aMetric,isHigherBetter in metrics.items():
+            change = (iResult[aMetric] - iBase[aMetric]) / iBase[aMetric]
+            if((isHigherBetter and change < -aTol) or
+               (not isHigherBetter and change > aTol)):
+                regressions.append({'workload': iResult['workload'],
+                                    'size':     iResult['size'],
+                                    'metric':   aMetric,
+                                    'baseline': iBase[aMetric],
+                                    'value':    iResult[aMetric],
+                                    'change':   change})
+    return regressions
+
+def formatResults(aSuite: dict) -> str:
+    header = '{:<16} {:>6} {:>10} {:>14} {:>12}'.format(
+             'Workload','Size','Setup [ms]','Steps/s','Peak [kB]')
+    lines  = [header,'-' * len(header)]
+    for iResult in aSuite['results']:
+        lines.append('{:<16} {:>6} {:>10.2f} {:>14.0f} {:>12.1f}'.format(
+                     iResult['workload'], iResult['size'],
+                     iResult['setupTime'] * 1e3,
+                     iResult['stepsPerSecond'],
+                     iResult['peakMemory'] / 1024))
+    return '\n'.join(lines)
+
+# -------------------------------------------------------------------------
+# Command line
+# -------------------------------------------------------------------------
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='msim benchmark suite')
+    parser.add_argument('--workloads',nargs='+',choices=list(WORKLOADS.keys()))
+    parser.add_argument('--sizes',nargs='+',type=int,default=[10,100,1000])
+    parser.add_argument('--samples',type=int,default=1000)
+    parser.add_argument('--repeats',type=int,default=3)
+    parser.add_argument('--mode',choices=['stepped','vectorized','generated'],
+                        default='stepped')
+    parser.add_argument('--output',help='JSON file for the results')
+    parser.add_argument('--baseline',help='JSON results to compare against')
+    parser.add_argument('--tolerance',type=float,default=0.2)
+    args = parser.parse_args(argv)
+
+    kwargs = {} if args.mode == 'stepped' else {args.mode:True}
+    suite  = runSuite(args.workloads,args.sizes,args.samples,args.repeats,**kwargs)
+    print(formatResults(suite))
+
+    if(args.output):
+        with open(args.output,'w') as aFile:
+            json.dump(suite,aFile,indent=2)
+
+    if(args.baseline):
+        with open(args.baseline) as aFile:
+            regressions = compareResults(suite,json.load(aFile),args.tolerance)
+        for iReg in regressions:
+            print('[Regression] {workload}[{size}] {metric}: '
+                  '{baseline:.4g} -> {value:.4g} ({change:+.0%})'.format(**iReg))
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# [Description]:
+#   - Change-driven execution (compileModel(changeDriven=True)). Every
+#     signal (root port) has a dirty flag for the current step:
+#       - Outputs of executed blocks are compared with their previous
+#         value once, right after the execute call
+#       - Simulation inputs and outputs without direct feedthrough (Delay)
+#         are compared at the start of the step
+#     A stateless unit (block, fused Gain chain or loop) only executes if
+#     one of its input signals is dirty; otherwise its outputs are clean.
+#     Stateful and source blocks always execute
+#   - Single rate and euler solver only: held or solver stage values are
+#     written without going through the flags
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import numpy as np
+
+# -------------------------------------------------------------------------
+# Change tracker
+# -------------------------------------------------------------------------
+
+def isSame(aValue, aLast) -> bool:
+    # [Description]: True if a signal value did not change (NaN counts as
+    #                a change)
+    if(aValue is aLast):
+        return True
+    if(type(aValue) is not type(aLast)):
+        return False
+    if(isinstance(aValue,np.ndarray)):
+        return aValue.shape == aLast.shape and bool(np.array_equal(aValue,aLast))
+    return bool(aValue == aLast)
+
+def getSnapshot(aValue):
+    # [Description]: Value kept for the next comparison. Arrays are copied:
+    #                they may be updated in place (e.g. state store views)
+    if(isinstance(aValue,np.ndarray)):
+        return aValue.copy()
+    return aValue
+
+class ChangeTracker:
+
+    def __init__(self):
+        # [Description]: Dirty flags of the signals of a schedule, see
+        #                Schedule.bind. All signals start dirty
+        self._signals  = dict()
+        self._ports    = []
+        self._changed  = []
+        self._last     = []
+        self._produced = set()
+
+        # Statistics (executed, skipped):
+        self._counts   = [0,0]
+
+    def _getSignal(self, aPort) -> int:
+        if(id(aPort) not in self._signals):
+            self._signals[id(aPort)] = len(self._ports)
+            self._ports.append(aPort)
+            self._changed.append(True)
+            self._last.append(None)
+        return self._signals[id(aPort)]
+
+    # -------------
+    # Get/set
+    # -------------
+    def getStats(self) -> dict:
+        # Execute calls made and skipped since the last reset
+        return {'executedNo': self._counts[0],
+                'skippedNo':  self._counts[1]}
+
+    def reset(self):
+        # Everything is dirty on the next step
+        self._changed[:] = [True] * len(self._changed)
+        self._last[:]    = [None] * len(self._last)
+        self._counts[:]  = [0,0]
+
+    # -------------
+    # Calls
+    # -------------
+    def guard(self, aCall, aBlocks: list):
+        # [Description]: Change-driven replacement of the execute call of
+        #                aBlocks (one unit)
+        own     = {id(portH) for iBlock in aBlocks for portH in iBlock._outports.values()}
+        inputs  = sorted({self._getSignal(portH.getRoot()) for iBlock in aBlocks
+                          for portH in iBlock._inports.values()
+                          if id(portH.getRoot()) not in own})
+        outputs = [(self._getSignal(portH),portH.getValue) for iBlock in aBlocks
+                   if iBlock.hasDirectFeedthrough() for portH in iBlock._outports.values()]
+        self._produced.update(k for k,_ in outputs)
+
+        # Stateful and source (Constant) units always execute:
+        isAlways = not inputs or any(iBlock.isStateful() for iBlock in aBlocks)
+        changed, last, counts = self._changed, self._last, self._counts
+
+        isDirty = changed.__getitem__
+        clean   = [k for k,_ in outputs]
+
+        def guardedCall():
+            if(isAlways or any(map(isDirty,inputs))):
+                aCall()
+                counts[0] += 1
+                for k,getValue in outputs:
+                    value      = getValue()
+                    changed[k] = not isSame(value,last[k])
+                    last[k]    = getSnapshot(value)
+            else:
+                counts[1] += 1
+                for k in clean:
+                    changed[k] = False
+        return guardedCall
+
+    def getStartCall(self):
+        # [Description]: Call comparing the signals no unit produces
+        #                (inputs, Delay outputs, folded blocks), first
+        #                of every step. After all the guard calls
+        pending = [(k,portH) for k,portH in enumerate(self._ports) if k not in self._produced]
+        changed, last = self._changed, self._last
+
+        def startCall():
+            for k,portH in pending:
+                try:
+                    value = portH.getValue()
+                except AttributeError:
+                    # Unconnected inport:
+                    continue
+                changed[k] = not isSame(value,last[k])
+                last[k]    = getSnapshot(value)
+        return startCall
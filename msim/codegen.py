@@ -0,0 +1,286 @@
+# [Description]:
+#   - Source generating model compiler: emits a single Python function for
+#     a compiled model. Every signal is a local variable, the math of each
+#     block is inlined and the time loop runs inside that function, so no
+#     port/method dispatch happens while simulating
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import numpy as np
+
+from msim import compiler as mcomp
+
+# -------------------------------------------------------------------------
+# Block templates
+# -------------------------------------------------------------------------
+# Each template receives:
+#   - aBlock:   Block to be generated
+#   - aCode:    BlockCode with helpers to read inputs/outputs/parameters
+# and appends its source lines to aCode.init/execute/update/commit. Update
+# lines only compute next states, commit lines make them visible once all
+# of them are computed (see compiler.Schedule.bind)
+
+_SUM_OPERATORS        = {np.add:'+', np.subtract:'-'}
+_PRODUCT_OPERATORS    = {np.multiply:'*', np.divide:'/'}
+_LOGICAL_OPERATORS    = {np.logical_and:'&', np.logical_or:'|', np.logical_xor:'^'}
+_RELATIONAL_OPERATORS = {np.greater:'>', np.greater_equal:'>=',
+                         np.less:'<', np.less_equal:'<='}
+
+def _genConstant(aBlock, aCode):
+    value = aCode.param(aBlock.getOutport('y').getValue())
+    aCode.init.append(aCode.out('y') + ' = ' + value)
+
+def _genGain(aBlock, aCode):
+    aCode.execute.append(aCode.out('y') + ' = ' + aCode.inp('u') + ' * ' +
+                         aCode.param(aBlock._gain))
+
+def _genSum(aBlock, aCode):
+    expr = '0'
+    for aName,operator in zip(aBlock.getInportNames(),aBlock._operatorsH):
+        expr += ' ' + _SUM_OPERATORS[operator] + ' ' + aCode.inp(aName)
+    aCode.execute.append(aCode.out('y') + ' = ' + expr)
+
+def _genProduct(aBlock, aCode):
+    if(aBlock._type is float):
+        expr = '1.0'
+        for aName,operator in zip(aBlock.getInportNames(),aBlock._operatorsH):
+            expr += ' ' + _PRODUCT_OPERATORS[operator] + ' ' + aCode.inp(aName)
+    else:
+        # Same casting rules as Product.execute:
+        aType = aCode.param(aBlock._type)
+        expr  = '1.0'
+        for aName,operator in zip(aBlock.getInportNames(),aBlock._operatorsH):
+            expr = aCode.param(operator) + '(' + expr + ', ' + aCode.inp(aName) + \
+                   ', dtype=' + aType + ", casting='unsafe')"
+    aCode.execute.append(aCode.out('y') + ' = ' + expr)
+
+def _genSwitch(aBlock, aCode):
+    y, sw, on, off = aCode.out('y'), aCode.inp('sw'), aCode.inp('on'), aCode.inp('off')
+    if(aCode.isBatch):
+        aCode.execute.append(y + ' = _np.where(' + sw + ', ' + on + ', ' + off + ')')
+    else:
+        aCode.execute.append(y + ' = ' + on + ' if ' + sw + ' else ' + off)
+
+def _genLogical(aBlock, aCode):
+    aCode.execute.append(aCode.out('y') + ' = ' + aCode.inp('u0') + ' ' +
+                         _LOGICAL_OPERATORS[aBlock._operatorH] + ' ' +
+                         aCode.inp('u1'))
+
+def _genRelational(aBlock, aCode):
+    aCode.execute.append(aCode.out('y') + ' = ' + aCode.inp('u0') + ' ' +
+                         _RELATIONAL_OPERATORS[aBlock._operatorH] + ' ' +
+                         aCode.inp('u1'))
+
+def _genDelay(aBlock, aCode):
+    y       = aCode.state('y')
+    nextVar = aCode.var('next')
+    aCode.execute.append(nextVar + ' = ' + aCode.inp('u'))
+    aCode.commit.append(y + ' = ' + nextVar)
+
+def _genIntegrator(aBlock, aCode):
+    y, r, IC = aCode.state('y'), aCode.inp('r'), aCode.inp('IC')
+    if(aCode.isBatch):
+        aCode.execute.append(y + ' = _np.where(' + r + ', ' + IC + ', ' + y + ')')
+    else:
+        aCode.execute.append('if ' + r + ': ' + y + ' = ' + IC)
+    nextVar = aCode.var('next')
+    aCode.update.append(nextVar + ' = ' + y + ' + ' + aCode.param(aBlock._ts) +
+                        ' * ' + aCode.inp('uDot'))
+    aCode.commit.append(y + ' = ' + nextVar)
+
+TEMPLATES = {'Constant'  :_genConstant,
+             'Gain'      :_genGain,
+             'Sum'       :_genSum,
+             'Product'   :_genProduct,
+             'Switch'    :_genSwitch,
+             'Logical'   :_genLogical,
+             'Relational':_genRelational,
+             'Delay'     :_genDelay,
+             'Integrator':_genIntegrator}
+
+# -------------------------------------------------------------------------
+# Code generation
+# -------------------------------------------------------------------------
+
+class BlockCode:
+
+    def __init__(self, aIdx, aInputs, aNamespace, isBatch):
+        # Basic properties:
+        self._idx       = aIdx
+        self._inputs    = aInputs
+        self._namespace = aNamespace
+        self.isBatch    = isBatch
+
+        # Generated lines:
+        self.init    = []
+        self.execute = []
+        self.update  = []
+        self.commit  = []
+
+        # Outports holding state (Delay/Integrator):
+        self.states  = []
+
+    def var(self, aName):
+        # Local variable owned by the block
+        return 'b' + str(self._idx) + '_' + aName
+
+    def out(self, aName):
+        # Variable of an outport
+        return signalName(self._idx, aName)
+
+    def inp(self, aName):
+        # Expression to read an inport
+        return self._inputs[aName]
+
+    def state(self, aName):
+        # Outport holding state, loaded/saved around the time loop
+        self.states.append((self._idx,aName))
+        return self.out(aName)
+
+    def param(self, aValue):
+        # Bind a parameter to the namespace of the generated function
+        aName = 'p' + str(len(self._namespace))
+        self._namespace[aName] = aValue
+        return aName
+
+def signalName(aIdx, aPortName) -> str:
+    return 's' + str(aIdx) + '_' + aPortName
+
+def generateSource(aBlock, simPorts: dict, lanesNo=None, outputNames=None):
+    # [Description]: Generate the source of the simulation function
+    # [Inputs]:
+    #   - aBlock: Root block of the model
+    #   - simPorts: Outports feeding the root inports (see helpers.run)
+    #   - lanesNo: Number of batch lanes (see helpers.run)
+    #   - outputNames: Logged outports (all if None)
+    # [Outputs]:
+    #   - source: Source of '_simulate(samplesNo, inputs, outputs, state, logs)'.
+    #             logs lists the logged samples followed by -1
+    #   - namespace: Globals (parameters) used by the source
+    #   - layout: dict with the 'inputs','outputs' and 'states' order
+    schedule  = mcomp.compileModel(aBlock)
+    blocks    = schedule.getBlocks()
+    namespace = {'_np':np}
+
+    simPortNames = {id(portH):aName for aName,portH in simPorts.items()}
+    inputNames   = list(simPorts.keys())
+    externals: dict = dict()
+
+    def getExpression(aSrcIdx, aSrcName, aRootPort):
+        if(aSrcIdx is not None):
+            return signalName(aSrcIdx, aSrcName)
+        inName = simPortNames.get(id(aRootPort))
+        if(inName is not None):
+            return 'u' + str(inputNames.index(inName))
+        # Port outside of the model, read once per step:
+        if(id(aRootPort) not in externals):
+            getter = 'p' + str(len(namespace))
+            namespace[getter] = aRootPort.getValue
+            externals[id(aRootPort)] = ('e' + str(len(externals)), getter)
+        return externals[id(aRootPort)][0]
+
+    # Inport expressions per block:
+    inputs: list = [dict() for _ in blocks]
+    for iConn in schedule.getConnections():
+        inputs[iConn.dstBlock][iConn.dstPort] = getExpression(iConn.srcBlock,
+                                                              iConn.srcPort,
+                                                              iConn.rootPort)
+
+    # Block code in schedule order:
+    codes: list = [None] * len(blocks)
+    for iBlock in schedule.getExecuteList():
+        iIdx = schedule.getBlockIndex(iBlock)
+        aType = iBlock.getBlockType()
+        assert aType in TEMPLATES, '[Error] No code template for ' + str(aType)
+        codes[iIdx] = BlockCode(iIdx, inputs[iIdx], namespace, lanesNo is not None)
+        TEMPLATES[aType](iBlock, codes[iIdx])
+
+    executeCodes = [codes[schedule.getBlockIndex(iBlock)]
+                    for iBlock in schedule.getExecuteList()]
+    updateCodes  = [codes[schedule.getBlockIndex(iBlock)]
+                    for iBlock in schedule.getUpdateList()]
+
+    # Outputs:
+    if(outputNames is None):
+        outputNames = list(aBlock._outports.keys())
+    outputExpr  = []
+    for aName in outputNames:
+        srcIdx, srcName = schedule.getOutputs()[aName]
+        rootPort        = mcomp.resolveRootPort(aBlock._outports[aName])
+        outputExpr.append(getExpression(srcIdx, srcName, rootPort))
+
+    # State variables:
+    states = [iState for iCode in executeCodes for iState in iCode.states]
+    stateVars = [signalName(iIdx, aName) for iIdx,aName in states]
+
+    # Assemble source:
+    lines = ['def _simulate(samplesNo, inputs, outputs, state, logs):']
+    for j in range(len(inputNames)):
+        lines.append('    in' + str(j) + ' = inputs[' + str(j) + ']')
+    for j in range(len(outputNames)):
+        lines.append('    out' + str(j) + ' = outputs[' + str(j) + ']')
+    for j,aVar in enumerate(stateVars):
+        lines.append('    ' + aVar + ' = state[' + str(j) + ']')
+    for iCode in executeCodes:
+        lines += ['    ' + iLine for iLine in iCode.init]
+    lines.append('    j = 0')
+    lines.append('    nextLog = logs[0]')
+
+    lines.append('    for k in range(samplesNo):')
+    for j in range(len(inputNames)):
+        lines.append('        u' + str(j) + ' = in' + str(j) + '[k]')
+    for aVar,getter in externals.values():
+        lines.append('        ' + aVar + ' = ' + getter + '()')
+    for iCode in executeCodes:
+        lines += ['        ' + iLine for iLine in iCode.execute]
+    lines.append('        if k == nextLog:')
+    for j,aExpr in enumerate(outputExpr):
+        lines.append('            out' + str(j) + '[j] = ' + aExpr)
+    lines.append('            j += 1')
+    lines.append('            nextLog = logs[j]')
+    for iCode in updateCodes:
+        lines += ['        ' + iLine for iLine in iCode.update]
+    for iCode in updateCodes:
+        lines += ['        ' + iLine for iLine in iCode.commit]
+
+    lines.append('    return [' + ', '.join(stateVars) + ']')
+    source = '\n'.join(lines) + '\n'
+
+    layout = {'inputs' :inputNames,
+              'outputs':outputNames,
+              'states' :[blocks[iIdx].getOutport(aName) for iIdx,aName in states]}
+
+    return source, namespace, layout
+
+class GeneratedModel:
+
+    def __init__(self, aBlock, simPorts: dict, lanesNo=None, outputNames=None):
+        # [Description]: Generate and compile the simulation function
+        self._source, namespace, self._layout = generateSource(aBlock,
+                                                               simPorts,
+                                                               lanesNo,
+                                                               outputNames)
+        code = compile(self._source, '<msim:' + str(aBlock.getName()) + '>', 'exec')
+        exec(code, namespace)
+        self._function = namespace['_simulate']
+
+    def getSource(self) -> str:
+        return self._source
+
+    def run(self, simIn: dict, simOut: dict, logSteps=None):
+        # [Description]: Simulate writing into the preallocated simOut.
+        #                Block state is loaded from and saved to the ports
+        samplesNo = len(simIn['time'])
+        logSteps  = np.arange(samplesNo) if logSteps is None else logSteps
+
+        inputs  = [simIn[aName]  for aName in self._layout['inputs']]
+        outputs = [simOut[aName] for aName in self._layout['outputs']]
+        state   = [portH.getValue() for portH in self._layout['states']]
+        logs    = list(logSteps) + [-1]
+
+        state = self._function(samplesNo, inputs, outputs, state, logs)
+
+        for portH,aValue in zip(self._layout['states'],state):
+            portH.setValue(aValue)
+        return simOut
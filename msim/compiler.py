@@ -0,0 +1,634 @@
+# [Description]:
+#   - Model compiler: flattens a block diagram built with Block._subBlocks,
+#     discovers its connections and sorts the blocks by direct feedthrough
+#     into an execute/update schedule that is computed once
+#   - Direct feedthrough cycles (algebraic loops) are reported, or solved
+#     on every step if requested (see msim.loops)
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+from collections import namedtuple, deque
+from typing      import Optional
+
+import numpy as np
+
+from msim import loops     as mloops
+from msim import solvers   as msolvers
+from msim import optimizer as moptimizer
+from msim import changes   as mchanges
+
+# -------------------------------------------------------------------------
+# Graph
+# -------------------------------------------------------------------------
+
+# Connection between two leaf blocks. srcBlock is None if the signal
+# comes from outside of the model (e.g. simulation inputs)
+Connection = namedtuple('Connection', ['dstBlock', # Index of the destination block
+                                       'dstPort',  # Destination inport name
+                                       'srcBlock', # Index of the source block
+                                       'srcPort',  # Source outport name
+                                       'rootPort'])# Port holding the value
+
+def resolveRootPort(aPort):
+    # [Description]: Port holding the value (end of the source chain,
+    #                cached by Port.connectTo)
+    return aPort.getRoot()
+
+def flattenBlocks(aBlock) -> list:
+    # [Description]: Return all leaf blocks below aBlock (depth first).
+    #                A block without sub-blocks is a leaf
+    leafBlocks = []
+    pending    = [aBlock]
+    while pending:
+        iBlock    = pending.pop()
+        subBlocks = iBlock.getSubBlocks()
+        if(subBlocks):
+            # Keep the insertion order of the sub-blocks:
+            pending.extend(reversed(subBlocks))
+        else:
+            leafBlocks.append(iBlock)
+    return leafBlocks
+
+def compactPorts(aBlock):
+    # [Description]: Store the subscribers of every port below aBlock
+    #                (Subsystem ports included) as tuples
+    pending = [aBlock]
+    while pending:
+        iBlock = pending.pop()
+        for aPorts in (iBlock._inports,iBlock._outports):
+            for portH in aPorts.values():
+                portH.compactSubscribers()
+        pending.extend(iBlock.getSubBlocks())
+
+# -------------------------------------------------------------------------
+# Schedule
+# -------------------------------------------------------------------------
+
+class Schedule:
+
+    def __init__(self, aRoot, aBlocks, aConnections, aOutputs, aOrder, aLoops=None,
+                 aSolver='euler', aChangeDriven=False):
+        # Basic properties:
+        self._root        = aRoot
+        self._blocks      = aBlocks
+        self._connections = aConnections
+        self._outputs     = aOutputs
+        self._blockIndex  = {id(iBlock):i for i,iBlock in enumerate(aBlocks)}
+
+        # Ordered execute/update lists:
+        self._executeList = [aBlocks[i] for i in aOrder]
+        self._updateList  = [iBlock for iBlock in self._executeList
+                             if iBlock.isStateful()]
+
+        # Algebraic loops (see msim.loops), executed in place of their blocks:
+        self._loops       = [] if aLoops is None else aLoops
+
+        # Optional state store (see msim.state):
+        self._stateStore   = None
+
+        # Optional optimizer pass (see msim.optimizer):
+        self._optimization = None
+
+        # Change-driven execution (see msim.changes), tracker set by bind:
+        self._changeDriven = aChangeDriven
+        self._changes      = None
+
+        # Integrator solver (see msim.solvers), None for forward Euler:
+        assert aSolver in msolvers.SOLVERS, '[Error] Unknown solver: ' + str(aSolver)
+        self._solver       = None
+        self._variableStepStats = None
+        self._eventStats   = None
+        if(aSolver != 'euler'):
+            self._solver   = msolvers.FixedStepSolver(self, aSolver)
+
+        # Multi-rate: base step [s] and current phase (see setBaseStep):
+        self._baseStep     = None
+        self._phase        = 0
+        self._phases       = None
+
+        # Bound methods, avoids attribute lookups on every step:
+        self.bind()
+
+    # -------------
+    # Get/set
+    # -------------
+    def getRoot(self):
+        return self._root
+
+    def getBlocks(self) -> list:
+        return self._blocks
+
+    def getBlockIndex(self, aBlock) -> int:
+        return self._blockIndex[id(aBlock)]
+
+    def getConnections(self) -> list:
+        return self._connections
+
+    def getOutputs(self) -> dict:
+        # Root outport name -> (source block index, outport name)
+        return self._outputs
+
+    def getExecuteList(self) -> list:
+        return self._executeList
+
+    def getUpdateList(self) -> list:
+        return self._updateList
+
+    def getLoops(self) -> list:
+        return self._loops
+
+    def isMultiRate(self) -> bool:
+        # True if any block has its own sample time
+        return any(iBlock.getSampleTime() is not None for iBlock in self._executeList)
+
+    def getRate(self, aBlock) -> tuple:
+        # [Description]: (period, offset) of a block in base steps.
+        #                (1, 0) without sample time or base step
+        sampleTime = aBlock.getSampleTime()
+        if(sampleTime is None or self._baseStep is None):
+            return (1,0)
+
+        period, offset = [value / self._baseStep for value in sampleTime]
+        rate = (int(round(period)),int(round(offset)))
+        assert rate[0] >= 1 and abs(period - rate[0]) < 1e-6 and abs(offset - rate[1]) < 1e-6, \
+               '[Error] Sample time is not a multiple of the base step: ' + str(aBlock.getName())
+        return (rate[0],rate[1] % rate[0])
+
+    def setBaseStep(self, aStep: float):
+        # [Description]: Base step [s] of the simulation. Blocks with a
+        #                sample time only execute/update on their hits
+        #                and hold their outputs in between. The phase
+        #                carries on while the step does not change
+        if(self._baseStep is not None and abs(aStep - self._baseStep) <= 1e-9 * aStep):
+            return
+        self._baseStep = aStep
+        self.bind(self._wrapper)
+
+    def getSolver(self):
+        return self._solver
+
+    def getVariableStepStats(self) -> dict:
+        # Steps of the last variable-step run (see helpers.run)
+        return self._variableStepStats
+
+    def setVariableStepStats(self, aStats: dict):
+        self._variableStepStats = aStats
+
+    def getEventStats(self) -> dict:
+        # Calls of the last event-driven run (see helpers.run)
+        return self._eventStats
+
+    def setEventStats(self, aStats: dict):
+        self._eventStats = aStats
+
+    def getStateStore(self):
+        return self._stateStore
+
+    def setStateStore(self, aStore):
+        # All stateful blocks are updated by the store
+        self._stateStore  = aStore
+        self.bind(self._wrapper)
+        return aStore
+
+    def getOptimization(self):
+        return self._optimization
+
+    def setOptimization(self, aOptimization):
+        # Folded, removed and fused blocks leave the execute/update calls
+        self._optimization = aOptimization
+        self.bind(self._wrapper)
+        return aOptimization
+
+    def isChangeDriven(self) -> bool:
+        return self._changeDriven
+
+    def getChangeStats(self) -> Optional[dict]:
+        # Executed/skipped calls since the last reset (change-driven only)
+        return None if self._changes is None else self._changes.getStats()
+
+    def resolveRoots(self):
+        # [Description]: Resolve the root ports again once the model inputs
+        #                are rewired (e.g. new simulation ports, see
+        #                helpers.run). Change flags follow the new ports
+        connections = [iConn._replace(rootPort=resolveRootPort(
+                           self._blocks[iConn.dstBlock]._inports[iConn.dstPort]))
+                       for iConn in self._connections]
+        if(all(iNew.rootPort is iOld.rootPort
+               for iNew,iOld in zip(connections,self._connections))):
+            return
+        self._connections = connections
+        if(self._changes is not None):
+            self.bind(self._wrapper)
+
+    def getWrapper(self):
+        # Function wrapping the bound calls (see bind), None if not wrapped
+        return self._wrapper
+
+    def bind(self, aWrapper=None):
+        # [Description]: (Re)build the bound execute/update calls
+        # [Inputs]:
+        #   - aWrapper: Optional function (owner, call, phase) -> call
+        #               replacing every call, e.g. for profiling (see
+        #               msim.profiler). Owner is a block, a loop or the
+        #               state store, phase is 'execute' or 'update'
+        self._wrapper = aWrapper
+        if(aWrapper is None):
+            aWrapper = lambda aOwner,aCall,aPhase: aCall
+
+        # Loop blocks are executed by their loop (at the first one):
+        loopStarts = {id(iLoop.getBlocks()[0]):iLoop for iLoop in self._loops}
+        loopBlocks = {id(iBlock) for iLoop in self._loops for iBlock in iLoop.getBlocks()}
+        for iLoop in self._loops:
+            rates = {self.getRate(iBlock) for iBlock in iLoop.getBlocks()}
+            assert len(rates) == 1, '[Error] Loop blocks with different sample times: ' + \
+                                    iLoop.getName()
+
+        # Optimized blocks (see msim.optimizer):
+        skipped, fused = set(), dict()
+        if(self._optimization is not None):
+            skipped, fused = self._optimization.getSkipped(), self._optimization.getFusedCalls()
+            self._optimization.fold()
+
+        # Execute units (rate, owner, call, blocks) in execution order:
+        units = []
+        for iBlock in self._executeList:
+            if(id(iBlock) in fused):
+                chain = next(iChain for iChain in self._optimization.getGainChains()
+                             if iChain[-1] is iBlock)
+                units.append((self.getRate(iBlock),iBlock,fused[id(iBlock)],chain))
+            elif(id(iBlock) in skipped):
+                continue
+            elif(id(iBlock) in loopStarts):
+                iLoop = loopStarts[id(iBlock)]
+                units.append((self.getRate(iBlock),iLoop,iLoop.execute,iLoop.getBlocks()))
+            elif(id(iBlock) not in loopBlocks):
+                units.append((self.getRate(iBlock),iBlock,iBlock.execute,[iBlock]))
+        executeCalls = [(iRate,aWrapper(iOwner,iCall,'execute')) for iRate,iOwner,iCall,_ in units]
+
+        # Change-driven: units only run when an input changed
+        self._changes = None
+        if(self._changeDriven):
+            assert self._solver is None, '[Error] Change-driven execution requires the euler solver'
+            self._changes = mchanges.ChangeTracker()
+            executeCalls  = [(iRate,self._changes.guard(iCall,iUnit[3]))
+                             for (iRate,iCall),iUnit in zip(executeCalls,units)]
+            executeCalls.insert(0,((1,0),self._changes.getStartCall()))
+
+        if(self._stateStore is not None):
+            assert self._solver is None, '[Error] State store requires the euler solver'
+            updateCalls = [((1,0),aWrapper(self._stateStore,self._stateStore.update,'update'))]
+        else:
+            # Integrators are stepped first by the solver, before the
+            # discrete states change:
+            updateCalls = []
+            solved      = set()
+            if(self._solver is not None):
+                solved = {id(iBlock) for iBlock in self._solver.getIntegrators()}
+                updateCalls.append(((1,0),aWrapper(self._solver,self._solver.update,'update')))
+
+            # Two phases: every next state is computed from the values of
+            # the current step, then all of them are committed (the result
+            # does not depend on the update order)
+            commitCalls = []
+            for iBlock in self._updateList:
+                if(id(iBlock) in solved or id(iBlock) in skipped):
+                    continue
+                rate = self.getRate(iBlock)
+                if(not iBlock.getStatePorts()):
+                    updateCalls.append((rate,aWrapper(iBlock,iBlock.update,'update')))
+                    continue
+                if(rate[0] == 1 and iBlock.getBlockType() == 'Delay'):
+                    # Next value written on execute(), update only commits:
+                    commitCalls.append((rate,aWrapper(iBlock,iBlock.update,'update')))
+                    continue
+                holdUpdate, commit = getHeldUpdate(iBlock)
+                updateCalls.append((rate,aWrapper(iBlock,holdUpdate,'update')))
+                if(rate[0] == 1):
+                    commitCalls.append((rate,commit))
+                else:
+                    # Slow state: computed on the hit, visible on the next one
+                    commitCalls.append(((rate[0],(rate[1] - 1) % rate[0]),commit))
+            updateCalls.extend(commitCalls)
+
+        rates = {iRate for iRate,_ in executeCalls + updateCalls}
+        if(rates <= {(1,0)}):
+            # Single rate, every block on every step:
+            self._phases       = None
+            self._executeCalls = [iCall for _,iCall in executeCalls]
+            self._updateCalls  = [iCall for _,iCall in updateCalls]
+            return
+
+        assert self._stateStore is None, '[Error] State store requires a single rate'
+        assert not self._changeDriven, '[Error] Change-driven execution requires a single rate'
+        assert self._solver is None, '[Error] Solver ' + self._solver.getMethod() + \
+                                     ' requires a single rate'
+        self._buildPhases(rates, executeCalls, updateCalls)
+
+    def _buildPhases(self, aRates: set, executeCalls: list, updateCalls: list):
+        # [Description]: Call lists of every step of the hyperperiod. Steps
+        #                hitting the same rates share their lists; the
+        #                last update call moves to the next step
+        phasesNo = int(np.lcm.reduce([iRate[0] for iRate in aRates]))
+        patterns = dict()
+        phases   = []
+        for k in range(phasesNo):
+            hits = frozenset(iRate for iRate in aRates if k % iRate[0] == iRate[1])
+            if(hits not in patterns):
+                patterns[hits] = ([iCall for iRate,iCall in executeCalls if iRate in hits],
+                                  [iCall for iRate,iCall in updateCalls  if iRate in hits] +
+                                  [self._nextPhase])
+            phases.append(patterns[hits])
+
+        self._phases = phases
+        self._setPhase(0)
+
+    def _setPhase(self, aPhase: int):
+        self._phase = aPhase
+        self._executeCalls, self._updateCalls = self._phases[aPhase]
+
+    def _nextPhase(self):
+        self._setPhase((self._phase + 1) % len(self._phases))
+
+    # -------------
+    # Simulate
+    # -------------
+    def execute(self):
+        for iCall in self._executeCalls:
+            iCall()
+
+    def update(self):
+        for iCall in self._updateCalls:
+            iCall()
+
+    def reset(self):
+        if(self._phases is not None):
+            self._setPhase(0)
+        if(self._changes is not None):
+            self._changes.reset()
+        if(self._stateStore is not None):
+            self._stateStore.reset()
+            return
+        for iBlock in self._updateList:
+            iBlock.reset()
+
+def getHeldUpdate(aBlock):
+    # [Description]: Update of a slow stateful block split in two calls:
+    #                holdUpdate computes the next state keeping the
+    #                current one, commit (last base step before the next
+    #                hit) makes it visible
+    statePorts = aBlock.getStatePorts()
+    update     = aBlock.update
+
+    def holdUpdate():
+        values = [portH.getValue() for portH in statePorts]
+        update()
+        for portH,aValue in zip(statePorts,values):
+            portH.setNext(portH.getValue())
+            portH.setValue(aValue)
+
+    def commit():
+        for portH in statePorts:
+            portH.commit()
+    return holdUpdate, commit
+
+# -------------------------------------------------------------------------
+# Compiler
+# -------------------------------------------------------------------------
+
+def compileModel(aBlock, solveLoops=False, solver='euler', optimize=False,
+                 changeDriven=False, **loopOptions) -> Schedule:
+    # [Description]: Compile a (composite) block into a flat schedule
+    # [Inputs]:
+    #   - aBlock: Root block of the diagram
+    #   - solveLoops: Solve algebraic loops on every step (see
+    #                 msim.loops). Loops raise an error otherwise
+    #   - solver: Integrator solver, 'euler', 'heun' or 'rk4' (see
+    #             msim.solvers)
+    #   - optimize: Fold constants, skip dead blocks and fuse Gain chains
+    #               in the stepped mode (see msim.optimizer)
+    #   - changeDriven: Skip stateless blocks whose inputs did not change
+    #                   in the stepped mode (see msim.changes)
+    #   - loopOptions: AlgebraicLoop options (tol, maxIterations, memory)
+    # [Outputs]:
+    #   - schedule: Schedule with execute/update lists
+
+    blocks               = flattenBlocks(aBlock)
+    connections, outputs = getConnections(aBlock, blocks)
+    compactPorts(aBlock)
+
+    if(not solveLoops):
+        order = sortBlocks(blocks, connections)
+        return createSchedule(aBlock, blocks, connections, outputs, order, None,
+                              solver, optimize, changeDriven)
+
+    # Loops run as one unit, in the order of their own blocks:
+    dependencies = getDependencies(blocks, connections)
+    blockIndex   = {id(iBlock):i for i,iBlock in enumerate(blocks)}
+
+    order = []
+    loops = []
+    for iComp in sortComponents(blocks, connections):
+        if(not isLoop(iComp, dependencies)):
+            order.extend(iComp)
+            continue
+        iLoop = mloops.AlgebraicLoop([blocks[i] for i in iComp],
+                                     getLoopDependencies(iComp, blocks, connections),
+                                     **loopOptions)
+        loops.append(iLoop)
+        order.extend(blockIndex[id(iBlock)] for iBlock in iLoop.getBlocks())
+
+    return createSchedule(aBlock, blocks, connections, outputs, order, loops,
+                          solver, optimize, changeDriven)
+
+def compileWithOrder(aBlock, aOrder, solver='euler', optimize=False,
+                     changeDriven=False) -> Schedule:
+    # [Description]: Schedule of a block without algebraic loops whose
+    #                execution order is known (e.g. saved by msim.storage).
+    #                Skips the sort
+    # [Inputs]:
+    #   - aOrder: Indexes of the leaf blocks (flattenBlocks) in execution
+    #             order
+    blocks               = flattenBlocks(aBlock)
+    connections, outputs = getConnections(aBlock, blocks)
+    compactPorts(aBlock)
+    assert len(aOrder) == len(blocks), '[Error] Execution order does not match the blocks'
+    return createSchedule(aBlock, blocks, connections, outputs, [int(i) for i in aOrder],
+                          None, solver, optimize, changeDriven)
+
+def getConnections(aBlock, aBlocks: list):
+    # [Description]: Connections of the leaf blocks and sources of the
+    #                root outports
+    # [Outputs]:
+    #   - connections: List of Connection
+    #   - outputs: Root outport name -> (source block index, outport name)
+
+    # Map every leaf outport to its owner:
+    portOwner = dict()
+    for iIdx,iBlock in enumerate(aBlocks):
+        for aName,portH in iBlock._outports.items():
+            portOwner[id(portH)] = (iIdx,aName)
+
+    # Discover connections:
+    connections = []
+    for iIdx,iBlock in enumerate(aBlocks):
+        for aName,portH in iBlock._inports.items():
+            rootPort        = resolveRootPort(portH)
+            srcIdx, srcName = portOwner.get(id(rootPort),(None,None))
+            connections.append(Connection(iIdx,aName,srcIdx,srcName,rootPort))
+
+    # Root outports:
+    outputs = dict()
+    for aName,portH in aBlock._outports.items():
+        outputs[aName] = portOwner.get(id(resolveRootPort(portH)),(None,None))
+    return connections, outputs
+
+def createSchedule(aBlock, aBlocks, aConnections, aOutputs, aOrder, aLoops,
+                   solver, optimize, changeDriven) -> Schedule:
+    # Schedule with its optional optimizer pass (see compileModel)
+    schedule = Schedule(aBlock, aBlocks, aConnections, aOutputs, aOrder, aLoops, solver,
+                        changeDriven)
+    if(optimize):
+        schedule.setOptimization(moptimizer.Optimization(schedule))
+    return schedule
+
+def getDependencies(aBlocks: list, aConnections: list) -> list:
+    # [Description]: Return, for each block, the set of blocks that must
+    #                execute before it. Outports of blocks without direct
+    #                feedthrough (Delay) hold state and do not add dependencies
+    dependencies: list = [set() for _ in aBlocks]
+    executeInports     = [set(iBlock.getExecuteInportNames()) for iBlock in aBlocks]
+
+    for iConn in aConnections:
+        if(iConn.srcBlock is None):
+            continue
+        if(iConn.dstPort not in executeInports[iConn.dstBlock]):
+            continue
+        if(not aBlocks[iConn.srcBlock].hasDirectFeedthrough()):
+            continue
+        dependencies[iConn.dstBlock].add(iConn.srcBlock)
+    return dependencies
+
+def sortComponents(aBlocks: list, aConnections: list) -> list:
+    # [Description]: Group blocks in strongly connected components
+    #                (Tarjan) and sort the components topologically
+    #                (Kahn), keeping the discovery order between
+    #                independent ones
+    # [Outputs]:
+    #   - components: list of lists of block indexes. A component with
+    #                 more than one block (or a block reading itself) is
+    #                 an algebraic loop
+    dependencies = getDependencies(aBlocks, aConnections)
+    blocksNo     = len(aBlocks)
+
+    # Tarjan (iterative):
+    index: list  = [None] * blocksNo
+    lowLink      = [0] * blocksNo
+    onStack      = [False] * blocksNo
+    stack        = []
+    compOf: list = [None] * blocksNo
+    compsNo      = 0
+    counter      = 0
+    for iRoot in range(blocksNo):
+        if(index[iRoot] is not None):
+            continue
+        work = [(iRoot,iter(sorted(dependencies[iRoot])))]
+        index[iRoot] = lowLink[iRoot] = counter
+        counter += 1
+        stack.append(iRoot)
+        onStack[iRoot] = True
+        while work:
+            iIdx, iIter = work[-1]
+            iNext = next(iIter,None)
+            if(iNext is not None):
+                if(index[iNext] is None):
+                    index[iNext] = lowLink[iNext] = counter
+                    counter += 1
+                    stack.append(iNext)
+                    onStack[iNext] = True
+                    work.append((iNext,iter(sorted(dependencies[iNext]))))
+                elif(onStack[iNext]):
+                    lowLink[iIdx] = min(lowLink[iIdx],index[iNext])
+                continue
+
+            work.pop()
+            if(work):
+                iParent = work[-1][0]
+                lowLink[iParent] = min(lowLink[iParent],lowLink[iIdx])
+            if(lowLink[iIdx] == index[iIdx]):
+                while True:
+                    iMember = stack.pop()
+                    onStack[iMember] = False
+                    compOf[iMember]  = compsNo
+                    if(iMember == iIdx):
+                        break
+                compsNo += 1
+
+    # Component members in discovery order:
+    components: list = [[] for _ in range(compsNo)]
+    for iIdx in range(blocksNo):
+        components[compOf[iIdx]].append(iIdx)
+
+    # Kahn over components (ordered by their first block):
+    compDeps: list = [set() for _ in range(compsNo)]
+    for iIdx,iDeps in enumerate(dependencies):
+        for iDep in iDeps:
+            if(compOf[iDep] != compOf[iIdx]):
+                compDeps[compOf[iIdx]].add(compOf[iDep])
+    dependents: list = [[] for _ in range(compsNo)]
+    pendingNo        = [len(iDeps) for iDeps in compDeps]
+    for iComp,iDeps in enumerate(compDeps):
+        for iDep in iDeps:
+            dependents[iDep].append(iComp)
+
+    firstBlock = lambda iComp: components[iComp][0]
+    ready = deque(sorted((i for i,iNo in enumerate(pendingNo) if iNo == 0),key=firstBlock))
+    order = []
+    while ready:
+        iComp = ready.popleft()
+        order.append(components[iComp])
+        for iNext in sorted(dependents[iComp],key=firstBlock):
+            pendingNo[iNext] -= 1
+            if(pendingNo[iNext] == 0):
+                ready.append(iNext)
+    return order
+
+def isLoop(aComponent: list, aDependencies: list) -> bool:
+    # [Description]: True if a component of sortComponents is a loop
+    return len(aComponent) > 1 or aComponent[0] in aDependencies[aComponent[0]]
+
+def findAlgebraicLoops(aBlocks: list, aConnections: list) -> list:
+    # [Description]: Blocks of every algebraic loop (lists of indexes)
+    dependencies = getDependencies(aBlocks, aConnections)
+    return [iComp for iComp in sortComponents(aBlocks, aConnections)
+            if isLoop(iComp, dependencies)]
+
+def getLoopDependencies(aComponent: list, aBlocks: list, aConnections: list) -> list:
+    # [Description]: For each loop block, set of (position, outport name)
+    #                of the loop blocks read on execute() (see msim.loops)
+    position           = {iIdx:k for k,iIdx in enumerate(aComponent)}
+    dependencies: list = [set() for _ in aComponent]
+    for iConn in aConnections:
+        if(iConn.dstBlock not in position or iConn.srcBlock not in position):
+            continue
+        if(iConn.dstPort not in aBlocks[iConn.dstBlock].getExecuteInportNames()):
+            continue
+        if(not aBlocks[iConn.srcBlock].hasDirectFeedthrough()):
+            continue
+        dependencies[position[iConn.dstBlock]].add((position[iConn.srcBlock],iConn.srcPort))
+    return dependencies
+
+def sortBlocks(aBlocks: list, aConnections: list) -> list:
+    # [Description]: Topological sort by direct feedthrough. Keeps the
+    #                discovery order between independent blocks
+    # [Outputs]:
+    #   - order: list of block indexes
+
+    components   = sortComponents(aBlocks, aConnections)
+    dependencies = getDependencies(aBlocks, aConnections)
+
+    loops = [', '.join(str(aBlocks[i].getName()) for i in iComp)
+             for iComp in components if isLoop(iComp, dependencies)]
+    assert not loops, '[Error] Algebraic loop detected: [' + '], ['.join(loops) + ']'
+
+    return [iIdx for iComp in components for iIdx in iComp]
@@ -0,0 +1,204 @@
+# [Description]:
+#   - Discrete-event engine (run(eventDriven=True)). Block evaluations are
+#     scheduled on a heap keyed on (step, rank):
+#       - An input change schedules the blocks reading that input
+#       - An execute whose outputs changed schedules the blocks reading
+#         them (fan-out), at their next sample hit
+#       - Stateful blocks tick on their own clock: execute, then a held
+#         update whose state becomes visible on the next hit (commit).
+#         A block whose state and inputs did not change would compute
+#         the same state again: it sleeps until one of its inputs changes
+#     Nothing runs between events; outputs hold their values. Results
+#     match the stepped mode (blocks are time invariant)
+#   - Euler solver only, no state store
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import heapq
+
+from msim import compiler as mcomp
+from msim import changes  as mchanges
+
+# -------------------------------------------------------------------------
+# Engine
+# -------------------------------------------------------------------------
+
+# Event kinds, in processing order within a step (executes are sorted by
+# rank and run before the updates):
+COMMIT  = 0
+INPUT   = 1
+EXECUTE = 2
+UPDATE  = 3
+
+class EventEngine:
+
+    def __init__(self, aSchedule):
+        # [Description]: Event-driven simulation of a compiled schedule.
+        #                Units (blocks, loops) keep the schedule order as
+        #                rank
+        assert aSchedule.getSolver() is None, '[Error] Event-driven mode requires the euler solver'
+        assert aSchedule.getStateStore() is None, '[Error] Event-driven mode without state store'
+        self._schedule = aSchedule
+
+        # Units in execution order (loops as one unit):
+        loopStarts = {id(iLoop.getBlocks()[0]):iLoop for iLoop in aSchedule.getLoops()}
+        loopBlocks = {id(iBlock) for iLoop in aSchedule.getLoops() for iBlock in iLoop.getBlocks()}
+        self._calls   = []
+        self._blocks  = []
+        unitOf        = dict()
+        for iBlock in aSchedule.getExecuteList():
+            if(id(iBlock) in loopStarts):
+                iLoop = loopStarts[id(iBlock)]
+                iCall, iBlocks = iLoop.execute, iLoop.getBlocks()
+            elif(id(iBlock) in loopBlocks):
+                continue
+            else:
+                iCall, iBlocks = iBlock.execute, [iBlock]
+            for iMember in iBlocks:
+                unitOf[id(iMember)] = len(self._calls)
+            self._calls.append(iCall)
+            self._blocks.append(iBlocks)
+
+        # Outports compared after an execute, held updates of the stateful
+        # units:
+        self._outports = [[portH for iBlock in iBlocks if iBlock.hasDirectFeedthrough()
+                           for portH in iBlock._outports.values()] for iBlocks in self._blocks]
+        self._updates  = []
+        for iBlocks in self._blocks:
+            updates = []
+            for iBlock in iBlocks:
+                if(not iBlock.isStateful()):
+                    continue
+                assert iBlock.getStatePorts(), \
+                       '[Error] Event-driven mode needs state ports: ' + str(iBlock.getName())
+                updates.append(mcomp.getHeldUpdate(iBlock) + (iBlock.getStatePorts(),))
+            self._updates.append(updates)
+
+        # Port -> units scheduled when it changes. Current roots: the
+        # inputs may be rewired after compiling (see helpers.run)
+        self._consumers = dict()
+        blocks = aSchedule.getBlocks()
+        for iConn in aSchedule.getConnections():
+            iBlock = blocks[iConn.dstBlock]
+            iRoot  = iBlock._inports[iConn.dstPort].getRoot()
+            iUnits = self._consumers.setdefault(id(iRoot),[])
+            if(unitOf[id(iBlock)] not in iUnits):
+                iUnits.append(unitOf[id(iBlock)])
+
+        # Statistics:
+        self._stats = None
+
+    # -------------
+    # Get/set
+    # -------------
+    def getStats(self) -> dict:
+        # Steps of the last run, steps with events and calls made
+        return self._stats
+
+    def _getRate(self, aUnit: int) -> tuple:
+        return self._schedule.getRate(self._blocks[aUnit][0])
+
+    def _getNextHit(self, aUnit: int, k: int) -> int:
+        # First sample hit of a unit at or after step k
+        period, offset = self._getRate(aUnit)
+        return k + (offset - k) % period
+
+    # -------------
+    # Simulate
+    # -------------
+    def run(self, aStepsNo: int, aInputs: list, aLog):
+        # [Description]: Simulate aStepsNo steps
+        # [Inputs]:
+        #   - aInputs: List of (port, change steps, data): the port takes
+        #              data[k] at every change step k (step 0 included)
+        #   - aLog: Function (kStart, kEnd) logging the model outputs,
+        #           which hold for the steps kStart to kEnd - 1
+        heap: list  = []
+        pending     = set()
+        last: dict  = dict()
+        counter     = [0]
+        stats       = {'stepsNo':aStepsNo,'eventStepsNo':0,'executeCalls':0,'updateCalls':0}
+
+        def push(k, aKind, aRank, aPayload):
+            if(k > aStepsNo or (k == aStepsNo and aKind != COMMIT)):
+                return
+            if(aKind != COMMIT and aKind != INPUT):
+                if((k,aKind,aRank) in pending):
+                    return
+                pending.add((k,aKind,aRank))
+            counter[0] += 1
+            heapq.heappush(heap,(k,aKind,aRank,counter[0],aPayload))
+
+        def schedule(aUnit, k):
+            # Execute (and tick) on the next hit
+            kHit = self._getNextHit(aUnit,k)
+            push(kHit,EXECUTE,aUnit,None)
+            if(self._updates[aUnit]):
+                push(kHit,UPDATE,aUnit,None)
+
+        def fanOut(k, aPort):
+            for iUnit in self._consumers.get(id(aPort),()):
+                schedule(iUnit,k)
+
+        def isChanged(aPort) -> bool:
+            value   = aPort.getValue()
+            changed = not (id(aPort) in last and mchanges.isSame(value,last[id(aPort)]))
+            last[id(aPort)] = mchanges.getSnapshot(value)
+            return changed
+
+        # Everything runs once, stateful units tick from their first hit:
+        for iUnit in range(len(self._calls)):
+            schedule(iUnit,0)
+        for portH,changeSteps,aData in aInputs:
+            for k in changeSteps:
+                push(int(k),INPUT,0,(portH,aData))
+
+        kLast = None
+        while heap and heap[0][0] < aStepsNo:
+            k, aKind, aRank, _, aPayload = heapq.heappop(heap)
+            if(k != kLast):
+                if(kLast is not None):
+                    aLog(kLast,k)
+                kLast = k
+                stats['eventStepsNo'] += 1
+
+            if(aKind == COMMIT):
+                # New state visible, the unit ticks again if it changed:
+                isAwake = False
+                for _,commit,statePorts in self._updates[aRank]:
+                    commit()
+                    for portH in statePorts:
+                        if(isChanged(portH)):
+                            fanOut(k,portH)
+                            isAwake = True
+                if(isAwake):
+                    schedule(aRank,k)
+            elif(aKind == INPUT):
+                portH, aData = aPayload
+                portH.setValue(aData[k])
+                fanOut(k,portH)
+            elif(aKind == EXECUTE):
+                pending.discard((k,EXECUTE,aRank))
+                self._calls[aRank]()
+                stats['executeCalls'] += 1
+                for portH in self._outports[aRank]:
+                    if(isChanged(portH)):
+                        fanOut(k,portH)
+            else:
+                # Tick: next state, visible on the next hit
+                pending.discard((k,UPDATE,aRank))
+                for holdUpdate,_,_ in self._updates[aRank]:
+                    holdUpdate()
+                stats['updateCalls'] += 1
+                push(k + self._getRate(aRank)[0],COMMIT,aRank,None)
+        if(kLast is not None):
+            aLog(kLast,aStepsNo)
+
+        # States computed on the last step are committed (as run does):
+        while heap and heap[0][0] == aStepsNo:
+            _, aKind, aRank, _, _ = heapq.heappop(heap)
+            if(aKind == COMMIT):
+                for _,commit,_ in self._updates[aRank]:
+                    commit()
+        self._stats = stats
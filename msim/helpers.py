@@ -1,7 +1,17 @@
 # [Description]: Helper function to support pysim
-from   collections import namedtuple
-import numpy       as np
-import msim.lib    as     mlib
+import os
+import json
+from   collections        import namedtuple
+from   concurrent.futures import ProcessPoolExecutor
+from   multiprocessing    import shared_memory
+from   typing             import Optional
+import numpy         as np
+import msim.lib      as mlib
+import msim.compiler as mcomp
+import msim.codegen  as mgen
+import msim.lti      as mlti
+import msim.solvers  as msolvers
+import msim.events   as mevents
 import mypy
 
 # -------------------------------------------------------------------------
@@ -57,6 +67,11 @@ class simData:
         # Ensure time is included
         assert 'time' in self._dataDict
 
+        # Columnar store: one NumPy array per signal (no copy for arrays,
+        # memory-mapped signals stay lazy)
+        self._columns  = {aName:np.asarray(aData) for aName,aData in kwargs.items()}
+        self._isSorted = None
+
     def getSignalNames(self):
         return list(self._dataDict.keys())
     
@@ -68,11 +83,113 @@ class simData:
         #                designed to support iterations
         return self._dataDict[aName][aIndex]
 
-def run(aBlock, simIn):
+    # -------------
+    # Columnar access
+    # -------------
+    def getTime(self) -> np.ndarray:
+        # Time vector (sorted, checked on first lookup)
+        if(self._isSorted is None):
+            self._isSorted = bool(np.all(np.diff(self._columns['time']) >= 0))
+        assert self._isSorted, '[Error] Time vector is not sorted'
+        return self._columns['time']
+
+    def getColumn(self,aName:str) -> np.ndarray:
+        return self._columns[aName]
+
+    def getTimeIndex(self,aTime):
+        # [Description]: Index of the last sample at or before aTime
+        #                (binary search). Times before the first sample
+        #                map to index 0. aTime may be an array
+        index = np.searchsorted(self.getTime(),aTime,side='right') - 1
+        return np.maximum(index,0)
+
+    def getSignalAt(self,aName:str,aTime):
+        # [Description]: Signal value held at aTime (zero-order hold)
+        return self._columns[aName][self.getTimeIndex(aTime)]
+
+    def getTimeSlice(self,tStart:float,tEnd:float) -> 'simData':
+        # [Description]: Samples with tStart <= time <= tEnd. Signals are
+        #                views on this object (no copy)
+        time   = self.getTime()
+        kStart = np.searchsorted(time,tStart,side='left')
+        kEnd   = np.searchsorted(time,tEnd,side='right')
+        return simData(**{aName:aData[kStart:kEnd]
+                          for aName,aData in self._columns.items()})
+
+    def interpolate(self,aName:str,aTime,aMethod:Optional[str]=None) -> np.ndarray:
+        # [Description]: Signal values at aTime
+        # [Inputs]:
+        #   - aMethod: 'linear' or 'previous' (zero-order hold). Linear for
+        #              float signals and previous for bool/int if None.
+        #              Values outside the time range are held
+        aData = self._columns[aName]
+        if(aMethod is None):
+            aMethod = 'linear' if np.issubdtype(aData.dtype,np.floating) else 'previous'
+        assert aMethod in ['linear','previous'], '[Error] Unknown method: ' + str(aMethod)
+
+        time = self.getTime()
+        if(aMethod == 'previous' or len(time) < 2):
+            return aData[self.getTimeIndex(aTime)]
+
+        aTime  = np.asarray(aTime,dtype=float)
+        index  = np.clip(np.searchsorted(time,aTime,side='right') - 1,0,len(time) - 2)
+        t0, t1 = time[index], time[index + 1]
+        weight = np.clip((aTime - t0) / (t1 - t0),0.0,1.0)
+
+        # Broadcast over [time, lane] signals:
+        weight = weight.reshape(weight.shape + (1,) * (aData.ndim - 1))
+        y0, y1 = aData[index], aData[index + 1]
+        return y0 + weight * (y1 - y0)
+
+    def resample(self,aTime,aMethod:Optional[str]=None) -> 'simData':
+        # [Description]: New simData with every signal at aTime
+        #                (see interpolate)
+        signals = {'time':np.asarray(aTime)}
+        for aName in self._columns.keys():
+            if(aName != 'time'):
+                signals[aName] = self.interpolate(aName,aTime,aMethod)
+        return simData(**signals)
+
+    def toStructuredArray(self) -> np.ndarray:
+        # [Description]: Copy into a structured array (one field per signal)
+        dtype  = [(aName,aData.dtype,aData.shape[1:])
+                  for aName,aData in self._columns.items()]
+        result = np.zeros(len(self._columns['time']),dtype=dtype)
+        for aName,aData in self._columns.items():
+            result[aName] = aData
+        return result
+
+def run(aBlock, simIn, vectorized=False, lanesNo=None, simOut=None,
+        generated=False, lti=False, outDir=None, logging=None, variableStep=None,
+        eventDriven=False):
     # [Description]: Executes a simulation over a mlib.block
     # [Inputs]:
     #   - aBlock: Block to be simulated
     #   - simIn: Dictionary with input data
+    #   - vectorized: Evaluate stateless blocks over the whole trajectory
+    #                 at once (see runVectorized)
+    #   - lanesNo: Batch mode. Every port carries one value per lane
+    #              (scenario) and outputs have shape [time, lane]. Inputs
+    #              may be [time] (shared) or [time, lane]
+    #   - simOut: Optional dictionary with preallocated output arrays
+    #             (e.g. shared memory). Outputs are written in place
+    #   - generated: Run a Python function generated for the whole model
+    #                (see msim.codegen)
+    #   - lti: Simulate a linear model with state-space matrices
+    #          (see msim.lti)
+    #   - outDir: Record every outport into a memory-mapped .npy file of
+    #             this (new or empty) directory. A simData of read-only
+    #             memory-mapped signals is returned instead of simOut (see
+    #             loadSimData)
+    #   - logging: LogSpec selecting the logged outports, decimation and
+    #              time window. Every outport at every sample if None
+    #   - variableStep: VariableStep options. Integrators are solved with
+    #                   adaptive steps and outputs are interpolated at the
+    #                   logged times (see msim.solvers). Inputs are
+    #                   interpolated between samples (bool/int: held)
+    #   - eventDriven: Only evaluate the blocks reached by input changes and
+    #                  state ticks (see msim.events). Same results as the
+    #                  stepped mode
     # [Outputs]:
     #   - simOut: Dictionary with input data
 
@@ -84,6 +201,26 @@ def run(aBlock, simIn):
     simInportsNo    = len(simInports) -1
 
     assert inportsNo == simInportsNo, '[Error] Number of Inports do not match'
+
+    # Logged samples/outports:
+    loggedPorts = getLoggedPorts(aBlock, logging)
+    logSteps    = getLogSteps(simIn['time'], logging)
+    if(logging is None):
+        logTime = simIn['time']
+    else:
+        logTime = np.asarray(simIn['time'])[logSteps]
+
+    if(outDir is not None):
+        simOut = createOutputFiles(outDir, logTime, loggedPorts, lanesNo)
+        run(aBlock, simIn, vectorized=vectorized, lanesNo=lanesNo,
+            simOut=simOut, generated=generated, lti=lti, logging=logging,
+            variableStep=variableStep, eventDriven=eventDriven)
+        for aName in loggedPorts.keys():
+            simOut[aName].flush()
+        return loadSimData(outDir)
+
+    if(lanesNo is not None):
+        simIn = getBatchInputs(simIn, lanesNo)
     
     # Create test inports:
     simPorts = dict()
@@ -94,12 +231,68 @@ def run(aBlock, simIn):
                                         None)
         portH.connectTo(simPorts[aName])
 
-    simOut = dict()
-    simOut['time'] = simIn['time']
-    for aName,portH in aBlock._outports.items():
+    # A compiled schedule reads the new ports:
+    if(isinstance(aBlock,mlib.Subsystem)):
+        aBlock.getSchedule().resolveRoots()
+
+    # Higher order solvers (see msim.solvers):
+    if(isinstance(aBlock,mlib.Subsystem) and aBlock.getSchedule().getSolver() is not None):
+        assert not (vectorized or generated or lti), \
+               '[Error] Solvers other than euler only run in the stepped mode'
+
+    # Multi-rate models (blocks with sample times, see compiler.Schedule):
+    if(isinstance(aBlock,mlib.Subsystem) and aBlock.getSchedule().isMultiRate()):
+        assert not (vectorized or generated or lti), \
+               '[Error] Multi-rate models only run in the stepped mode'
+        baseStep = getBaseStep(simIn['time'])
+        if(baseStep is not None):
+            aBlock.getSchedule().setBaseStep(baseStep)
+
+    simOut = dict() if simOut is None else simOut
+    simOut['time'] = logTime
+    for aName,portH in loggedPorts.items():
         aType = portH.getType()
 
-        simOut[aName] = np.zeros_like(simIn['time'],dtype=aType)
+        if(aName in simOut):
+            # Preallocated by the caller:
+            continue
+        elif(lanesNo is None):
+            simOut[aName] = np.zeros_like(logTime,dtype=aType)
+        else:
+            simOut[aName] = np.zeros((len(logTime),lanesNo),dtype=aType)
+
+    if(variableStep is not None):
+        assert isinstance(aBlock,mlib.Subsystem), '[Error] Variable-step mode needs a Subsystem'
+        assert not (vectorized or generated or lti), \
+               '[Error] Variable-step mode is exclusive with the other modes'
+        return runVariableStep(aBlock, simIn, simPorts, simOut, loggedPorts,
+                               logTime, variableStep)
+
+    if(eventDriven):
+        assert isinstance(aBlock,mlib.Subsystem), '[Error] Event-driven mode needs a Subsystem'
+        assert not (vectorized or generated or lti), \
+               '[Error] Event-driven mode is exclusive with the other modes'
+        return runEventDriven(aBlock, simIn, simPorts, simOut, loggedPorts, logSteps)
+
+    if(lti):
+        assert lanesNo is None, '[Error] LTI mode does not support lanes'
+        stateSpace = mlti.extractStateSpace(aBlock, simPorts)
+        return stateSpace.run(simIn, simOut, logSteps)
+
+    if(generated):
+        assert not vectorized, '[Error] Generated and vectorized modes are exclusive'
+        aModel = mgen.GeneratedModel(aBlock, simPorts, lanesNo,
+                                     list(loggedPorts.keys()))
+        return aModel.run(simIn, simOut, logSteps)
+
+    if(vectorized):
+        return runVectorized(aBlock, simIn, simPorts, simOut, lanesNo,
+                             logSteps, list(loggedPorts.keys()))
+
+    # Logged outports and next logged sample (-1 once done):
+    logOutputs = [(simOut[aName],portH) for aName,portH in loggedPorts.items()]
+    logList    = logSteps.tolist() + [-1]
+    j          = 0
 
     # Execute iteration
     for k,iTime in enumerate(simIn['time']):
@@ -109,13 +302,440 @@ def run(aBlock, simIn):
         aBlock.execute()
 
         # Assign outports:
-        for aName,portH in aBlock._outports.items():
-            simOut[aName][k] = portH.getValue()
+        if(k == logList[j]):
+            for aData,portH in logOutputs:
+                aData[j] = portH.getValue()
+            j += 1
 
         aBlock.update()
 
     return simOut
 
+def getBaseStep(aTime) -> Optional[float]:
+    # [Description]: Step of a uniform time vector (None if shorter than
+    #                two samples)
+    if(len(aTime) < 2):
+        return None
+    steps = np.diff(np.asarray(aTime,dtype=float))
+    assert np.allclose(steps,steps[0]), '[Error] Multi-rate models need a uniform time step'
+    return float(steps[0])
+
+# Variable-step options (see run and solvers.VariableStepSolver):
+VariableStep = namedtuple('VariableStep', ['rtol', 'atol', 'hMax', 'hInit',
+                                           'zeroCrossing', 'eventTol', 'maxEvents'],
+                          defaults=[1e-6, 1e-9, None, None, True, 1e-10, 100])
+
+def runVariableStep(aBlock, simIn, simPorts, simOut, loggedPorts, logTime,
+                    aOptions) -> dict:
+    # [Description]: Adaptive-step simulation over the whole time vector,
+    #                outputs at logTime
+    # [Outputs]:
+    #   - simOut: Dictionary with output data. The solver statistics are
+    #             kept by the schedule (Schedule.getVariableStepStats)
+    schedule = aBlock.getSchedule()
+    assert not schedule.isMultiRate(), '[Error] Variable-step mode requires a single rate'
+    solver   = msolvers.VariableStepSolver(schedule, **aOptions._asdict())
+
+    # Inputs: samples at the simulation times, linear in between (held
+    # for bool/int inputs):
+    time   = np.asarray(simIn['time'],dtype=float)
+    inputs = [(portH,np.asarray(simIn[aName]),
+               np.issubdtype(np.asarray(simIn[aName]).dtype,np.floating))
+              for aName,portH in simPorts.items()]
+    lastK  = len(time) - 1
+    def setInputs(t):
+        k = min(int(np.searchsorted(time,t,side='right')) - 1,lastK)
+        k = max(k,0)
+        isSample = time[k] == t or k == lastK
+        for portH,aData,isFloat in inputs:
+            if(isSample or not isFloat):
+                portH.setValue(aData[k])
+            else:
+                weight = (t - time[k]) / (time[k + 1] - time[k])
+                portH.setValue(aData[k] + weight * (aData[k + 1] - aData[k]))
+
+    logOutputs = [(simOut[aName],portH) for aName,portH in loggedPorts.items()]
+    def logSample(j):
+        for aData,portH in logOutputs:
+            aData[j] = portH.getValue()
+
+    solver.run(logTime, setInputs, logSample, tStart=time[0], tEnd=time[-1])
+    schedule.setVariableStepStats(solver.getStats())
+    return simOut
+
+def runEventDriven(aBlock, simIn, simPorts, simOut, loggedPorts, logSteps) -> dict:
+    # [Description]: Event-driven simulation, outputs at logSteps
+    # [Outputs]:
+    #   - simOut: Dictionary with output data. The engine statistics are
+    #             kept by the schedule (Schedule.getEventStats)
+    schedule = aBlock.getSchedule()
+    engine   = mevents.EventEngine(schedule)
+
+    # Inputs change on the first sample and where they differ from the
+    # previous one (any lane):
+    inputs = []
+    for aName,portH in simPorts.items():
+        aData   = np.asarray(simIn[aName])
+        changed = aData[1:] != aData[:-1]
+        if(changed.ndim > 1):
+            changed = changed.reshape(len(changed),-1).any(axis=1)
+        inputs.append((portH,np.concatenate([[0],np.flatnonzero(changed) + 1]),aData))
+
+    # Outputs hold between events (one slice per event step):
+    logOutputs = [(simOut[aName],portH) for aName,portH in loggedPorts.items()]
+    logSteps   = np.asarray(logSteps)
+    def logHeld(kStart, kEnd):
+        jStart, jEnd = np.searchsorted(logSteps, [kStart,kEnd], side='left')
+        if(jEnd > jStart):
+            for aData,portH in logOutputs:
+                aData[jStart:jEnd] = portH.getValue()
+
+    engine.run(len(simIn['time']), inputs, logHeld)
+    schedule.setEventStats(engine.getStats())
+    return simOut
+
+# Logging specification (see run):
+#   - signals:    Names of the logged outports. All outports if None
+#   - decimation: Log every decimation-th sample
+#   - window:     (tStart, tEnd) time window, inclusive. Whole run if None
+LogSpec = namedtuple('LogSpec', ['signals', 'decimation', 'window'],
+                     defaults=[None, 1, None])
+
+def getLoggedPorts(aBlock, aLogSpec) -> dict:
+    # [Description]: Outports selected by a LogSpec (name -> port)
+    if(aLogSpec is None or aLogSpec.signals is None):
+        return dict(aBlock._outports)
+
+    for aName in aLogSpec.signals:
+        assert aName in aBlock._outports, '[Error] Unknown outport: ' + str(aName)
+    return {aName:aBlock._outports[aName] for aName in aLogSpec.signals}
+
+def getLogSteps(aTime, aLogSpec) -> np.ndarray:
+    # [Description]: Indexes of the logged samples of a (sorted) time vector
+    samplesNo = len(aTime)
+    if(aLogSpec is None):
+        return np.arange(samplesNo)
+
+    assert aLogSpec.decimation >= 1, '[Error] Decimation must be >= 1'
+    kStart, kEnd = 0, samplesNo
+    if(aLogSpec.window is not None):
+        tStart, tEnd = aLogSpec.window
+        kStart = int(np.searchsorted(aTime, tStart, side='left'))
+        kEnd   = int(np.searchsorted(aTime, tEnd,   side='right'))
+    return np.arange(kStart, kEnd, aLogSpec.decimation)
+
+def createOutputFiles(aDirectory: str, aTime, aOutports: dict, lanesNo=None) -> dict:
+    # [Description]: Create one memory-mapped .npy file per outport with the
+    #                shape/dtype run would allocate for the (logged) time
+    #                vector aTime, which is stored as time.npy
+    #                The saved signals are listed in signals.json
+    # [Outputs]:
+    #   - simOut: Dictionary of writable np.memmap arrays (see run)
+    os.makedirs(aDirectory, exist_ok=True)
+
+    # Files of an earlier recording may still be mapped (not truncated):
+    assert not os.listdir(aDirectory), '[Error] Output directory is not empty: ' + aDirectory
+    samplesNo = len(aTime)
+    aShape    = (samplesNo,) if lanesNo is None else (samplesNo,lanesNo)
+
+    timeFile  = np.lib.format.open_memmap(os.path.join(aDirectory,'time.npy'),
+                                          mode='w+',
+                                          dtype=np.asarray(aTime).dtype,
+                                          shape=(samplesNo,))
+    timeFile[:] = aTime
+    timeFile.flush()
+
+    simOut = dict()
+    for aName,portH in aOutports.items():
+        assert aName != 'time', '[Error] Outport name reserved for time'
+        simOut[aName] = np.lib.format.open_memmap(os.path.join(aDirectory,aName + '.npy'),
+                                                  mode='w+',
+                                                  dtype=portH.getType(),
+                                                  shape=aShape)
+
+    with open(os.path.join(aDirectory,'signals.json'),'w') as fileH:
+        json.dump(['time'] + list(simOut.keys()),fileH)
+    return simOut
+
+def loadSimData(aDirectory: str) -> 'simData':
+    # [Description]: Open a recording created by run(..., outDir=...).
+    #                Signals are memory-mapped, nothing is loaded until read.
+    #                Only the signals listed in signals.json are opened
+    with open(os.path.join(aDirectory,'signals.json')) as fileH:
+        names = json.load(fileH)
+
+    signals = dict()
+    for aName in names:
+        signals[aName] = np.load(os.path.join(aDirectory,aName + '.npy'),mmap_mode='r')
+        assert len(signals[aName]) == len(signals['time']), \
+               '[Error] Signal length does not match time: ' + aName
+    return simData(**signals)
+
+def runStream(aBlock, inputChunks, **kwargs):
+    # [Description]: Generator simulating a block chunk by chunk. Block
+    #                state is kept between chunks, so memory only depends
+    #                on the chunk size and not on the simulated duration
+    # [Inputs]:
+    #   - aBlock: Block to be simulated
+    #   - inputChunks: Iterable of simIn dictionaries (see run), e.g.
+    #                  splitSimIn or chunks read from disk
+    #   - kwargs: Extra arguments forwarded to run (e.g. generated). A
+    #             logging decimation restarts on every chunk. With outDir,
+    #             every chunk is recorded in its own subdirectory
+    #             (chunk000000, chunk000001, ...). Not variable-step: the
+    #             time between two chunks would not be integrated
+    # [Outputs]:
+    #   - simOut: Yields one simOut dictionary per input chunk
+    assert kwargs.get('variableStep') is None, \
+           '[Error] Variable-step mode does not run in chunks'
+    outDir = kwargs.pop('outDir', None)
+    for i,simIn in enumerate(inputChunks):
+        if(outDir is not None):
+            kwargs['outDir'] = os.path.join(outDir, 'chunk' + str(i).zfill(6))
+        yield run(aBlock, simIn, **kwargs)
+
+def splitSimIn(simIn, chunkSize: int):
+    # [Description]: Generator splitting simIn into chunks of chunkSize
+    #                samples (views, no copy)
+    samplesNo = len(simIn['time'])
+    for k in range(0, samplesNo, chunkSize):
+        yield {aName:aData[k:k + chunkSize] for aName,aData in simIn.items()}
+
+def getBatchInputs(simIn, lanesNo) -> dict:
+    # [Description]: Broadcast every input signal to [time, lane]. Shared
+    #                inputs ([time]) are not copied
+    samplesNo = len(simIn['time'])
+
+    batchIn = dict()
+    batchIn['time'] = simIn['time']
+    for aName,aData in simIn.items():
+        if(aName == 'time'):
+            continue
+        aData = np.asarray(aData)
+        if(aData.ndim == 1):
+            aData = aData[:,np.newaxis]
+        batchIn[aName] = np.broadcast_to(aData,(samplesNo,lanesNo))
+    return batchIn
+
+def runVectorized(aBlock, simIn, simPorts, simOut, lanesNo=None,
+                  logSteps=None, logNames=None):
+    # [Description]: Executes a simulation evaluating every stateless block
+    #                that does not depend on Delay/Integrator state across
+    #                all time samples in one call. The remaining blocks are
+    #                stepped sample by sample
+    # [Inputs]:
+    #   - aBlock: Block to be simulated
+    #   - simIn: Dictionary with input data
+    #   - simPorts: Outports feeding the block inports (see run)
+    #   - simOut: Dictionary with allocated outputs
+    #   - lanesNo: Number of batch lanes (see run)
+    #   - logSteps: Indexes of the logged samples (all if None)
+    #   - logNames: Logged outports (all if None)
+    # [Outputs]:
+    #   - simOut: Dictionary with output data
+    schedule = mcomp.compileModel(aBlock)
+    blocks   = schedule.getBlocks()
+    samplesNo = len(simIn['time'])
+    logSteps  = np.arange(samplesNo) if logSteps is None else logSteps
+    logNames  = list(aBlock._outports.keys()) if logNames is None else logNames
+    dataShape = (samplesNo,) if lanesNo is None else (samplesNo,lanesNo)
+
+    vectorIdx  = getVectorizableBlocks(schedule)
+    isVector   = [False] * len(blocks)
+    for iIdx in vectorIdx:
+        isVector[iIdx] = True
+
+    # Whole trajectory evaluation:
+    for inName,portH in simPorts.items():
+        portH.setValue(np.asarray(simIn[inName]))
+
+    trajectories = dict()
+    for iIdx in vectorIdx:
+        blocks[iIdx].execute()
+        for aName,portH in blocks[iIdx]._outports.items():
+            aValue = np.asarray(portH.getValue(),dtype=portH.getType())
+            trajectories[(iIdx,aName)] = np.broadcast_to(aValue,dataShape)
+
+    # Ports that stepped blocks read every sample:
+    simPortNames = {id(portH):aName for aName,portH in simPorts.items()}
+    stepInputs   = dict()
+    for iConn in schedule.getConnections():
+        if(isVector[iConn.dstBlock]):
+            continue
+        if(iConn.srcBlock is None):
+            aName = simPortNames.get(id(iConn.rootPort))
+            if(aName is not None):
+                stepInputs[id(iConn.rootPort)] = (iConn.rootPort, simIn[aName])
+        elif(isVector[iConn.srcBlock]):
+            aData = trajectories[(iConn.srcBlock,iConn.srcPort)]
+            stepInputs[id(iConn.rootPort)] = (iConn.rootPort, aData)
+    stepInputs = list(stepInputs.values())
+
+    stepExecute = [iBlock.execute for iBlock in schedule.getExecuteList()
+                   if not isVector[schedule.getBlockIndex(iBlock)]]
+    # States are updated in two phases (see compiler.Schedule.bind):
+    stepUpdate  = schedule.update
+
+    # Outports logged at every step:
+    stepOutputs = []
+    for aName in logNames:
+        srcIdx,srcName = schedule.getOutputs()[aName]
+        portH  = aBlock._outports[aName]
+        inName = simPortNames.get(id(mcomp.resolveRootPort(portH)))
+        if(srcIdx is not None and isVector[srcIdx]):
+            simOut[aName][:] = trajectories[(srcIdx,srcName)][logSteps]
+        elif(inName is not None):
+            # Outport wired straight to an inport:
+            simOut[aName][:] = np.asarray(simIn[inName])[logSteps]
+        else:
+            stepOutputs.append((simOut[aName],portH))
+
+    # Step the remaining blocks:
+    logList = logSteps.tolist() + [-1]
+    j       = 0
+    if(stepExecute or stepOutputs):
+        for k in range(samplesNo):
+            for portH,aData in stepInputs:
+                portH.setValue(aData[k])
+
+            for iCall in stepExecute:
+                iCall()
+
+            if(k == logList[j]):
+                for aData,portH in stepOutputs:
+                    aData[j] = portH.getValue()
+                j += 1
+
+            stepUpdate()
+
+    # Leave ports with the values of the last sample:
+    if(samplesNo > 0):
+        for inName,portH in simPorts.items():
+            portH.setValue(simIn[inName][-1])
+        for (iIdx,aName),aData in trajectories.items():
+            blocks[iIdx]._outports[aName].setValue(aData[-1])
+
+    return simOut
+
+def getVectorizableBlocks(aSchedule) -> list:
+    # [Description]: Return the indexes (in evaluation order) of stateless
+    #                blocks fed only by simulation inputs or other
+    #                vectorizable blocks
+    blocks     = aSchedule.getBlocks()
+    pendingNo  = [0] * len(blocks)
+    dependents: list = [[] for _ in blocks]
+    for iConn in aSchedule.getConnections():
+        if(iConn.srcBlock is not None):
+            pendingNo[iConn.dstBlock] += 1
+            dependents[iConn.srcBlock].append(iConn.dstBlock)
+
+    ready = [aSchedule.getBlockIndex(iBlock)
+             for iBlock in aSchedule.getExecuteList()]
+    ready = [iIdx for iIdx in ready
+             if pendingNo[iIdx] == 0 and not blocks[iIdx].isStateful()]
+    ready.reverse()
+
+    vectorIdx = []
+    while ready:
+        iIdx = ready.pop()
+        vectorIdx.append(iIdx)
+        for iNext in dependents[iIdx]:
+            pendingNo[iNext] -= 1
+            if(pendingNo[iNext] == 0 and not blocks[iNext].isStateful()):
+                ready.append(iNext)
+    return vectorIdx
+
+def runMany(aModelFactory, simInList: list, workers=None, **kwargs) -> list:
+    # [Description]: Run the same model for every simIn in simInList using a
+    #                pool of processes. Each worker builds the model once
+    #                and writes the outputs straight into shared memory, so
+    #                no result is pickled back to the parent
+    # [Inputs]:
+    #   - aModelFactory: Picklable callable returning a new model (block)
+    #   - simInList: List of simIn dictionaries (see run)
+    #   - workers: Number of processes (os.cpu_count() if None)
+    #   - kwargs: Extra arguments forwarded to run (e.g. vectorized)
+    # [Outputs]:
+    #   - simOutList: List of simOut dictionaries, same order as simInList
+
+    # Output layout: one contiguous buffer per outport, runs back to back
+    lanesNo   = kwargs.get('lanesNo')
+    logging   = kwargs.get('logging')
+    laneShape = () if lanesNo is None else (lanesNo,)
+    outTypes  = {aName:portH.getType()
+                 for aName,portH in getLoggedPorts(aModelFactory(),logging).items()}
+
+    offsets   = np.cumsum([0] + [len(getLogSteps(simIn['time'],logging))
+                                 for simIn in simInList])
+    samplesNo = int(offsets[-1])
+
+    sharedMem = dict()
+    specs     = dict()
+    try:
+        for aName,aType in outTypes.items():
+            aShape = (samplesNo,) + laneShape
+            aSize  = max(int(np.prod(aShape)) * np.dtype(aType).itemsize,1)
+            sharedMem[aName] = shared_memory.SharedMemory(create=True,size=aSize)
+            specs[aName]     = (sharedMem[aName].name,aType,aShape)
+
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=_initRunWorker,
+                                 initargs=(aModelFactory,specs)) as pool:
+            tasks = [pool.submit(_runWorker,simIn,int(offsets[k]),kwargs)
+                     for k,simIn in enumerate(simInList)]
+            for iTask in tasks:
+                iTask.result()
+
+        # Single copy out of shared memory before releasing it:
+        outData = dict()
+        for aName,(shmName,aType,aShape) in specs.items():
+            outData[aName] = np.ndarray(aShape,dtype=aType,
+                                        buffer=sharedMem[aName].buf).copy()
+    finally:
+        for iShm in sharedMem.values():
+            iShm.close()
+            iShm.unlink()
+
+    simOutList = []
+    for k,simIn in enumerate(simInList):
+        simOut = dict()
+        simOut['time'] = np.asarray(simIn['time'])[getLogSteps(simIn['time'],logging)]
+        for aName,aData in outData.items():
+            simOut[aName] = aData[offsets[k]:offsets[k+1]]
+        simOutList.append(simOut)
+
+    return simOutList
+
+# Per-process state of runMany workers:
+_workerModel:   Optional['mlib.Block'] = None
+_workerBuffers: Optional[dict]         = None
+_workerShm:     Optional[list]         = None
+
+def _initRunWorker(aModelFactory, specs: dict):
+    # [Description]: Build the model and map the shared output buffers
+    global _workerModel, _workerBuffers, _workerShm
+
+    _workerModel   = aModelFactory()
+    _workerBuffers = dict()
+    _workerShm     = []
+    for aName,(shmName,aType,aShape) in specs.items():
+        # Workers share the parent's resource tracker. The parent owns
+        # (and unlinks) the segment:
+        iShm = shared_memory.SharedMemory(name=shmName)
+        _workerShm.append(iShm)
+        _workerBuffers[aName] = np.ndarray(aShape,dtype=aType,buffer=iShm.buf)
+
+def _runWorker(simIn, aOffset: int, kwargs: dict):
+    # [Description]: Run one simulation writing into the shared buffers
+    assert _workerModel is not None and _workerBuffers is not None, \
+           '[Error] Worker not initialized'
+    samplesNo = len(getLogSteps(simIn['time'],kwargs.get('logging')))
+    simOut    = {aName:aData[aOffset:aOffset + samplesNo]
+                 for aName,aData in _workerBuffers.items()}
+
+    _workerModel.reset()
+    run(_workerModel, simIn, simOut=simOut, **kwargs)
+
 # -------------
 # Testing
 # -------------
@@ -131,12 +751,68 @@ def verifyEqual(listA: list, listB: list, aTol: float) -> bool:
     bNo = len(listB)
     assert aNo == bNo, 'ListA/B do not match size'
 
-    for k,(iA,iB) in enumerate(zip(listA,listB)):
-        isEqual = abs(iA - iB) < aTol
-        if(not isEqual):
-            msg = 'Index [' + str(k) + ']: ' + str(iA) + ' is not equal to ' + str(iB) 
-            return isEqual, msg
-        
-    return isEqual, ''
+    # Compare all samples at once, report the first mismatch:
+    arrayA = np.asarray(listA)
+    arrayB = np.asarray(listB)
+    isClose = getAbsError(arrayA,arrayB) < aTol
+    if(isClose.all()):
+        return True, ''
+
+    k   = np.unravel_index(np.argmin(isClose),isClose.shape)
+    kNo = int(k[0]) if isClose.ndim == 1 else tuple(int(i) for i in k)
+    msg = 'Index [' + str(kNo) + ']: ' + str(arrayA[k].item()) + \
+          ' is not equal to ' + str(arrayB[k].item())
+    return False, msg
+
+def getAbsError(arrayA, arrayB) -> np.ndarray:
+    # [Description]: |a - b| as float. Bool signals give 0.0/1.0
+    if(arrayA.dtype == bool or arrayB.dtype == bool):
+        return (arrayA != arrayB).astype(float)
+    return np.abs(np.subtract(arrayA,arrayB,dtype=float))
+
+SignalReport = namedtuple('SignalReport',['isEqual','samplesNo','mismatchNo',
+                                          'firstIndex','worstIndex','maxError'])
+
+def compareSimOut(simOutA: dict, simOutB: dict, aTol: float = 0.0,
+                  aRelTol: float = 0.0, equalNan: bool = True) -> dict:
+    # [Description]: Compare every signal of two simOut dicts.
+    #                A sample matches if |a - b| <= aTol + aRelTol*|b|.
+    #                Bool/int signals with zero tolerance compare exactly
+    # [Inputs]:
+    #   - simOutA: Signals under test (every signal is compared)
+    #   - simOutB: Reference signals
+    #   - equalNan: NaN in both signals counts as a match
+    # [Outputs]:
+    #   - reports: Dictionary of SignalReport per signal. Indexes are
+    #              None if there is no mismatch
+    reports = dict()
+    for aName,aData in simOutA.items():
+        assert aName in simOutB, '[Error] Missing reference signal: ' + aName
+        arrayA = np.asarray(aData)
+        arrayB = np.asarray(simOutB[aName])
+        assert arrayA.shape == arrayB.shape, '[Error] Shape mismatch: ' + aName
+
+        absError = getAbsError(arrayA,arrayB)
+        isClose  = absError <= aTol + aRelTol * np.abs(arrayB,dtype=float)
+        if(np.issubdtype(absError.dtype,np.floating)):
+            isNanA = np.isnan(arrayA) if np.issubdtype(arrayA.dtype,np.floating) else False
+            isNanB = np.isnan(arrayB) if np.issubdtype(arrayB.dtype,np.floating) else False
+            if(equalNan):
+                isClose |= isNanA & isNanB
+            # Errors with a single NaN are infinite:
+            absError = np.where(isNanA & isNanB,0.0,absError)
+            absError = np.where(np.isnan(absError),np.inf,absError)
+
+        mismatchNo = int(isClose.size - np.count_nonzero(isClose))
+        if(mismatchNo == 0):
+            reports[aName] = SignalReport(True,isClose.size,0,None,None,
+                                          float(absError.max(initial=0.0)))
+            continue
 
+        # Indexes along the sample axis:
+        firstIndex = int(np.unravel_index(np.argmin(isClose),isClose.shape)[0])
+        worstIndex = int(np.unravel_index(np.argmax(absError),absError.shape)[0])
+        reports[aName] = SignalReport(False,isClose.size,mismatchNo,firstIndex,
+                                      worstIndex,float(absError.max()))
+    return reports
 
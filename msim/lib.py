@@ -6,15 +6,21 @@
 # -------------------------------------------------------------------------
 
 # Abstract base class
-from   abc   import ABC, abstractmethod
+from   abc             import ABC, abstractmethod
+from   collections.abc import Mapping
+from   typing          import Optional, Union
 import numpy as     np
 
-from msim import helpers as mhelp
+from msim import helpers  as mhelp
+from msim import compiler as mcomp
+from msim import state    as mstate
 # -------------------------------------------------------------------------
 # Ports
 # -------------------------------------------------------------------------
 
 class Port(ABC):
+    # Fixed attributes (no __dict__), keeps large models small:
+    __slots__ = ('_parent','_type','_sourcePort','_subscribers','_rootPort','_connectedTo')
 
     def __init__(self,aType: any, aParent) -> None:
         # Basic properties:
@@ -27,8 +33,16 @@ class Port(ABC):
         # Port from where value is extract
         self._sourcePort = None
 
-        # Subscribers listening this port:
-        self._subscribers = []
+        # End of the source chain (holds the value), cached on connectTo:
+        self._rootPort   = self
+
+        # Subscribers listening this port. An insertion-ordered dict while
+        # connecting (O(1) add/remove), a tuple once compiled (most ports
+        # have none, see compactSubscribers):
+        self._subscribers: Union[tuple,dict] = ()
+
+        # Port given to connectTo (the one listing this port as subscriber):
+        self._connectedTo: Optional['Port'] = None
 
     # -------------
     # Get/set
@@ -44,6 +58,9 @@ class Port(ABC):
 
     def getSource(self):
         return self._sourcePort
+
+    def getRoot(self):
+        return self._rootPort
     # -------------
     # Connectivity
     # -------------
@@ -55,23 +72,71 @@ class Port(ABC):
         # Ensure ports have the same type:
         assert self.getType() is aSource.getType()
 
-        # Transfer all subscribers to new source
+        # Ensure the source does not listen to this port:
+        portH: Optional[Port] = aSource
+        while portH is not None:
+            assert portH is not self, '[Error] Connection loop'
+            portH = portH._sourcePort
+
+        # Detach from previous source (rewiring), also from the port it was
+        # connected to when the subscription was transferred:
+        if(self._sourcePort is not None):
+            self._sourcePort.removeSubscriber(self)
+            for iSub in self._subscribers:
+                self._sourcePort.removeSubscriber(iSub)
+        if(self._connectedTo is not None):
+            self._connectedTo.removeSubscriber(self)
+
+        # Transfer all subscribers to new source. They are kept so the
+        # port can be rewired later (e.g. a new simulation input)
         for iSub in self._subscribers:
             # Transfer to the new source
             iSub.setSource(aSource)
 
             # Let source know the new subscribers:
             aSource.addSubscriber(iSub)
-        self._subscribers.clear()
 
         # Update its own source
         self.setSource(aSource)
         aSource.addSubscriber(self)
+        self._connectedTo = aSource
+
+        # Refresh the cached roots downstream:
+        self.updateRoot()
+
+    def updateRoot(self):
+        # [Description]: Resolve the root port of this port and of every
+        #                port listening to it (after a rewiring)
+        pending = [self]
+        visited = set()
+        while pending:
+            portH = pending.pop()
+            if(id(portH) in visited):
+                continue
+            visited.add(id(portH))
+
+            rootPort = portH
+            while rootPort._sourcePort is not None:
+                rootPort = rootPort._sourcePort
+            portH._rootPort = rootPort
+            pending.extend(portH._subscribers)
 
     def addSubscriber(self,aPort:'Port'):
-        self._subscribers.append(aPort)
+        if(not isinstance(self._subscribers,dict)):
+            self._subscribers = dict.fromkeys(self._subscribers)
+        self._subscribers[aPort] = None
+
+    def removeSubscriber(self,aPort:'Port'):
+        if(not isinstance(self._subscribers,dict)):
+            self._subscribers = dict.fromkeys(self._subscribers)
+        self._subscribers.pop(aPort,None)
+
+    def compactSubscribers(self):
+        # Subscribers as a tuple (smaller than the dict), see compileModel
+        self._subscribers = tuple(self._subscribers)
 
 class Outport(Port):
+    __slots__ = ('_value',)
 
     def __init__(self,aType: str, aParent) -> None:
 
@@ -88,13 +153,58 @@ class Outport(Port):
         if(self._sourcePort is None):
             return self._value
         else:
-            return self._sourcePort.getValue()
+            return self._rootPort.getValue()
 
         # Ensure the port is not connected
         assert self._sourcePort is None
         self._value = aValue
 
+class StateOutport(Outport):
+    # Outport of a stateful block. The value lives in a current/next
+    # buffer slot so a model can gather all states in one array
+    # (see msim.state.StateStore)
+    __slots__ = ('_buffer','_nextBuffer','_slot')
+
+    def __init__(self,aType: str, aParent, aInitValue) -> None:
+
+        # Use constructor only:
+        Outport.__init__(self,aType,aParent)
+
+        # Own buffers until bound to a store:
+        self._buffer     = [aInitValue]
+        self._nextBuffer = [aInitValue]
+        self._slot       = 0
+
+    def setValue(self,aValue):
+        self._buffer[self._slot] = aValue
+
+    def getValue(self):
+        return self._buffer[self._slot]
+
+    # -------------
+    # State
+    # -------------
+    def setNext(self,aValue):
+        self._nextBuffer[self._slot] = aValue
+
+    def getNext(self):
+        return self._nextBuffer[self._slot]
+
+    def commit(self):
+        # Next value becomes the current one
+        self._buffer[self._slot] = self._nextBuffer[self._slot]
+
+    def bindBuffers(self,aBuffer,aNextBuffer,aSlot):
+        # Move the state into external buffers (keeps current values)
+        aBuffer[aSlot]     = self.getValue()
+        aNextBuffer[aSlot] = self.getNext()
+
+        self._buffer     = aBuffer
+        self._nextBuffer = aNextBuffer
+        self._slot       = aSlot
+
 class Inport(Port):
+    __slots__ = ()
 
     def __init__(self,aType: str, aParent) -> None:
 
@@ -104,13 +214,64 @@ class Inport(Port):
     def getValue(self):
         # Return local value if not connected:
         assert self._sourcePort is not None
-        return self._sourcePort.getValue()
+        return self._rootPort.getValue()
+
+# -------------------------------------------------------------------------
+# Port tables
+# -------------------------------------------------------------------------
+
+# Name -> index maps, shared by all tables with the same names:
+_NAME_INDEXES: dict = dict()
+
+class PortTable(Mapping):
+    # Read-only name -> port mapping of a block. Ports are kept in a tuple
+    # and blocks of the same type share one name -> index map
+    __slots__ = ('_index','_ports')
+
+    def __init__(self,aPorts: Optional[dict] = None) -> None:
+        aPorts = {} if aPorts is None else aPorts
+        names  = tuple(aPorts.keys())
+        if(names not in _NAME_INDEXES):
+            _NAME_INDEXES[names] = {aName:i for i,aName in enumerate(names)}
+
+        self._index = _NAME_INDEXES[names]
+        self._ports = tuple(aPorts.values())
+
+    def __getitem__(self,aName):
+        return self._ports[self._index[aName]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._ports)
+
+    def __contains__(self,aName):
+        return aName in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return self._ports
+
+    def items(self):
+        return zip(self._index,self._ports)
+
+    def getIndex(self,aName) -> int:
+        return self._index[aName]
+
+# Shared table of blocks without ports/sub-blocks:
+EMPTY_TABLE = PortTable()
 
 # -------------------------------------------------------------------------
 # Blocks:
 # -------------------------------------------------------------------------
 
 class Block(ABC):
+    # Fixed attributes, each subclass adds its own:
+    __slots__ = ('_name','_blockType','_parent','_inports','_outports','_subBlocks',
+                 '_sampleTime')
 
     def __init__(self):
         # Basic properties:
@@ -119,9 +280,12 @@ class Block(ABC):
         self._parent    = None
 
         # Functional
-        self._inports   = []
-        self._outports  = []
-        self._subBlocks = []
+        self._inports   = EMPTY_TABLE
+        self._outports  = EMPTY_TABLE
+        self._subBlocks = EMPTY_TABLE
+
+        # Sample time (period, offset) [s]. Every step if None:
+        self._sampleTime = None
 
     # -------------
     # Get/set
@@ -151,6 +315,44 @@ class Block(ABC):
     def getOutportNames(self):
         blockOutports = list(self._outports.keys())
         return blockOutports
+
+    def getSubBlocks(self):
+        return list(self._subBlocks.values())
+
+    def getSampleTime(self):
+        return self._sampleTime
+
+    def setSampleTime(self, aPeriod: float, aOffset: float = 0.0):
+        # Execute/update only every aPeriod seconds (see compiler.Schedule).
+        # Outputs hold their value between hits. Note the Integrator
+        # step (ts) is not changed
+        assert aPeriod > 0, '[Error] Sample time must be positive'
+        self._sampleTime = (aPeriod,aOffset)
+
+    # -------------------
+    # Scheduling:
+    #  -------------------
+    def getExecuteInportNames(self):
+        # Inports read by execute(). They define the execution order
+        return self.getInportNames()
+
+    def hasDirectFeedthrough(self):
+        # True if execute() writes the outports
+        return True
+
+    def isStateful(self):
+        # True if update() changes the block state
+        return False
+
+    def getStatePorts(self):
+        # StateOutports holding the block state
+        return []
+
+    def getZeroCrossings(self):
+        # [Description]: List of (mode, signal) functions. A change of
+        #                mode marks an event, signal is continuous around
+        #                it and guides its location (see msim.solvers)
+        return []
     
     # -------------------
     # Connectivity:
@@ -170,8 +372,8 @@ class Block(ABC):
     # -------------------
     # Simulate:
     #  -------------------
-    def sim(self, simIn):
-        return mhelp.run(self,simIn)
+    def sim(self, simIn, **kwargs):
+        return mhelp.run(self,simIn,**kwargs)
 
     @abstractmethod
     def execute(self):
@@ -182,8 +384,13 @@ class Block(ABC):
     def update(self):
         # Implement by each block
         pass
+
+    def reset(self):
+        # Restore the initial state. Implemented by stateful blocks
+        pass
     
 class Constant(Block):
+    __slots__ = ('_type',)
 
     def __init__(self,aName, aType, aValue, aParent):
 
@@ -200,9 +407,9 @@ class Constant(Block):
         self._type    = aType
 
         # Inputs/Outports:
-        self._inports   = {}
-        self._outports  = {'y':Outport(aType,aParent)}
-        self._subBlocks = {}
+        self._inports   = EMPTY_TABLE
+        self._outports  = PortTable({'y':Outport(aType,aParent)})
+        self._subBlocks = EMPTY_TABLE
 
         self._outports['y'].setValue(aValue)
 
@@ -218,6 +425,7 @@ class Constant(Block):
         pass
 
 class Gain(Block):
+    __slots__ = ('_gain',)
 
     def __init__(self,aName, aType, aGain, aParent):
 
@@ -234,9 +442,9 @@ class Gain(Block):
         assert mhelp.isMsimNumType(aType)
 
         # Inputs/Outports:
-        self._inports   = {'u':Inport (aType,aParent)}
-        self._outports  = {'y':Outport(aType,aParent)}
-        self._subBlocks = {}
+        self._inports   = PortTable({'u':Inport (aType,aParent)})
+        self._outports  = PortTable({'y':Outport(aType,aParent)})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
@@ -251,6 +459,7 @@ class Gain(Block):
         pass
         
 class Delay(Block):
+    __slots__ = ('_initValue',)
 
     def __init__(self,aName, aType, aInitValue, aParent):
 
@@ -266,24 +475,40 @@ class Delay(Block):
         assert mhelp.isMsimNumType(aType)
 
         # Inputs/Outports:
-        self._inports   = {'u':Inport (aType,aParent)}
-        self._outports  = {'y':Outport(aType,aParent)}
-        self._subBlocks = {}
+        self._inports   = PortTable({'u':Inport (aType,aParent)})
+        self._outports  = PortTable({'y':StateOutport(aType,aParent,aInitValue)})
+        self._subBlocks = EMPTY_TABLE
 
-        self._outports['y'].setValue(aInitValue)
+        self._initValue = aInitValue
 
     # -----------------
     # Output and update
     # -----------------
     def execute(self):
         # Process inports:
-        self._internalValue =self._inports['u'].getValue()
+        self._outports['y'].setNext(self._inports['u'].getValue())
         
     def update(self):
-        # Do nothing
-        self._outports['y'].setValue(self._internalValue)
+        self._outports['y'].commit()
+
+    def reset(self):
+        self._outports['y'].setValue(self._initValue)
+
+    # -----------------
+    # Scheduling
+    # -----------------
+    def hasDirectFeedthrough(self):
+        # Output only changes on update()
+        return False
+
+    def isStateful(self):
+        return True
+
+    def getStatePorts(self):
+        return [self._outports['y']]
                 
 class Switch(Block):
+    __slots__ = ()
 
     def __init__(self,aName, aType, aParent):
 
@@ -304,16 +529,22 @@ class Switch(Block):
         sw   = Inport (bool,aParent)
         y    = Outport (aType,aParent)
 
-        self._inports   = {'on':uOn, 'off':uOff, 'sw':sw}
-        self._outports  = {'y' :y}
-        self._subBlocks = {}
+        self._inports   = PortTable({'on':uOn, 'off':uOff, 'sw':sw})
+        self._outports  = PortTable({'y' :y})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
     # -----------------
     def execute(self):
         # Process inports:
-        if(self._inports['sw'].getValue()):
+        sw = self._inports['sw'].getValue()
+        if(isinstance(sw,np.ndarray)):
+            # Element-wise selection (vectorized/batched ports):
+            u = np.where(sw,
+                         self._inports['on'].getValue(),
+                         self._inports['off'].getValue())
+        elif(sw):
             u = self._inports['on'].getValue()
         else:
             u = self._inports['off'].getValue()
@@ -323,8 +554,13 @@ class Switch(Block):
         # Do nothing
         pass
 
+    def getZeroCrossings(self):
+        sw = self._inports['sw']
+        return [(sw.getValue, lambda: np.asarray(sw.getValue(),dtype=float) - 0.5)]
+
 
 class Sum(Block):
+    __slots__ = ('_operatorsH',)
 
     def __init__(self,aName, aType,aOperators,aParent):
 
@@ -340,7 +576,7 @@ class Sum(Block):
         assert mhelp.isMsimNumType(aType)
 
         # Create inport for each operator:
-        self._inports    = dict()
+        inports          = dict()
         self._operatorsH = [np.add] * len(aOperators)
         for i,operator in enumerate(aOperators):
             assert operator in ['+','-']
@@ -351,11 +587,12 @@ class Sum(Block):
 
             inportName = 'u' + str(i)
             inPort = Inport (aType,aParent)
-            self._inports.update({inportName:inPort})
+            inports.update({inportName:inPort})
+        self._inports    = PortTable(inports)
             
         y    = Outport (aType,aParent)
-        self._outports  = {'y' :y}
-        self._subBlocks = {}
+        self._outports  = PortTable({'y' :y})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
@@ -375,6 +612,7 @@ class Sum(Block):
         pass
 
 class Logical(Block):
+    __slots__ = ('_operatorH',)
 
     def __init__(self,aName,aOperator,aParent):
 
@@ -399,9 +637,9 @@ class Logical(Block):
         u1 = Inport(bool,aParent)
         y  = Outport(bool,aParent)
 
-        self._inports   = {'u0':u0, 'u1':u1}
-        self._outports  = {'y' :y}
-        self._subBlocks = {}
+        self._inports   = PortTable({'u0':u0, 'u1':u1})
+        self._outports  = PortTable({'y' :y})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
@@ -418,6 +656,7 @@ class Logical(Block):
         pass    
 
 class Relational(Block):
+    __slots__ = ('_operatorH',)
 
     def __init__(self,aName,aType,aOperator,aParent):
 
@@ -444,9 +683,9 @@ class Relational(Block):
         u1 = Inport(aType,aParent)
         y  = Outport(bool,aParent)
 
-        self._inports   = {'u0':u0, 'u1':u1}
-        self._outports  = {'y' :y}
-        self._subBlocks = {}
+        self._inports   = PortTable({'u0':u0, 'u1':u1})
+        self._outports  = PortTable({'y' :y})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
@@ -462,7 +701,14 @@ class Relational(Block):
         # Do nothing
         pass    
 
+    def getZeroCrossings(self):
+        # Output changes when u0 - u1 crosses zero
+        u0, u1 = self._inports['u0'], self._inports['u1']
+        return [(lambda: self._operatorH(u0.getValue(),u1.getValue()),
+                 lambda: np.subtract(u0.getValue(),u1.getValue(),dtype=float))]
+
 class Integrator(Block):
+    __slots__ = ('_ts',)
 
     def __init__(self,aName, aTs, aParent):
 
@@ -476,27 +722,56 @@ class Integrator(Block):
         self._parent    = aParent
 
         # Inputs/Outports:
-        self._inports   = {'uDot':Inport (float,aParent),
-                           'r'   :Inport (bool,aParent),
-                           'IC'  :Inport (float,aParent)}
-        self._outports  = {'y'   :Outport(float,aParent)}
-        self._outports['y'].setValue(0.0)
-        self._subBlocks = {}
+        self._inports   = PortTable({'uDot':Inport (float,aParent),
+                                     'r'   :Inport (bool,aParent),
+                                     'IC'  :Inport (float,aParent)})
+        self._outports  = PortTable({'y'   :StateOutport(float,aParent,0.0)})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
     # -----------------
     def execute(self):
-        if(self._inports['r'].getValue()):
+        r = self._inports['r'].getValue()
+        if(isinstance(r,np.ndarray)):
+            # Element-wise reset (batched ports):
+            y = np.where(r,
+                         self._inports['IC'].getValue(),
+                         self._outports['y'].getValue())
+            self._outports['y'].setValue(y)
+        elif(r):
             IC = self._inports['IC'].getValue()
             self._outports['y'].setValue(IC)
         
     def update(self):
         cValue = self._outports['y'].getValue() + \
                  self._ts * self._inports['uDot'].getValue()
-        self._outports['y'].setValue(cValue)
+        self._outports['y'].setNext(cValue)
+        self._outports['y'].commit()
+
+    def reset(self):
+        self._outports['y'].setValue(0.0)
+
+    # -----------------
+    # Scheduling
+    # -----------------
+    def getExecuteInportNames(self):
+        # uDot is only read on update()
+        return ['r','IC']
+
+    def getZeroCrossings(self):
+        # Reset edges
+        r = self._inports['r']
+        return [(r.getValue, lambda: np.asarray(r.getValue(),dtype=float) - 0.5)]
+
+    def isStateful(self):
+        return True
+
+    def getStatePorts(self):
+        return [self._outports['y']]
 
 class Product(Block):
+    __slots__ = ('_type','_operatorsH')
 
     def __init__(self,aName, aType,aOperators,aParent):
 
@@ -513,22 +788,23 @@ class Product(Block):
         assert mhelp.isMsimNumType(aType)
 
         # Create inport for each operator:
-        self._inports    = dict()
-        self._operatorsH = [np.prod] * len(aOperators)
+        inports          = dict()
+        self._operatorsH = [np.multiply] * len(aOperators)
         for i,operator in enumerate(aOperators):
             assert operator in ['*','/']
             if(operator == '*'):
-                self._operatorsH[i] = np.prod
+                self._operatorsH[i] = np.multiply
             else:
                 self._operatorsH[i] = np.divide
 
             inportName = 'u' + str(i)
             inPort = Inport (aType,aParent)
-            self._inports.update({inportName:inPort})
+            inports.update({inportName:inPort})
+        self._inports    = PortTable(inports)
 
         y    = Outport (aType,aParent)
-        self._outports  = {'y' :y}
-        self._subBlocks = {}
+        self._outports  = PortTable({'y' :y})
+        self._subBlocks = EMPTY_TABLE
 
     # -----------------
     # Output and update
@@ -539,12 +815,110 @@ class Product(Block):
         result = 1.0
         for i,aPort in enumerate(self._inports.values()):
             operator = self._operatorsH[i]
-            if operator is np.prod:
-                result = operator([result,aPort.getValue()],dtype=self._type)
-            else:
-                result = operator(result,aPort.getValue(),dtype=self._type)
+            result   = operator(result,aPort.getValue(),
+                                dtype=self._type,casting='unsafe')
         self._outports['y'].setValue(result)
 
     def update(self):
         # Do nothing
-        pass
\ No newline at end of file
+        pass
+
+class Subsystem(Block):
+    __slots__ = ('_schedule','_compileOptions','_storeOptions')
+
+    def __init__(self,aName,aParent):
+
+        # Create empty properties
+        Block.__init__(self)
+
+        # Basic properties:
+        self._name      = aName
+        self._blockType = 'Subsystem'
+        self._parent    = aParent
+
+        # Inputs/Outports are added by the user:
+        self._inports   = {}
+        self._outports  = {}
+        self._subBlocks = {}
+
+        # Compiled schedule (see msim.compiler):
+        self._schedule       = None
+        self._compileOptions = dict()
+
+        # State store options, None without store (see msim.state):
+        self._storeOptions   = None
+
+    # -----------------
+    # Construction
+    # -----------------
+    def addInport(self,aName,aType):
+        assert aName not in self._inports, '[Error] Inport already exists'
+        self._inports[aName] = Inport(aType,self._parent)
+        self._schedule = None
+        return self._inports[aName]
+
+    def addOutport(self,aName,aType):
+        assert aName not in self._outports, '[Error] Outport already exists'
+        self._outports[aName] = Outport(aType,self._parent)
+        self._schedule = None
+        return self._outports[aName]
+
+    def addBlock(self,aBlock):
+        aName = aBlock.getName()
+        assert aName not in self._subBlocks, '[Error] Block already exists'
+        self._subBlocks[aName] = aBlock
+        self._schedule = None
+        return aBlock
+
+    def getSubBlock(self,aName):
+        return self._subBlocks[aName]
+
+    # -----------------
+    # Compilation
+    # -----------------
+    def compile(self,**kwargs):
+        # Discover blocks/connections and sort them once. Options (e.g.
+        # solveLoops=True) are kept for later compilations
+        self._compileOptions.update(kwargs)
+        self._schedule = mcomp.compileModel(self,**self._compileOptions)
+
+        # The state store is created again (keeps the current state):
+        if(self._storeOptions is not None):
+            self._schedule.setStateStore(mstate.StateStore(self._schedule,**self._storeOptions))
+        return self._schedule
+
+    def getSchedule(self):
+        if(self._schedule is None):
+            self.compile()
+        return self._schedule
+
+    def setSampleTime(self,aPeriod,aOffset=0.0):
+        # Sample time of the subsystem and of its blocks without one
+        Block.setSampleTime(self,aPeriod,aOffset)
+        for iBlock in self.getSubBlocks():
+            if(iBlock.getSampleTime() is None):
+                iBlock.setSampleTime(aPeriod,aOffset)
+
+    def createStateStore(self,lanesNo=None):
+        # Gather the state of every stateful block in one array
+        schedule = self.getSchedule()
+        self._storeOptions = {'lanesNo':lanesNo}
+        return schedule.setStateStore(mstate.StateStore(schedule,lanesNo))
+
+    # -----------------
+    # Output and update
+    # -----------------
+    def execute(self):
+        self.getSchedule().execute()
+
+    def update(self):
+        self.getSchedule().update()
+
+    def reset(self):
+        self.getSchedule().reset()
+
+    # -----------------
+    # Scheduling
+    # -----------------
+    def isStateful(self):
+        return len(self.getSchedule().getUpdateList()) > 0
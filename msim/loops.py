@@ -0,0 +1,178 @@
+# [Description]:
+#   - Algebraic loop solver: the blocks of a direct feedthrough cycle are
+#     executed as one unit. A few outports are torn (their value is an
+#     unknown x) and the loop is iterated until x = G(x), with Anderson
+#     acceleration over all torn signals at once
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+from collections import deque
+from typing      import Optional
+
+import numpy as np
+
+# -------------------------------------------------------------------------
+# Loop
+# -------------------------------------------------------------------------
+
+def getTearOrder(aBlocks: list, aDependencies: list):
+    # [Description]: Execution order of the loop blocks and the outports
+    #                read before they are computed (torn). Stateful blocks
+    #                go first so their state ports are never torn
+    # [Inputs]:
+    #   - aBlocks: Loop blocks
+    #   - aDependencies: For each block, set of (position, outport name)
+    #                    of the loop blocks it reads on execute()
+    # [Outputs]:
+    #   - order: List of positions
+    #   - tears: List of (position, outport name)
+    pending = sorted(range(len(aBlocks)),key=lambda i: not aBlocks[i].isStateful())
+    placed  = set()
+    order   = []
+    while pending:
+        # First block with all inputs computed (or the first one left):
+        iNext = next((i for i in pending
+                      if all(iDep[0] in placed for iDep in aDependencies[i])),
+                     pending[0])
+        pending.remove(iNext)
+        placed.add(iNext)
+        order.append(iNext)
+
+    position = {i:k for k,i in enumerate(order)}
+    tears    = sorted({iDep for i in order for iDep in aDependencies[i]
+                       if position[iDep[0]] >= position[i]})
+    return order, tears
+
+class AlgebraicLoop:
+
+    def __init__(self, aBlocks: list, aDependencies: list, tol: float = 1e-9,
+                 maxIterations: int = 100, memory: int = 5):
+        # [Description]: Solve the loop formed by aBlocks on execute()
+        # [Inputs]:
+        #   - aBlocks: Loop blocks
+        #   - aDependencies: See getTearOrder
+        #   - tol: Converged if |G(x) - x| <= tol*(1 + |G(x)|)
+        #   - maxIterations: Loop passes per step before failing
+        #   - memory: Anderson history length (0: plain iteration)
+        order, tears = getTearOrder(aBlocks, aDependencies)
+
+        self._blocks    = [aBlocks[i] for i in order]
+        self._calls     = [iBlock.execute for iBlock in self._blocks]
+        self._tearPorts = [aBlocks[i].getOutport(aName) for i,aName in tears]
+        self._tearNames = [str(aBlocks[i].getName()) + '.' + aName for i,aName in tears]
+        for aName,portH in zip(self._tearNames,self._tearPorts):
+            assert not hasattr(portH,'commit'), '[Error] Cannot tear a state port: ' + aName
+
+        # Solver:
+        self._tol           = tol
+        self._maxIterations = maxIterations
+        self._isFloat       = all(portH.getType() is float for portH in self._tearPorts)
+        self._memory        = memory if self._isFloat else 0
+        self._shapes: Optional[list] = None
+
+        # Statistics:
+        self._solvesNo      = 0
+        self._iterationsNo  = 0
+        self._maxUsed       = 0
+
+    # -------------
+    # Get/set
+    # -------------
+    def getName(self) -> str:
+        return 'loop(' + ','.join(str(iBlock.getName()) for iBlock in self._blocks) + ')'
+
+    def getBlocks(self) -> list:
+        return self._blocks
+
+    def getTearNames(self) -> list:
+        return self._tearNames
+
+    def getStats(self) -> dict:
+        # Iterations needed by the solver (all loop passes)
+        return {'name':          self.getName(),
+                'blocks':        [str(iBlock.getName()) for iBlock in self._blocks],
+                'tears':         self._tearNames,
+                'solvesNo':      self._solvesNo,
+                'iterationsNo':  self._iterationsNo,
+                'meanIterations':self._iterationsNo / max(self._solvesNo,1),
+                'maxIterations': self._maxUsed}
+
+    def _getTear(self) -> np.ndarray:
+        values = []
+        for portH in self._tearPorts:
+            try:
+                values.append(portH.getValue())
+            except AttributeError:
+                # Not computed yet (first step):
+                values.append(portH.getType()(0))
+        self._shapes = [np.shape(aValue) for aValue in values]
+        dtype = float if self._isFloat else object
+        return np.concatenate([np.ravel(np.asarray(aValue,dtype=dtype)) for aValue in values])
+
+    def _setTear(self, x):
+        k = 0
+        for portH,aShape in zip(self._tearPorts,self._shapes):
+            if(aShape == ()):
+                portH.setValue(x[k])
+                k += 1
+            else:
+                size = int(np.prod(aShape))
+                portH.setValue(np.reshape(x[k:k + size],aShape).astype(portH.getType()))
+                k += size
+
+    def _evaluate(self, x) -> np.ndarray:
+        # One loop pass: x = G(x)
+        self._setTear(x)
+        for iCall in self._calls:
+            iCall()
+        return self._getTear()
+
+    # -------------
+    # Simulate
+    # -------------
+    def execute(self):
+        # [Description]: Solve the loop for the current inputs, starting
+        #                from the previous solution
+        x = self._getTear()
+        g = self._evaluate(x)
+        iterationsNo = 1
+        if(x.shape != g.shape):
+            # First step of a batch run (ports were not set):
+            x, g = g, self._evaluate(g)
+            iterationsNo += 1
+
+        history = deque(maxlen=self._memory) if self._memory > 0 else None
+        fLast   = None
+        while not self._isConverged(x, g):
+            assert iterationsNo < self._maxIterations, \
+                   '[Error] Algebraic loop did not converge: ' + self.getName()
+
+            if(history is None):
+                xNext = g
+            else:
+                # Anderson: mix the last iterates to minimize the residual
+                f = g - x
+                if(fLast is not None):
+                    history.append((f - fLast, g - gLast))
+                fLast, gLast = f, g
+                if(history):
+                    dF    = np.stack([iStep[0] for iStep in history],axis=1)
+                    dG    = np.stack([iStep[1] for iStep in history],axis=1)
+                    gamma = np.linalg.lstsq(dF,f,rcond=None)[0]
+                    xNext = g - dG @ gamma
+                else:
+                    xNext = g
+
+            x = xNext
+            g = self._evaluate(x)
+            iterationsNo += 1
+
+        self._solvesNo     += 1
+        self._iterationsNo += iterationsNo
+        self._maxUsed       = max(self._maxUsed,iterationsNo)
+
+    def _isConverged(self, x, g) -> bool:
+        if(not self._isFloat):
+            return all(np.all(iX == iG) for iX,iG in zip(x,g))
+        return bool(np.all(np.abs(g - x) <= self._tol * (1.0 + np.abs(g))))
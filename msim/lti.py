@@ -0,0 +1,200 @@
+# [Description]:
+#   - LTI fast path: models built only from Constant, Gain, Sum, Delay and
+#     (forward Euler) Integrator blocks are collapsed into discrete
+#     state-space matrices and simulated with matrix operations:
+#         x[k+1] = A x[k] + B u[k] + xOffset
+#         y[k]   = C x[k] + D u[k] + yOffset
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import numpy as np
+
+from msim import compiler as mcomp
+
+# -------------------------------------------------------------------------
+# Analysis
+# -------------------------------------------------------------------------
+
+LINEAR_TYPES = ['Constant','Gain','Sum','Delay','Integrator']
+
+def isLinearBlock(aBlock) -> bool:
+    # [Description]: True if the block can be part of a state-space model
+    aType = aBlock.getBlockType()
+    if(aType not in LINEAR_TYPES):
+        return False
+    if(aType == 'Gain'):
+        return np.ndim(aBlock._gain) == 0
+    if(aType == 'Integrator'):
+        return np.ndim(aBlock._ts) == 0
+    if(aType == 'Constant'):
+        return np.ndim(aBlock.getOutport('y').getValue()) == 0
+    return True
+
+def getNonlinearBlocks(aSchedule) -> list:
+    # [Description]: Blocks of a compiled model that prevent the LTI path.
+    #                Integrators whose reset is not a constant False are
+    #                reported too
+    nonlinear = [iBlock for iBlock in aSchedule.getBlocks()
+                 if not isLinearBlock(iBlock)]
+
+    blocks = aSchedule.getBlocks()
+    for iConn in aSchedule.getConnections():
+        iBlock = blocks[iConn.dstBlock]
+        if(iBlock.getBlockType() != 'Integrator' or iConn.dstPort != 'r'):
+            continue
+        isConstantFalse = iConn.srcBlock is not None and \
+                          blocks[iConn.srcBlock].getBlockType() == 'Constant' and \
+                          not iConn.rootPort.getValue()
+        if(not isConstantFalse and iBlock not in nonlinear):
+            nonlinear.append(iBlock)
+    return nonlinear
+
+# -------------------------------------------------------------------------
+# State space
+# -------------------------------------------------------------------------
+
+class StateSpace:
+
+    def __init__(self, A, B, C, D, xOffset, yOffset, aStatePorts,
+                 aInputNames, aOutputNames):
+        # Matrices:
+        self.A       = A
+        self.B       = B
+        self.C       = C
+        self.D       = D
+        self.xOffset = xOffset
+        self.yOffset = yOffset
+
+        # Layout:
+        self._statePorts  = aStatePorts
+        self._inputNames  = aInputNames
+        self._outputNames = aOutputNames
+
+    def getStatesNo(self) -> int:
+        return self.A.shape[0]
+
+    def getInputNames(self) -> list:
+        return self._inputNames
+
+    def getOutputNames(self) -> list:
+        return self._outputNames
+
+    def getState(self) -> np.ndarray:
+        return np.array([portH.getValue() for portH in self._statePorts],dtype=float)
+
+    def run(self, simIn: dict, simOut: dict, logSteps=None):
+        # [Description]: Simulate writing into the preallocated simOut.
+        #                Input terms are computed for all samples at once;
+        #                only the state recursion is stepped
+        samplesNo = len(simIn['time'])
+        statesNo  = self.getStatesNo()
+        logSteps  = np.arange(samplesNo) if logSteps is None else logSteps
+
+        U = np.zeros((samplesNo,len(self._inputNames)),dtype=float)
+        for j,aName in enumerate(self._inputNames):
+            U[:,j] = simIn[aName]
+
+        X = np.zeros((samplesNo,statesNo),dtype=float)
+        x = self.getState()
+        if(statesNo > 0):
+            W = U @ self.B.T + self.xOffset
+            A = self.A
+            for k in range(samplesNo):
+                X[k] = x
+                x    = A @ x + W[k]
+
+        # Outputs only on the logged samples:
+        Y = X[logSteps] @ self.C.T + U[logSteps] @ self.D.T + self.yOffset
+        for j,aName in enumerate(self._outputNames):
+            if(aName in simOut):
+                simOut[aName][:] = Y[:,j]
+
+        # Leave blocks with the final state:
+        for iSlot,portH in enumerate(self._statePorts):
+            portH.setValue(x[iSlot])
+        return simOut
+
+def extractStateSpace(aBlock, simPorts: dict) -> StateSpace:
+    # [Description]: Collapse a linear model into state-space matrices.
+    #                All states update simultaneously (forward Euler)
+    # [Inputs]:
+    #   - aBlock: Root block of the model
+    #   - simPorts: Outports feeding the root inports (see helpers.run)
+    # [Outputs]:
+    #   - stateSpace: StateSpace model
+    schedule  = mcomp.compileModel(aBlock)
+    blocks    = schedule.getBlocks()
+
+    nonlinear = getNonlinearBlocks(schedule)
+    assert not nonlinear, '[Error] Model is not linear: ' + \
+                          ', '.join(str(iBlock.getName()) for iBlock in nonlinear)
+
+    # Row layout: [states, inputs, 1]
+    stateBlocks = schedule.getUpdateList()
+    inputNames  = list(simPorts.keys())
+    statesNo    = len(stateBlocks)
+    inputsNo    = len(inputNames)
+    width       = statesNo + inputsNo + 1
+
+    def unitRow(aIdx):
+        row       = np.zeros(width)
+        row[aIdx] = 1.0
+        return row
+
+    simPortIdx = {id(portH):statesNo + j for j,portH in enumerate(simPorts.values())}
+
+    # Signals as rows of coefficients:
+    rows = dict()
+    for iSlot,iBlock in enumerate(stateBlocks):
+        rows[(schedule.getBlockIndex(iBlock),'y')] = unitRow(iSlot)
+
+    sources: list = [dict() for _ in blocks]
+    for iConn in schedule.getConnections():
+        sources[iConn.dstBlock][iConn.dstPort] = iConn
+
+    def getRow(aConn):
+        if(aConn.srcBlock is not None):
+            return rows[(aConn.srcBlock,aConn.srcPort)]
+        assert id(aConn.rootPort) in simPortIdx, '[Error] Unknown model input'
+        return unitRow(simPortIdx[id(aConn.rootPort)])
+
+    for iBlock in schedule.getExecuteList():
+        iIdx  = schedule.getBlockIndex(iBlock)
+        aType = iBlock.getBlockType()
+        if(aType == 'Constant'):
+            rows[(iIdx,'y')] = iBlock.getOutport('y').getValue() * unitRow(width - 1)
+        elif(aType == 'Gain'):
+            rows[(iIdx,'y')] = iBlock._gain * getRow(sources[iIdx]['u'])
+        elif(aType == 'Sum'):
+            row = np.zeros(width)
+            for aName,operator in zip(iBlock.getInportNames(),iBlock._operatorsH):
+                row = operator(row,getRow(sources[iIdx][aName]))
+            rows[(iIdx,'y')] = row
+
+    # State update:
+    M = np.zeros((statesNo,width))
+    for iSlot,iBlock in enumerate(stateBlocks):
+        iIdx = schedule.getBlockIndex(iBlock)
+        if(iBlock.getBlockType() == 'Delay'):
+            M[iSlot] = getRow(sources[iIdx]['u'])
+        else:
+            M[iSlot] = unitRow(iSlot) + iBlock._ts * getRow(sources[iIdx]['uDot'])
+
+    # Outputs:
+    outputNames = list(aBlock._outports.keys())
+    N = np.zeros((len(outputNames),width))
+    for j,aName in enumerate(outputNames):
+        srcIdx, srcName = schedule.getOutputs()[aName]
+        if(srcIdx is not None):
+            N[j] = rows[(srcIdx,srcName)]
+        else:
+            rootPort = mcomp.resolveRootPort(aBlock._outports[aName])
+            assert id(rootPort) in simPortIdx, '[Error] Unknown model output'
+            N[j] = unitRow(simPortIdx[id(rootPort)])
+
+    statePorts = [iBlock.getOutport('y') for iBlock in stateBlocks]
+    return StateSpace(M[:,:statesNo], M[:,statesNo:-1],
+                      N[:,:statesNo], N[:,statesNo:-1],
+                      M[:,-1], N[:,-1],
+                      statePorts, inputNames, outputNames)
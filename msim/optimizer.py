@@ -0,0 +1,152 @@
+# [Description]:
+#   - Optimizer pass over a compiled schedule (compileModel(optimize=True)):
+#       - Constant folding: stateless blocks fed only by Constant blocks
+#         (directly or through other folded blocks) are executed once
+#       - Dead blocks: blocks that do not reach a root outport are neither
+#         executed nor updated
+#       - Gain fusion: chains of Gain blocks, where every intermediate
+#         output only feeds the next Gain, run as one multiply
+#   - The model itself is not modified. Only the stepped run mode uses the
+#     optimized calls; intermediate ports of the removed/fused blocks keep
+#     stale values
+
+# -------------------------------------------------------------------------
+# Optimizer
+# -------------------------------------------------------------------------
+
+def getLiveBlocks(aSchedule) -> set:
+    # [Description]: Blocks (indexes) with a path to a root outport,
+    #                through any inport (state inputs included)
+    sources: list = [[] for _ in aSchedule.getBlocks()]
+    for iConn in aSchedule.getConnections():
+        if(iConn.srcBlock is not None):
+            sources[iConn.dstBlock].append(iConn.srcBlock)
+
+    pending = [srcIdx for srcIdx,_ in aSchedule.getOutputs().values() if srcIdx is not None]
+    live    = set()
+    while pending:
+        iIdx = pending.pop()
+        if(iIdx in live):
+            continue
+        live.add(iIdx)
+        pending.extend(sources[iIdx])
+    return live
+
+def getFoldedBlocks(aSchedule, aLive: set) -> list:
+    # [Description]: Live stateless blocks whose inputs are all constant,
+    #                in execution order. Constant blocks seed the search
+    #                and are not listed (they never compute)
+    blocks       = aSchedule.getBlocks()
+    inputs: list = [[] for _ in blocks]
+    for iConn in aSchedule.getConnections():
+        inputs[iConn.dstBlock].append(iConn.srcBlock)
+
+    constant = {i for i,iBlock in enumerate(blocks) if iBlock.getBlockType() == 'Constant'}
+    folded   = []
+    for iBlock in aSchedule.getExecuteList():
+        iIdx = aSchedule.getBlockIndex(iBlock)
+        if(iIdx in constant or iIdx not in aLive or iBlock.isStateful() or not inputs[iIdx]):
+            continue
+        if(all(iSrc in constant for iSrc in inputs[iIdx])):
+            constant.add(iIdx)
+            folded.append(iIdx)
+    return folded
+
+def getGainChains(aSchedule, aExcluded: set) -> list:
+    # [Description]: Chains of Gain blocks (indexes, first to last) where
+    #                every output but the last only feeds the next Gain
+    blocks          = aSchedule.getBlocks()
+    consumers: list = [[] for _ in blocks]
+    gainInput       = dict()
+    for iConn in aSchedule.getConnections():
+        if(iConn.srcBlock is not None):
+            consumers[iConn.srcBlock].append(iConn.dstBlock)
+        if(blocks[iConn.dstBlock].getBlockType() == 'Gain'):
+            gainInput[iConn.dstBlock] = iConn.srcBlock
+
+    observed = {srcIdx for srcIdx,_ in aSchedule.getOutputs().values()}
+    isFusable = lambda i: (i is not None and i not in aExcluded and
+                           blocks[i].getBlockType() == 'Gain')
+
+    # Gain -> next Gain, when its output has no other use:
+    nextGain = dict()
+    for iIdx,iSrc in gainInput.items():
+        if(isFusable(iIdx) and isFusable(iSrc) and iSrc not in observed and
+           consumers[iSrc] == [iIdx] and
+           blocks[iSrc].getSampleTime() == blocks[iIdx].getSampleTime()):
+            nextGain[iSrc] = iIdx
+
+    chains = []
+    for iStart in sorted(set(nextGain) - set(nextGain.values())):
+        chain = [iStart]
+        while chain[-1] in nextGain:
+            chain.append(nextGain[chain[-1]])
+        chains.append(chain)
+    return chains
+
+def getFusedCall(aChain: list):
+    # [Description]: execute call of a Gain chain (list of blocks): one
+    #                multiply by the product of the gains
+    gain = aChain[0]._gain
+    for iBlock in aChain[1:]:
+        gain = gain * iBlock._gain
+    getValue = aChain[0].getInport('u').getValue
+    setValue = aChain[-1].getOutport('y').setValue
+
+    def fusedCall():
+        setValue(getValue() * gain)
+    return fusedCall
+
+class Optimization:
+
+    def __init__(self, aSchedule):
+        # [Description]: Blocks folded, removed and fused in aSchedule
+        #                (see Schedule.setOptimization)
+        blocks    = aSchedule.getBlocks()
+        live      = getLiveBlocks(aSchedule)
+        loopBlock = {aSchedule.getBlockIndex(iBlock) for iLoop in aSchedule.getLoops()
+                     for iBlock in iLoop.getBlocks()}
+
+        self._blocks  = blocks
+        self._removed = [aSchedule.getBlockIndex(iBlock) for iBlock in aSchedule.getExecuteList()
+                         if aSchedule.getBlockIndex(iBlock) not in live]
+        self._folded  = getFoldedBlocks(aSchedule, live)
+        self._chains  = getGainChains(aSchedule,
+                                      set(self._removed) | set(self._folded) | loopBlock)
+
+    # -------------
+    # Get/set
+    # -------------
+    def getFoldedBlocks(self) -> list:
+        return [self._blocks[i] for i in self._folded]
+
+    def getRemovedBlocks(self) -> list:
+        return [self._blocks[i] for i in self._removed]
+
+    def getGainChains(self) -> list:
+        return [[self._blocks[i] for i in iChain] for iChain in self._chains]
+
+    def getSkipped(self) -> set:
+        # ids of the blocks without their own execute/update call
+        skipped = self._removed + self._folded + [i for iChain in self._chains for i in iChain]
+        return {id(self._blocks[i]) for i in skipped}
+
+    def getFusedCalls(self) -> dict:
+        # id of the last block of each chain -> fused call
+        return {id(self._blocks[iChain[-1]]):getFusedCall([self._blocks[i] for i in iChain])
+                for iChain in self._chains}
+
+    def getReport(self) -> dict:
+        # [Description]: Names of the folded, removed and fused blocks
+        names = lambda aList: [str(self._blocks[i].getName()) for i in aList]
+        return {'folded':  names(self._folded),
+                'removed': names(self._removed),
+                'fused':   [names(iChain) for iChain in self._chains]}
+
+    # -------------
+    # Simulate
+    # -------------
+    def fold(self):
+        # Compute the folded outputs (once, before the first step)
+        for iBlock in self.getFoldedBlocks():
+            iBlock.execute()
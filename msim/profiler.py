@@ -0,0 +1,174 @@
+# [Description]:
+#   - Opt-in per-block profiling. While a Profiler is active, the calls of
+#     a compiled schedule are wrapped with timers, which also count the
+#     inports read by each call (other models are not affected). Nothing
+#     is wrapped when it is stopped (no overhead)
+#   - Only the stepped run mode calls the blocks (not vectorized,
+#     generated or lti)
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import json
+import time
+from typing import Optional
+
+import msim.lib as mlib
+
+# -------------------------------------------------------------------------
+# Profiler
+# -------------------------------------------------------------------------
+
+STAT_KEYS = ['executeCalls','executeTime','updateCalls','updateTime','portReads']
+
+def getBlockPath(aBlock) -> str:
+    # [Description]: Block name with the names of its parents (a/b/c)
+    names: list = []
+    iParent = aBlock
+    while(iParent is not None):
+        names.insert(0,str(iParent.getName()))
+        iParent = iParent._parent
+    return '/'.join(names)
+
+def getReadsNo(aBlocks: list, aPhase: str) -> int:
+    # [Description]: Inports read by one execute/update call of aBlocks.
+    #                execute() reads getExecuteInportNames, update() the
+    #                other inports
+    readsNo = 0
+    for iBlock in aBlocks:
+        executeNo = len(iBlock.getExecuteInportNames())
+        readsNo  += executeNo if aPhase == 'execute' else len(iBlock._inports) - executeNo
+    return readsNo
+
+class Profiler:
+
+    def __init__(self, aBlock):
+        # [Description]: Profile the blocks of a Subsystem
+        #                Usage:
+        #                    with Profiler(sys1) as profiler:
+        #                        sys1.sim(simIn)
+        #                    print(profiler.getTable())
+        self._schedule  = aBlock.getSchedule()
+        self._stats     = dict()
+        self._isStarted = False
+
+    def _getStats(self, aOwner) -> dict:
+        if(id(aOwner) not in self._stats):
+            if(isinstance(aOwner,mlib.Block)):
+                name, aType = getBlockPath(aOwner), aOwner.getBlockType()
+            elif(hasattr(aOwner,'getName')):
+                # Algebraic loop (see msim.loops):
+                name, aType = aOwner.getName(), type(aOwner).__name__
+            elif(hasattr(aOwner,'getMethod')):
+                # Integrator solver (see msim.solvers):
+                name, aType = 'solver', aOwner.getMethod()
+            else:
+                name, aType = 'stateStore', type(aOwner).__name__
+            stats = {'name':name,'type':aType}
+            stats.update({aKey:0 for aKey in STAT_KEYS})
+            self._stats[id(aOwner)] = stats
+        return self._stats[id(aOwner)]
+
+    def _getBlocks(self, aOwner) -> list:
+        # Blocks called by an owner of Schedule.bind (see _getStats)
+        if(isinstance(aOwner,mlib.Block)):
+            return [aOwner]
+        elif(hasattr(aOwner,'getName')):
+            return aOwner.getBlocks()
+        elif(hasattr(aOwner,'getMethod')):
+            return aOwner.getIntegrators()
+        return self._schedule.getUpdateList()
+
+    def _wrap(self, aOwner, aCall, aPhase):
+        # [Description]: Timed replacement of aCall (see Schedule.bind)
+        stats     = self._getStats(aOwner)
+        callsKey  = aPhase + 'Calls'
+        timeKey   = aPhase + 'Time'
+        readsNo   = getReadsNo(self._getBlocks(aOwner),aPhase)
+        perfClock = time.perf_counter
+
+        def timedCall():
+            tStart = perfClock()
+            aCall()
+            stats[timeKey]     += perfClock() - tStart
+            stats[callsKey]    += 1
+            stats['portReads'] += readsNo
+
+        if(not hasattr(aOwner,'getTearNames')):
+            return timedCall
+
+        # Algebraic loop: its blocks are called once per pass (timedCall
+        # counts the first one)
+        def timedLoopCall():
+            passesNo = aOwner.getStats()['iterationsNo']
+            timedCall()
+            stats['portReads'] += readsNo * (aOwner.getStats()['iterationsNo'] - passesNo - 1)
+        return timedLoopCall
+
+    # -------------
+    # Start/stop
+    # -------------
+    def start(self):
+        assert not self._isStarted, '[Error] Profiler already started'
+        assert self._schedule.getWrapper() is None, '[Error] Schedule already wrapped'
+        self._schedule.bind(self._wrap)
+        self._isStarted = True
+        return self
+
+    def stop(self):
+        assert self._isStarted, '[Error] Profiler not started'
+        self._isStarted = False
+        self._schedule.bind()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def clear(self):
+        for stats in self._stats.values():
+            stats.update({aKey:0 for aKey in STAT_KEYS})
+
+    # -------------
+    # Results
+    # -------------
+    def getStats(self, sortBy: str = 'totalTime') -> list:
+        # [Description]: One dictionary per block, sorted (descending)
+        #                by any key. Times are in seconds
+        result = []
+        for stats in self._stats.values():
+            iStats = dict(stats)
+            iStats['totalTime']      = stats['executeTime'] + stats['updateTime']
+            iStats['executePerCall'] = stats['executeTime'] / max(stats['executeCalls'],1)
+            iStats['updatePerCall']  = stats['updateTime']  / max(stats['updateCalls'],1)
+            result.append(iStats)
+
+        assert not result or sortBy in result[0], '[Error] Unknown key: ' + str(sortBy)
+        reverse = sortBy not in ['name','type']
+        return sorted(result,key=lambda iStats: iStats[sortBy],reverse=reverse)
+
+    def getTable(self, sortBy: str = 'totalTime', rowsNo: Optional[int] = None) -> str:
+        # [Description]: Text table of getStats (times in ms/us)
+        stats = self.getStats(sortBy)
+        total = sum(iStats['totalTime'] for iStats in stats) or 1.0
+        stats = stats[:rowsNo]
+
+        header = '{:<32} {:<12} {:>9} {:>10} {:>9} {:>10} {:>10} {:>6}'.format(
+                 'Block','Type','Calls','Exec [ms]','Exec [us]','Upd [ms]','Reads','[%]')
+        lines  = [header,'-' * len(header)]
+        for iStats in stats:
+            lines.append('{:<32} {:<12} {:>9} {:>10.3f} {:>9.3f} {:>10.3f} {:>10} {:>6.1f}'.format(
+                         iStats['name'][-32:], str(iStats['type'])[:12],
+                         iStats['executeCalls'],
+                         iStats['executeTime'] * 1e3,
+                         iStats['executePerCall'] * 1e6,
+                         iStats['updateTime'] * 1e3,
+                         iStats['portReads'],
+                         100.0 * iStats['totalTime'] / total))
+        return '\n'.join(lines)
+
+    def dump(self, aPath: str, sortBy: str = 'totalTime'):
+        # [Description]: Write getStats to a JSON file
+        with open(aPath,'w') as aFile:
+            json.dump(self.getStats(sortBy),aFile,indent=2)
@@ -0,0 +1,371 @@
+# [Description]:
+#   - Fixed-step solvers for the Integrator blocks of a compiled model.
+#     Derivatives (uDot) are evaluated through the block graph: every
+#     stage sets the integrator outputs and executes the stateless blocks
+#     feeding the uDot inports. Discrete states (Delay) and simulation
+#     inputs hold their values during the step
+#   - 'euler' (default) keeps the Integrator.update of each block
+#   - VariableStepSolver: adaptive Dormand-Prince with dense output and
+#     zero-crossing events (Relational, Switch, Integrator reset): modes
+#     hold during a step, a mode change is located inside the step and
+#     the step ends there, so the step size only drops at events
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+from typing import Optional
+
+import numpy as np
+
+# -------------------------------------------------------------------------
+# Methods
+# -------------------------------------------------------------------------
+
+SOLVERS = ['euler','heun','rk4']
+
+# Butcher tableaus of the explicit methods (a, b; c is not needed as
+# inputs hold during the step):
+TABLEAUS = {'heun': ([[],
+                      [1.0]],
+                     [0.5, 0.5]),
+            'rk4':  ([[],
+                      [0.5],
+                      [0.0, 0.5],
+                      [0.0, 0.0, 1.0]],
+                     [1.0/6.0, 1.0/3.0, 1.0/3.0, 1.0/6.0])}
+
+# -------------------------------------------------------------------------
+# Solver
+# -------------------------------------------------------------------------
+
+def getDerivativeBlocks(aSchedule, aIntegrators: list) -> set:
+    # [Description]: Stateless blocks (indexes) upstream of the uDot
+    #                inports of aIntegrators. Stateful blocks stop the
+    #                search (their outputs are states)
+    blocks        = aSchedule.getBlocks()
+    sources: list = [[] for _ in blocks]
+    for iConn in aSchedule.getConnections():
+        if(iConn.srcBlock is not None):
+            sources[iConn.dstBlock].append((iConn.dstPort,iConn.srcBlock))
+
+    integratorIdx = {aSchedule.getBlockIndex(iBlock) for iBlock in aIntegrators}
+    pending = [iSrc for i in integratorIdx for aPort,iSrc in sources[i] if aPort == 'uDot']
+    found   = set()
+    while pending:
+        iIdx = pending.pop()
+        if(iIdx in found or blocks[iIdx].isStateful()):
+            continue
+        found.add(iIdx)
+        pending.extend(iSrc for _,iSrc in sources[iIdx])
+    return found
+
+def getStageCalls(aSchedule, aIntegrators: list, aHeld=()) -> list:
+    # [Description]: execute calls of the derivative blocks, in execution
+    #                order (loops run as one unit). Blocks of type in
+    #                aHeld keep their outputs
+    derivative = getDerivativeBlocks(aSchedule, aIntegrators)
+    loopOf     = {id(iBlock):iLoop for iLoop in aSchedule.getLoops()
+                  for iBlock in iLoop.getBlocks()}
+    calls      = []
+    for iBlock in aSchedule.getExecuteList():
+        if(aSchedule.getBlockIndex(iBlock) not in derivative or iBlock.getBlockType() in aHeld):
+            continue
+        iCall = loopOf[id(iBlock)].execute if id(iBlock) in loopOf else iBlock.execute
+        if(iCall not in calls):
+            calls.append(iCall)
+    return calls
+
+class FixedStepSolver:
+
+    def __init__(self, aSchedule, aMethod: str):
+        # [Description]: Integrate every Integrator of aSchedule with an
+        #                explicit Runge-Kutta method (heun or rk4). Each
+        #                Integrator uses its own step (ts)
+        assert aMethod in TABLEAUS, '[Error] Unknown solver: ' + str(aMethod)
+        self._method = aMethod
+        self._a, self._b = TABLEAUS[aMethod]
+
+        self._integrators = [iBlock for iBlock in aSchedule.getUpdateList()
+                             if iBlock.getBlockType() == 'Integrator']
+        self._statePorts  = [iBlock.getOutport('y') for iBlock in self._integrators]
+        self._uDotGets    = [iBlock.getInport('uDot').getValue for iBlock in self._integrators]
+        self._ts          = [iBlock._ts for iBlock in self._integrators]
+
+        self._stageCalls  = getStageCalls(aSchedule, self._integrators)
+
+    # -------------
+    # Get/set
+    # -------------
+    def getMethod(self) -> str:
+        return self._method
+
+    def getIntegrators(self) -> list:
+        return self._integrators
+
+    # -------------
+    # Simulate
+    # -------------
+    def _getDerivatives(self, aStates: list) -> list:
+        for portH,aValue in zip(self._statePorts,aStates):
+            portH.setValue(aValue)
+        for iCall in self._stageCalls:
+            iCall()
+        return [iGet() for iGet in self._uDotGets]
+
+    def update(self):
+        # [Description]: One step of every integrator. The first stage
+        #                uses the derivatives of the last execute()
+        y0     = [portH.getValue() for portH in self._statePorts]
+        stages = [[iGet() for iGet in self._uDotGets]]
+
+        for aRow in self._a[1:]:
+            yStage = [iY0 + iTs * sum(aCoef * iStage[i] for aCoef,iStage in zip(aRow,stages) if aCoef)
+                      for i,(iY0,iTs) in enumerate(zip(y0,self._ts))]
+            stages.append(self._getDerivatives(yStage))
+
+        for i,(portH,iY0,iTs) in enumerate(zip(self._statePorts,y0,self._ts)):
+            portH.setValue(iY0)
+            portH.setNext(iY0 + iTs * sum(bCoef * iStage[i] for bCoef,iStage in zip(self._b,stages)))
+            portH.commit()
+
+# -------------------------------------------------------------------------
+# Variable step
+# -------------------------------------------------------------------------
+
+# Dormand-Prince 5(4): stages, 5th order weights, error weights (b - bHat)
+# and dense output polynomials (x(t + theta*h) = x + h*K P [theta..theta^4])
+DOPRI_A = [[],
+           [1/5],
+           [3/40, 9/40],
+           [44/45, -56/15, 32/9],
+           [19372/6561, -25360/2187, 64448/6561, -212/729],
+           [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+           [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+DOPRI_C = [0, 1/5, 3/10, 4/5, 8/9, 1, 1]
+DOPRI_E = [71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40]
+DOPRI_P = [[1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+           [0, 0, 0, 0],
+           [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+           [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+           [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+           [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+           [0, 40617522/29380423, -110615467/29380423, 69997945/29380423]]
+
+class VariableStepSolver:
+
+    def __init__(self, aSchedule, rtol: float = 1e-6, atol: float = 1e-9,
+                 hMax: Optional[float] = None, hInit: Optional[float] = None,
+                 zeroCrossing: bool = True, eventTol: float = 1e-10,
+                 maxEvents: int = 100):
+        # [Description]: Adaptive Dormand-Prince 5(4) integration of the
+        #                Integrators of aSchedule (dx/dt = uDot, ts is not
+        #                used). Integrator resets are applied at the start
+        #                of every accepted step
+        # [Inputs]:
+        #   - rtol/atol: Local error tolerances
+        #   - hMax: Largest step [s] (whole run if None)
+        #   - hInit: First step [s] (estimated if None)
+        #   - zeroCrossing: Hold the Relational outputs during a step and
+        #                   locate their changes (and Switch/reset ones)
+        #   - eventTol: Event location tolerance [s]
+        #   - maxEvents: Most consecutive events less than 10*eventTol
+        #                apart (chattering, e.g. a relay in a feedback
+        #                loop). Raises an error beyond
+        others = [iBlock.getName() for iBlock in aSchedule.getUpdateList()
+                  if iBlock.getBlockType() != 'Integrator']
+        assert not others, '[Error] Variable-step mode only supports Integrator states: ' + \
+                           ', '.join(str(aName) for aName in others)
+        assert aSchedule.getStateStore() is None, '[Error] Variable-step mode without state store'
+        assert not aSchedule.isChangeDriven(), '[Error] Variable-step mode is not change-driven'
+
+        self._schedule   = aSchedule
+        self._statePorts = [iBlock.getOutport('y') for iBlock in aSchedule.getUpdateList()]
+        self._uDotGets   = [iBlock.getInport('uDot').getValue for iBlock in aSchedule.getUpdateList()]
+        integrators      = aSchedule.getUpdateList()
+        held             = ['Relational'] if zeroCrossing else []
+        self._stageCalls = getStageCalls(aSchedule, integrators, held)
+        self._crossings  = [iCrossing for iBlock in aSchedule.getExecuteList()
+                            for iCrossing in iBlock.getZeroCrossings()] if zeroCrossing else []
+        self._eventTol   = eventTol
+        self._maxEvents  = maxEvents
+
+        self._P     = np.array(DOPRI_P)
+        self._rtol  = rtol
+        self._atol  = atol
+        self._hMax  = hMax
+        self._hInit = hInit
+
+        # Statistics:
+        self._stepsNo       = 0
+        self._rejectedNo    = 0
+        self._evaluationsNo = 0
+        self._eventsNo      = 0
+
+    # -------------
+    # Get/set
+    # -------------
+    def getStats(self) -> dict:
+        return {'stepsNo':       self._stepsNo,
+                'rejectedNo':    self._rejectedNo,
+                'evaluationsNo': self._evaluationsNo,
+                'eventsNo':      self._eventsNo}
+
+    def _getStates(self) -> np.ndarray:
+        return np.array([portH.getValue() for portH in self._statePorts],dtype=float)
+
+    def _setStates(self, x):
+        for portH,aValue in zip(self._statePorts,x):
+            portH.setValue(aValue)
+
+    def _getDerivatives(self, aInputs, t, x) -> np.ndarray:
+        # Derivatives at (t, x), through the stateless blocks only
+        aInputs(t)
+        self._setStates(x)
+        for iCall in self._stageCalls:
+            iCall()
+        self._evaluationsNo += 1
+        return np.array([iGet() for iGet in self._uDotGets],dtype=float)
+
+    def _getModes(self) -> list:
+        return [np.ravel(iMode()) for iMode,_ in self._crossings]
+
+    def _getSignals(self) -> list:
+        return [np.ravel(iSignal()) for _,iSignal in self._crossings]
+
+    def _locateEvent(self, aInputs, t, h, x, K, aModes, aSignals) -> float:
+        # [Description]: Fraction of the step [t, t + h] where the modes
+        #                first differ from aModes (mode changes inside the
+        #                step). Safeguarded regula falsi on the signal of
+        #                the first changed crossing, the end where the
+        #                modes changed is returned
+        modesNew = self._getModes()
+        signals  = self._getSignals()
+        i, k     = next((i, int(np.argmax(iOld != iNew)))
+                        for i,(iOld,iNew) in enumerate(zip(aModes,modesNew))
+                        if np.any(iOld != iNew))
+        lo, hi   = 0.0, 1.0
+        fLo, fHi = aSignals[i][k], signals[i][k]
+        while (hi - lo) * h > self._eventTol:
+            width = hi - lo
+            theta = lo + width * fLo / (fLo - fHi) if fLo != fHi else lo + 0.5 * width
+            theta = min(max(theta, lo + 0.1 * width), hi - 0.1 * width)
+
+            self._evaluate(aInputs, t + theta * h, self._getDense(x, h, K, np.array([theta]))[0])
+            isChanged = any(np.any(iOld != iNew) for iOld,iNew in zip(aModes,self._getModes()))
+            if(isChanged):
+                hi, fHi = theta, self._getSignals()[i][k]
+            else:
+                lo, fLo = theta, self._getSignals()[i][k]
+        return hi
+
+    def _getDense(self, x, h, K, aTheta) -> np.ndarray:
+        # States at t + aTheta*h (one row per theta)
+        weights = np.stack([aTheta,aTheta ** 2,aTheta ** 3,aTheta ** 4],axis=1) @ self._P.T
+        return x + h * np.tensordot(weights,np.stack(K),axes=1)
+
+    def _getNorm(self, aError, x, xNew) -> float:
+        if(aError.size == 0):
+            return 0.0
+        scale = self._atol + self._rtol * np.maximum(np.abs(x),np.abs(xNew))
+        return float(np.sqrt(np.mean((aError / scale) ** 2)))
+
+    # -------------
+    # Simulate
+    # -------------
+    def _evaluate(self, aInputs, t, x):
+        # Execute the whole model at (t, x), applies Integrator resets
+        aInputs(t)
+        self._setStates(x)
+        self._schedule.execute()
+        return self._getStates()
+
+    def run(self, aTimes, aInputs, aLog, tStart=None, tEnd=None):
+        # [Description]: Integrate from tStart to tEnd
+        # [Inputs]:
+        #   - aTimes: Output times (sorted), between tStart and tEnd
+        #   - aInputs: Function setting the model inputs at a time
+        #   - aLog: Function logging the model outputs as output j
+        #           (called once the model is evaluated at aTimes[j])
+        #   - tStart, tEnd: Integrated interval, aTimes[0] and aTimes[-1]
+        #                   if None (e.g. a logging window is shorter)
+        aTimes    = np.asarray(aTimes,dtype=float)
+        t         = float(aTimes[0] if tStart is None else tStart)
+        tEnd      = float(aTimes[-1] if tEnd is None else tEnd)
+        hMax      = tEnd - t if self._hMax is None else self._hMax
+        x         = self._getStates()
+        h         = self._hInit
+        j         = 0
+        tEvent    = None
+        eventsNo  = 0
+
+        while True:
+            # Step start (resets, modes) and outputs at t:
+            x  = self._evaluate(aInputs, t, x)
+            if(self._crossings):
+                modes, signals = self._getModes(), self._getSignals()
+            while j < len(aTimes) and aTimes[j] <= t:
+                aLog(j)
+                j += 1
+            if(t >= tEnd):
+                break
+
+            k1 = np.array([iGet() for iGet in self._uDotGets],dtype=float)
+            if(h is None):
+                # Initial step from the derivative size:
+                d0 = self._getNorm(x, x, x) if x.size else 0.0
+                d1 = self._getNorm(k1, x, x) if x.size else 0.0
+                h  = 0.01 * d0 / d1 if (d0 > 1e-5 and d1 > 1e-5) else 1e-6
+            h = min(h, hMax, tEnd - t)
+
+            # Try steps until the error is within the tolerance:
+            while True:
+                K = [k1]
+                for aRow,aC in zip(DOPRI_A[1:],DOPRI_C[1:]):
+                    xStage = x + h * sum(aCoef * iK for aCoef,iK in zip(aRow,K) if aCoef)
+                    K.append(self._getDerivatives(aInputs, t + aC * h, xStage))
+                xNew  = x + h * sum(aCoef * iK for aCoef,iK in zip(DOPRI_A[-1],K) if aCoef)
+                error = h * sum(eCoef * iK for eCoef,iK in zip(DOPRI_E,K) if eCoef)
+                norm  = self._getNorm(error, x, xNew)
+
+                factor = 10.0 if norm == 0.0 else min(10.0, max(0.2, 0.9 * norm ** -0.2))
+                if(norm <= 1.0):
+                    break
+                self._rejectedNo += 1
+                h = h * factor
+                assert h > 1e-12 * max(1.0,abs(t)), '[Error] Step size too small at t = ' + str(t)
+
+            # Events: the step ends where the first mode changes
+            hStep = h
+            if(self._crossings):
+                self._evaluate(aInputs, t + h, xNew)
+                if(any(np.any(iOld != iNew) for iOld,iNew in zip(modes,self._getModes()))):
+                    theta = self._locateEvent(aInputs, t, h, x, K, modes, signals)
+                    if(theta < 1.0):
+                        hStep = theta * h
+                        xNew  = self._getDense(x, h, K, np.array([theta]))[0]
+                    self._eventsNo += 1
+
+                    # Chattering: events keep coming back at the same time
+                    isRepeated = tEvent is not None and t + hStep - tEvent <= 10.0 * self._eventTol
+                    eventsNo   = eventsNo + 1 if isRepeated else 1
+                    tEvent     = t + hStep
+                    assert eventsNo <= self._maxEvents, \
+                           '[Error] Chattering: ' + str(eventsNo) + ' consecutive events at t = ' + \
+                           str(tEvent)
+
+            # Outputs inside the step (dense output, all at once):
+            jEnd = int(np.searchsorted(aTimes, t + hStep, side='left'))
+            if(jEnd > j):
+                xDense = self._getDense(x, h, K, (aTimes[j:jEnd] - t) / h)
+                for jDense in range(j,jEnd):
+                    self._evaluate(aInputs, aTimes[jDense], xDense[jDense - j])
+                    aLog(jDense)
+                j = jEnd
+
+            self._stepsNo += 1
+            t  = tEnd if t + hStep >= tEnd else t + hStep
+            x  = xNew
+            h  = h * factor
+
+        # Blocks keep the final state:
+        self._setStates(x)
@@ -0,0 +1,112 @@
+# [Description]:
+#   - Model-level state store: every stateful block (Delay, Integrator)
+#     owns a slot of a single NumPy array with separate current/next
+#     buffers. Update, reset and snapshots become array operations
+#   - Only float states are stored; int/bool states keep their own
+#     buffers (and exact values)
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import numpy as np
+
+# -------------------------------------------------------------------------
+# State store
+# -------------------------------------------------------------------------
+
+class StateStore:
+
+    def __init__(self, aSchedule, lanesNo=None):
+        # [Description]: Bind the state ports of every stateful block of
+        #                aSchedule to one array
+        # [Inputs]:
+        #   - aSchedule: Compiled model (see msim.compiler)
+        #   - lanesNo: Number of batch lanes (see helpers.run). States
+        #              have shape [slot, lane]
+        laneShape = () if lanesNo is None else (lanesNo,)
+
+        # Assign slots:
+        self._ports     = []
+        self._slots     = dict()
+        otherBlocks     = []
+        for iBlock in aSchedule.getUpdateList():
+            statePorts = iBlock.getStatePorts()
+            if(not statePorts or any(portH.getType() is not float for portH in statePorts)):
+                # Stateful block without float state ports, keep its
+                # update():
+                otherBlocks.append(iBlock)
+                continue
+            self._slots[id(iBlock)] = len(self._ports)
+            self._ports.extend(statePorts)
+
+        slotsNo       = len(self._ports)
+        self._current = np.zeros((slotsNo,) + laneShape,dtype=float)
+        self._next    = np.zeros((slotsNo,) + laneShape,dtype=float)
+
+        for iSlot,portH in enumerate(self._ports):
+            portH.bindBuffers(self._current,self._next,iSlot)
+
+        # Initial state from the blocks own reset (not the current state,
+        # the model may have run already):
+        current = self._current.copy()
+        for iBlock in aSchedule.getUpdateList():
+            if(id(iBlock) in self._slots):
+                iBlock.reset()
+        self._initial = self._current.copy()
+        np.copyto(self._current,current)
+
+        # Integrators are updated in one vector operation:
+        integrators    = [iBlock for iBlock in aSchedule.getUpdateList()
+                          if iBlock.getBlockType() == 'Integrator' and
+                          id(iBlock) in self._slots]
+        self._intSlots = np.array([self._slots[id(iBlock)] for iBlock in integrators],
+                                  dtype=int)
+        self._ts       = np.array([iBlock._ts for iBlock in integrators],dtype=float)
+        if(lanesNo is not None and self._ts.ndim == 1):
+            # Same ts on every lane:
+            self._ts = self._ts[:,np.newaxis]
+        self._uDot     = np.zeros((len(integrators),) + laneShape,dtype=float)
+        self._uDotGets = [iBlock.getInport('uDot').getValue for iBlock in integrators]
+
+        # Remaining updates (Delay next values are written on execute()):
+        self._otherBlocks  = otherBlocks
+        self._otherUpdates = [iBlock.update for iBlock in otherBlocks]
+
+    # -------------
+    # Get/set
+    # -------------
+    def getSlot(self, aBlock) -> int:
+        return self._slots[id(aBlock)]
+
+    def getSlotsNo(self) -> int:
+        return len(self._ports)
+
+    def getState(self) -> np.ndarray:
+        # Snapshot of the current state
+        return self._current.copy()
+
+    def setState(self, aState):
+        np.copyto(self._current,aState)
+        np.copyto(self._next,aState)
+
+    # -------------
+    # Simulate
+    # -------------
+    def update(self):
+        # [Description]: Update every state at once. All states see the
+        #                values of the current step (no update order)
+        if(len(self._intSlots)):
+            for i,iGet in enumerate(self._uDotGets):
+                self._uDot[i] = iGet()
+            self._next[self._intSlots] = self._current[self._intSlots] + \
+                                         self._ts * self._uDot
+
+        for iCall in self._otherUpdates:
+            iCall()
+
+        np.copyto(self._current,self._next)
+
+    def reset(self):
+        self.setState(self._initial)
+        for iBlock in self._otherBlocks:
+            iBlock.reset()
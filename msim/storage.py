@@ -0,0 +1,316 @@
+# [Description]:
+#   - Binary model files (.npz). A Subsystem is saved as arrays:
+#       - Blocks in depth-first order: type, name, parent, data type,
+#         operators, parameter (gain, ts, initial value) and sample time
+#       - Ports (block inports then outports, in order): index of the
+#         source port, connected port, subscribers and value (Outports:
+#         constants, states)
+#       - Execution order of the compiled schedule and compile options
+#   - loadModel rebuilds the blocks with their constructors but wires the
+#     ports in bulk from the index arrays (no connectTo) and restores the
+#     schedule without sorting. Large arrays are memory-mapped
+#   - Only the msim.lib blocks are supported
+
+# -------------------------------------------------------------------------
+# Imports
+# -------------------------------------------------------------------------
+import json
+import zipfile
+
+import numpy as np
+
+import msim.lib      as mlib
+import msim.compiler as mcomp
+
+# -------------------------------------------------------------------------
+# Block encoding
+# -------------------------------------------------------------------------
+
+BLOCK_TYPES = ['Subsystem','Constant','Gain','Delay','Switch','Sum','Logical',
+               'Relational','Integrator','Product']
+DATA_TYPES  = [bool,int,float]
+
+# Operator functions -> symbols (Sum, Product, Logical, Relational):
+OPERATORS   = {np.add:'+', np.subtract:'-', np.multiply:'*', np.divide:'/',
+               np.logical_and:'and', np.logical_or:'or', np.logical_xor:'xor',
+               np.greater:'>', np.greater_equal:'>=', np.less:'<', np.less_equal:'<='}
+
+# Arrays of at least this size [bytes] are memory-mapped by loadModel:
+MMAP_BYTES  = 1 << 16
+
+def getBlockArgs(aBlock) -> tuple:
+    # [Description]: (data type, operators, parameter) of a block, the
+    #                constructor arguments besides name and parent
+    aType = aBlock.getBlockType()
+    assert aType in BLOCK_TYPES, '[Error] Cannot save block type: ' + str(aType)
+    if(aType == 'Subsystem'):
+        return None, '', None
+    elif(aType == 'Constant'):
+        return aBlock._type, '', aBlock.getOutport('y').getValue()
+    elif(aType == 'Gain'):
+        return aBlock.getOutport('y').getType(), '', aBlock._gain
+    elif(aType == 'Delay'):
+        return aBlock.getOutport('y').getType(), '', aBlock._initValue
+    elif(aType == 'Switch'):
+        return aBlock.getOutport('y').getType(), '', None
+    elif(aType in ['Sum','Product']):
+        return aBlock.getOutport('y').getType(), \
+               ''.join(OPERATORS[iOperator] for iOperator in aBlock._operatorsH), None
+    elif(aType == 'Logical'):
+        return bool, OPERATORS[aBlock._operatorH], None
+    elif(aType == 'Relational'):
+        return aBlock.getInport('u0').getType(), OPERATORS[aBlock._operatorH], None
+    else:
+        return float, '', aBlock._ts
+
+def createBlock(aType: str, aName: str, aDataType, aOperators: str, aParam, aParent):
+    # [Description]: Block from its getBlockArgs
+    if(aType == 'Subsystem'):
+        return mlib.Subsystem(aName,aParent)
+    elif(aType in ['Constant','Gain','Delay']):
+        return getattr(mlib,aType)(aName,aDataType,aParam,aParent)
+    elif(aType == 'Switch'):
+        return mlib.Switch(aName,aDataType,aParent)
+    elif(aType in ['Sum','Product']):
+        operators = list(aOperators)
+        return getattr(mlib,aType)(aName,aDataType,operators,aParent)
+    elif(aType == 'Logical'):
+        return mlib.Logical(aName,aOperators,aParent)
+    elif(aType == 'Relational'):
+        return mlib.Relational(aName,aDataType,aOperators,aParent)
+    else:
+        return mlib.Integrator(aName,aParam,aParent)
+
+def packValues(aValues: list, aPrefix: str) -> dict:
+    # [Description]: Arrays of a list of values (None, scalars or arrays):
+    #                kind (0: None, 1: float, 2: int/bool, 3: array),
+    #                float and int columns, one member per array
+    kinds   = np.zeros(len(aValues),dtype=np.uint8)
+    floats  = np.zeros(len(aValues),dtype=np.float64)
+    ints    = np.zeros(len(aValues),dtype=np.int64)
+    arrays  = dict()
+    for i,aValue in enumerate(aValues):
+        if(aValue is None):
+            continue
+        elif(np.ndim(aValue) > 0):
+            kinds[i] = 3
+            arrays[aPrefix + str(i)] = np.asarray(aValue)
+        elif(isinstance(aValue,(float,np.floating))):
+            kinds[i], floats[i] = 1, aValue
+        else:
+            kinds[i], ints[i] = 2, aValue
+    arrays.update({aPrefix + 'Kinds':kinds, aPrefix + 'Floats':floats, aPrefix + 'Ints':ints})
+    return arrays
+
+def unpackValues(aArrays: dict, aPrefix: str, aTypes: list) -> list:
+    # [Description]: Values of packValues, scalars as aTypes (None: as
+    #                saved)
+    kinds  = aArrays[aPrefix + 'Kinds'].tolist()
+    floats = aArrays[aPrefix + 'Floats'].tolist()
+    ints   = aArrays[aPrefix + 'Ints'].tolist()
+    values = [None] * len(kinds)
+    for i,(aKind,aType) in enumerate(zip(kinds,aTypes)):
+        if(aKind == 3):
+            values[i] = aArrays[aPrefix + str(i)]
+        elif(aKind != 0):
+            aValue    = floats[i] if aKind == 1 else ints[i]
+            values[i] = aValue if aType is None else aType(aValue)
+    return values
+
+# -------------------------------------------------------------------------
+# Save/load
+# -------------------------------------------------------------------------
+
+def getNodes(aBlock) -> tuple:
+    # [Description]: aBlock and all its blocks, depth first (parents
+    #                before children, as flattenBlocks)
+    # [Outputs]:
+    #   - nodes: List of blocks
+    #   - parents: Index of the Subsystem holding each block (-1: aBlock)
+    nodes   = []
+    parents = []
+    pending = [(aBlock,-1)]
+    while pending:
+        iBlock, iParent = pending.pop()
+        parents.append(iParent)
+        nodes.append(iBlock)
+        iNode = len(nodes) - 1
+        pending.extend((iSub,iNode) for iSub in reversed(iBlock.getSubBlocks()))
+    return nodes, parents
+
+def getPorts(aNodes: list) -> list:
+    # Every port of aNodes: inports then outports of each block
+    return [portH for iBlock in aNodes
+            for aPorts in (iBlock._inports,iBlock._outports) for portH in aPorts.values()]
+
+def saveModel(aBlock, aPath: str):
+    # [Description]: Save a Subsystem (and its compiled schedule, if any)
+    #                to an uncompressed .npz file
+    nodes, parents = getNodes(aBlock)
+    ports          = getPorts(nodes)
+    portIndex      = {id(portH):i for i,portH in enumerate(ports)}
+
+    # Blocks:
+    args      = [getBlockArgs(iBlock) for iBlock in nodes]
+    sampleTimes = np.array([iBlock.getSampleTime() or (np.nan,np.nan) for iBlock in nodes],
+                           dtype=np.float64).reshape(len(nodes),2)
+    arrays: dict = {'names':     np.array([str(iBlock.getName()) for iBlock in nodes]),
+                    'types':     np.array([BLOCK_TYPES.index(iBlock.getBlockType()) for iBlock in nodes],
+                                          dtype=np.uint8),
+                    'parents':   np.array(parents,dtype=np.int64),
+                    'dataTypes': np.array([-1 if aType is None else DATA_TYPES.index(aType)
+                                           for aType,_,_ in args],dtype=np.int8),
+                    'operators': np.array([aOperators for _,aOperators,_ in args]),
+                    'sampleTimes': sampleTimes}
+    arrays.update(packValues([aParam for _,_,aParam in args],'param'))
+
+    # Subsystem ports (added by the user) and their types:
+    subPorts  = [(i,isOut,aName,DATA_TYPES.index(portH.getType()))
+                 for i,iBlock in enumerate(nodes) if iBlock.getBlockType() == 'Subsystem'
+                 for isOut,aPorts in enumerate((iBlock._inports,iBlock._outports))
+                 for aName,portH in aPorts.items()]
+    arrays['subPortNodes'] = np.array([iPort[0] for iPort in subPorts],dtype=np.int64)
+    arrays['subPortIsOut'] = np.array([iPort[1] for iPort in subPorts],dtype=bool)
+    arrays['subPortNames'] = np.array([iPort[2] for iPort in subPorts],dtype=str)
+    arrays['subPortTypes'] = np.array([iPort[3] for iPort in subPorts],dtype=np.int8)
+
+    # Connectivity (ports outside the model are dropped), subscribers as
+    # one array with the start of each port:
+    arrays['sources']   = np.array([portIndex.get(id(portH.getSource()),-1) for portH in ports],
+                                   dtype=np.int64)
+    arrays['connected'] = np.array([portIndex.get(id(portH._connectedTo),-1) for portH in ports],
+                                   dtype=np.int64)
+    subscribers = [[portIndex[id(iSub)] for iSub in portH._subscribers if id(iSub) in portIndex]
+                   for portH in ports]
+    arrays['subscribers']      = np.array([i for aList in subscribers for i in aList],
+                                          dtype=np.int64)
+    arrays['subscriberStarts'] = np.cumsum([0] + [len(aList) for aList in subscribers],
+                                           dtype=np.int64)
+
+    # Values:
+    values = []
+    for portH in ports:
+        if(isinstance(portH,mlib.Outport) and portH.getSource() is None):
+            try:
+                values.append(portH.getValue())
+                continue
+            except AttributeError:
+                # Not set yet
+                pass
+        values.append(None)
+    arrays.update(packValues(values,'port'))
+
+    # Schedule (execution order of the leaf blocks) and options. Loops
+    # are found again on load:
+    schedule = aBlock._schedule
+    if(schedule is not None and not aBlock._compileOptions.get('solveLoops',False)):
+        arrays['order'] = np.array([schedule.getBlockIndex(iBlock)
+                                    for iBlock in schedule.getExecuteList()],dtype=np.int64)
+    arrays['isCompiled']     = np.array(schedule is not None)
+    arrays['compileOptions'] = np.array(json.dumps(aBlock._compileOptions))
+    np.savez(aPath, **arrays)
+
+def loadArrays(aPath: str, mmap: bool = True) -> dict:
+    # [Description]: Members of an .npz file. Uncompressed numeric members
+    #                of at least MMAP_BYTES are memory-mapped (read-only)
+    arrays = dict()
+    with zipfile.ZipFile(aPath) as zipH, open(aPath,'rb') as fileH:
+        for info in zipH.infolist():
+            aName = info.filename[:-len('.npy')]
+            with zipH.open(info) as memberH:
+                version = np.lib.format.read_magic(memberH)
+                if(version == (1,0)):
+                    aShape, isFortran, dtype = np.lib.format.read_array_header_1_0(memberH)
+                else:
+                    aShape, isFortran, dtype = np.lib.format.read_array_header_2_0(memberH)
+                headerSize = memberH.tell()
+
+            isMapped = (mmap and info.compress_type == zipfile.ZIP_STORED and
+                        not dtype.hasobject and
+                        int(np.prod(aShape)) * dtype.itemsize >= MMAP_BYTES)
+            if(not isMapped):
+                arrays[aName] = np.lib.format.read_array(zipH.open(info))
+                continue
+
+            # Data offset: local file header (30 bytes, name, extra field)
+            fileH.seek(info.header_offset + 26)
+            nameSize, extraSize = np.frombuffer(fileH.read(4),dtype='<u2')
+            offset = info.header_offset + 30 + int(nameSize) + int(extraSize) + headerSize
+            arrays[aName] = np.memmap(aPath, dtype=dtype, mode='r', offset=offset,
+                                      shape=aShape, order='F' if isFortran else 'C')
+    return arrays
+
+def loadModel(aPath: str, mmap: bool = True):
+    # [Description]: Subsystem saved by saveModel. The schedule is
+    #                restored without sorting if it was compiled
+    arrays    = loadArrays(aPath, mmap)
+    names     = arrays['names'].tolist()
+    types     = [BLOCK_TYPES[i] for i in arrays['types'].tolist()]
+    parents   = arrays['parents'].tolist()
+    dataTypes = [None if i < 0 else DATA_TYPES[i] for i in arrays['dataTypes'].tolist()]
+    operators = arrays['operators'].tolist()
+    params    = unpackValues(arrays,'param',[iType if aType in ['Constant','Delay'] else None
+                                             for aType,iType in zip(types,dataTypes)])
+
+    # Blocks (parents first):
+    nodes: list = []
+    for aName,aType,iParent,aDataType,aOperators,aParam in zip(names,types,parents,dataTypes,
+                                                               operators,params):
+        parentH = None if iParent < 0 else nodes[iParent]
+        iBlock  = createBlock(aType,aName,aDataType,aOperators,aParam,parentH)
+        if(parentH is not None):
+            parentH.addBlock(iBlock)
+        nodes.append(iBlock)
+
+    for iNode,isOut,aName,iType in zip(arrays['subPortNodes'].tolist(),
+                                       arrays['subPortIsOut'].tolist(),
+                                       arrays['subPortNames'].tolist(),
+                                       arrays['subPortTypes'].tolist()):
+        addPort = nodes[iNode].addOutport if isOut else nodes[iNode].addInport
+        addPort(aName,DATA_TYPES[iType])
+
+    for iBlock,aSampleTime in zip(nodes,arrays['sampleTimes'].tolist()):
+        if(not np.isnan(aSampleTime[0])):
+            mlib.Block.setSampleTime(iBlock,*aSampleTime)
+
+    # Wiring: sources, subscribers and roots (pointer jumping) at once
+    ports   = getPorts(nodes)
+    sources = np.asarray(arrays['sources'])
+    assert len(sources) == len(ports), '[Error] Ports do not match the saved model'
+    roots   = np.where(sources >= 0,sources,np.arange(len(ports)))
+    while True:
+        nextRoots = roots[roots]
+        if(np.array_equal(nextRoots,roots)):
+            break
+        roots = nextRoots
+
+    for portH,iSource,iRoot in zip(ports,sources.tolist(),roots.tolist()):
+        if(iSource >= 0):
+            portH._sourcePort = ports[iSource]
+            portH._rootPort   = ports[iRoot]
+    for portH,iConnected in zip(ports,arrays['connected'].tolist()):
+        if(iConnected >= 0):
+            portH._connectedTo = ports[iConnected]
+
+    subscribers = [ports[i] for i in arrays['subscribers'].tolist()]
+    starts      = arrays['subscriberStarts'].tolist()
+    for i,portH in enumerate(ports):
+        if(starts[i + 1] > starts[i]):
+            portH._subscribers = tuple(subscribers[starts[i]:starts[i + 1]])
+
+    # Values (constants, states, preset outputs):
+    values = unpackValues(arrays,'port',[portH.getType() for portH in ports])
+    for portH,aValue in zip(ports,values):
+        if(aValue is not None):
+            portH.setValue(aValue)
+
+    # Schedule:
+    root = nodes[0]
+    root._compileOptions.update(json.loads(str(arrays['compileOptions'])))
+    if('order' in arrays):
+        options        = {aName:aValue for aName,aValue in root._compileOptions.items()
+                          if aName in ['solver','optimize','changeDriven']}
+        root._schedule = mcomp.compileWithOrder(root, arrays['order'], **options)
+    elif(bool(arrays['isCompiled'])):
+        root.compile()
+    return root
@@ -0,0 +1,63 @@
+import json
+import numpy          as np
+import msim.benchmark as mBench
+
+class Test_benchmark:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_workloads(self):
+        simIn = mBench.createSimIn(20)
+        for aName,aBuild in mBench.WORKLOADS.items():
+            simOut = aBuild(3).sim(simIn)
+            assert simOut['y'].shape == (20,), aName
+
+        # Chain of 3 subsystems around one Gain:
+        simOut = mBench.buildConnectChain(3).sim(simIn)
+        assert np.allclose(simOut['y'],2.0 * simIn['u'])
+
+    def test_suite(self):
+        suite = mBench.runSuite(['gainChain','connectChain'],[2,4],
+                                samplesNo=20,repeatsNo=1)
+
+        assert len(suite['results']) == 4
+        iResult = suite['results'][0]
+        assert (iResult['workload'],iResult['size']) == ('gainChain',2)
+        assert iResult['stepsPerSecond'] > 0.0
+        assert iResult['peakMemory'] > 0
+        assert 'Steps/s' in mBench.formatResults(suite)
+
+    def test_compare(self):
+        baseline = {'results':[{'workload':'gainChain','size':10,
+                                'stepsPerSecond':1000.0,'setupTime':1.0,
+                                'peakMemory':100}]}
+        suite    = json.loads(json.dumps(baseline))
+        assert mBench.compareResults(suite,baseline) == []
+
+        suite['results'][0]['stepsPerSecond'] = 700.0
+        suite['results'][0]['peakMemory']     = 110
+        regressions = mBench.compareResults(suite,baseline,0.2)
+        assert [iReg['metric'] for iReg in regressions] == ['stepsPerSecond']
+        assert abs(regressions[0]['change'] + 0.3) < 1e-9
+
+    def test_main(self, tmp_path):
+        aPath = str(tmp_path / 'results.json')
+        args  = ['--workloads','sumFanIn','--sizes','2','--samples','10',
+                 '--repeats','1','--output',aPath]
+        assert mBench.main(args) == 0
+
+        # Comparing against itself with a large tolerance passes:
+        assert mBench.main(args[:-2] + ['--baseline',aPath,'--tolerance','100']) == 0
@@ -0,0 +1,143 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.changes   as mChanges
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildLogic():
+    # sw = (u > 0.5) and (v > 0.5), y = sw ? 2*u : -v
+    # z accumulates y (Delay read before it executes)
+    sys1   = mlib.Subsystem('logic1',None)
+    u      = sys1.addInport('u',float)
+    v      = sys1.addInport('v',float)
+    y      = sys1.addOutport('y',float)
+    z      = sys1.addOutport('z',float)
+
+    half   = sys1.addBlock(mlib.Constant('half',float,0.5,sys1))
+    rel1   = sys1.addBlock(mlib.Relational('rel1',float,'>',sys1))
+    rel2   = sys1.addBlock(mlib.Relational('rel2',float,'>',sys1))
+    and1   = sys1.addBlock(mlib.Logical('and1','and',sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+    gain2  = sys1.addBlock(mlib.Gain('gain2',float,-1.0,sys1))
+    sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+    sum1   = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+
+    rel1.connectTo('u0',u)
+    rel1.connectTo('u1',half.getOutport('y'))
+    rel2.connectTo('u0',v)
+    rel2.connectTo('u1',half.getOutport('y'))
+    and1.connectTo('u0',rel1.getOutport('y'))
+    and1.connectTo('u1',rel2.getOutport('y'))
+    gain1.connectTo('u',u)
+    gain2.connectTo('u',v)
+    sw1.connectTo('on',gain1.getOutport('y'))
+    sw1.connectTo('off',gain2.getOutport('y'))
+    sw1.connectTo('sw',and1.getOutport('y'))
+    sum1.connectTo('u0',sw1.getOutport('y'))
+    sum1.connectTo('u1',delay1.getOutport('y'))
+    delay1.connectTo('u',sum1.getOutport('y'))
+    y.connectTo(sw1.getOutport('y'))
+    z.connectTo(sum1.getOutport('y'))
+    return sys1
+
+class Test_ChangeTracker:
+    def setup_class(self):
+        # Class setup: piecewise constant inputs (20 and 50 samples)
+        time  = np.arange(0.0,10.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.repeat(np.random.rand(len(time) // 20),20)
+        simIn['v']    = np.repeat(np.random.rand(len(time) // 50),50)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_results(self):
+        expected = buildLogic().sim(self.simIn)
+
+        sys1     = buildLogic()
+        schedule = sys1.compile(changeDriven=True)
+        simOut   = sys1.sim(self.simIn)
+        for aName in ['y','z']:
+            isEqual, msg = mHelp.verifyEqual(simOut[aName],expected[aName],1e-12)
+            assert isEqual, msg
+
+        # Only the accumulator (sum1, delay1) and Constant run every step:
+        stats   = schedule.getChangeStats()
+        stepsNo = len(self.simIn['time'])
+        assert stats['executedNo'] + stats['skippedNo'] == 9 * stepsNo
+        assert stats['executedNo'] < 4 * stepsNo
+
+        # Reset: all dirty again, same results
+        sys1.reset()
+        simOut = sys1.sim(self.simIn)
+        assert np.array_equal(simOut['z'],expected['z'])
+
+    def test_rerun(self):
+        # New simulation ports on every run (the schedule kept the old ones):
+        sys1  = mlib.Subsystem('double1',None)
+        u     = sys1.addInport('u',float)
+        y     = sys1.addOutport('y',float)
+        gain1 = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+        gain1.connectTo('u',u)
+        y.connectTo(gain1.getOutport('y'))
+        sys1.compile(changeDriven=True)
+        sys1.addBlock(mlib.Constant('one',float,1.0,sys1))
+
+        simIn = {'time':np.arange(0.0,0.5,0.1),'u':np.arange(10.0,15.0)}
+        assert np.array_equal(sys1.sim(simIn)['y'],[20.0,22.0,24.0,26.0,28.0])
+        sys1.reset()
+        assert np.array_equal(sys1.sim(simIn)['y'],[20.0,22.0,24.0,26.0,28.0])
+        assert sys1.getSchedule().getChangeStats()['skippedNo'] == 0
+
+    def test_options(self):
+        # Works with the optimizer (gain1 input is not constant: kept)
+        sys1 = buildLogic()
+        sys1.compile(changeDriven=True,optimize=True)
+        simOut = sys1.sim(self.simIn,lanesNo=2)
+        assert np.array_equal(simOut['z'][:,0],buildLogic().sim(self.simIn)['z'])
+
+        sys1 = buildLogic()
+        with pytest.raises(AssertionError, match='euler'):
+            sys1.compile(changeDriven=True,solver='rk4')
+
+    def test_stateStore(self):
+        # Delay outputs are views of the store, updated in place:
+        sys1   = mlib.Subsystem('chain1',None)
+        y      = sys1.addOutport('y',float)
+        two    = sys1.addBlock(mlib.Constant('two',float,2.0,sys1))
+        sum1   = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+        delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+        gain1  = sys1.addBlock(mlib.Gain('gain1',float,1.0,sys1))
+        sum1.connectTo('u0',two.getOutport('y'))
+        sum1.connectTo('u1',delay1.getOutport('y'))
+        delay1.connectTo('u',sum1.getOutport('y'))
+        gain1.connectTo('u',delay1.getOutport('y'))
+        y.connectTo(gain1.getOutport('y'))
+
+        sys1.compile(changeDriven=True)
+        sys1.createStateStore(lanesNo=2)
+        simOut = sys1.sim({'time':np.arange(0.0,0.5,0.1)},lanesNo=2)
+        assert np.array_equal(simOut['y'][:,1],[0.0,2.0,4.0,6.0,8.0])
+
+    def test_isSame(self):
+        assert mChanges.isSame(1.0,1.0)
+        assert not mChanges.isSame(1.0,np.float64(1.0))
+        assert not mChanges.isSame(np.float64('nan'),np.float64('nan'))
+        assert mChanges.isSame(np.array([1,2]),np.array([1,2]))
+        assert not mChanges.isSame(np.array([1,2]),np.array([1,2,3]))
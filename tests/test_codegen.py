@@ -0,0 +1,148 @@
+import numpy          as np
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.codegen   as mGen
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildModel(aTs=0.1, aThreshold=0.5):
+    # [u0,u1]-->[Relational]-->[Logical]-->[Switch.sw]
+    # [u0]-->[Gain]-->[Product]-->[Switch.on]-->[Sum]-->[Delay]-->[y]
+    # [u1]-->[Integrator]-------->[Switch.off]    ^-[Constant]
+    sys1 = mlib.Subsystem('sys1',None)
+    u0   = sys1.addInport('u0',float)
+    u1   = sys1.addInport('u1',float)
+    en   = sys1.addInport('en',bool)
+    y    = sys1.addOutport('y',float)
+    z    = sys1.addOutport('z',float)
+    w    = sys1.addOutport('w',bool)
+
+    thr1   = sys1.addBlock(mlib.Constant('thr1',float,aThreshold,sys1))
+    gt1    = sys1.addBlock(mlib.Relational('gt1',float,'>',sys1))
+    and1   = sys1.addBlock(mlib.Logical('and1','and',sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,3.0,sys1))
+    prod1  = sys1.addBlock(mlib.Product('prod1',float,'*/',sys1))
+    int1   = sys1.addBlock(mlib.Integrator('int1',aTs,sys1))
+    sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+    sum1   = sys1.addBlock(mlib.Sum('sum1',float,'+-',sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,1.0,sys1))
+
+    gt1.connectTo('u0',u0)
+    gt1.connectTo('u1',thr1.getOutport('y'))
+    and1.connectTo('u0',gt1.getOutport('y'))
+    and1.connectTo('u1',en)
+    gain1.connectTo('u',u0)
+    prod1.connectTo('u0',gain1.getOutport('y'))
+    prod1.connectTo('u1',thr1.getOutport('y'))
+    int1.connectTo('uDot',u1)
+    int1.connectTo('r',gt1.getOutport('y'))
+    int1.connectTo('IC',u0)
+    sw1.connectTo('sw',and1.getOutport('y'))
+    sw1.connectTo('on',prod1.getOutport('y'))
+    sw1.connectTo('off',int1.getOutport('y'))
+    sum1.connectTo('u0',sw1.getOutport('y'))
+    sum1.connectTo('u1',thr1.getOutport('y'))
+    delay1.connectTo('u',sum1.getOutport('y'))
+    y.connectTo(delay1.getOutport('y'))
+    z.connectTo(sum1.getOutport('y'))
+    w.connectTo(and1.getOutport('y'))
+    return sys1
+
+def buildChainModel(aTs=0.1):
+    # [u0]-->[Delay]-->[Integrator]-->[Integrator]-->[y]
+    sys1 = mlib.Subsystem('chain1',None)
+    u0   = sys1.addInport('u0',float)
+    y    = sys1.addOutport('y',float)
+
+    ic1    = sys1.addBlock(mlib.Constant('ic1',float,0.0,sys1))
+    r1     = sys1.addBlock(mlib.Constant('r1',bool,False,sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+    int1   = sys1.addBlock(mlib.Integrator('int1',aTs,sys1))
+    int2   = sys1.addBlock(mlib.Integrator('int2',aTs,sys1))
+
+    delay1.connectTo('u',u0)
+    for iInt,uDot in [(int1,delay1.getOutport('y')),(int2,int1.getOutport('y'))]:
+        iInt.connectTo('uDot',uDot)
+        iInt.connectTo('r',r1.getOutport('y'))
+        iInt.connectTo('IC',ic1.getOutport('y'))
+    y.connectTo(int2.getOutport('y'))
+    return sys1
+
+class Test_GeneratedModel:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,2.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u0']   = np.random.rand(*time.shape)
+        simIn['u1']   = np.random.rand(*time.shape)
+        simIn['en']   = np.random.rand(*time.shape) > 0.3
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_source(self):
+        sys1     = buildModel()
+        simPorts = {aName:mlib.Outport(sys1.getInport(aName).getType(),None)
+                    for aName in sys1.getInportNames()}
+        for aName,portH in simPorts.items():
+            sys1.getInport(aName).connectTo(portH)
+
+        source, namespace, layout = mGen.generateSource(sys1,simPorts)
+
+        assert source.startswith('def _simulate(')
+        assert 'getValue' not in source
+        assert layout['inputs']  == ['u0','u1','en']
+        assert layout['outputs'] == ['y','z','w']
+        assert len(layout['states']) == 2
+
+    def test_matchesStepping(self):
+        stepModel = buildModel()
+        genModel  = buildModel()
+        simOutStep = stepModel.sim(self.simIn)
+        simOutGen  = genModel.sim(self.simIn,generated=True)
+
+        for aName in ['y','z']:
+            isEqual, msg = mHelp.verifyEqual(simOutGen[aName],
+                                             simOutStep[aName],
+                                             0.001) # tol
+            assert isEqual, msg
+        assert all(simOutGen['w'] == simOutStep['w'])
+
+        # Final state is written back to the blocks:
+        for aName in ['delay1','int1']:
+            stepValue = stepModel.getSubBlock(aName).getOutport('y').getValue()
+            genValue  = genModel.getSubBlock(aName).getOutport('y').getValue()
+            assert abs(stepValue - genValue) < 0.001
+
+        # Chained states read the values of the previous step:
+        simIn      = {'time':self.simIn['time'],'u0':self.simIn['u0']}
+        simOutStep = buildChainModel().sim(simIn)
+        simOutGen  = buildChainModel().sim(simIn,generated=True)
+        isEqual, msg = mHelp.verifyEqual(simOutGen['y'],simOutStep['y'],0.001)
+        assert isEqual, msg
+
+    def test_batch(self):
+        ts        = np.array([0.1,0.2])
+        threshold = np.array([0.3,0.7])
+
+        simOutStep = buildModel(ts,threshold).sim(self.simIn,lanesNo=2)
+        simOutGen  = buildModel(ts,threshold).sim(self.simIn,lanesNo=2,
+                                                 generated=True)
+
+        isEqual, msg = mHelp.verifyEqual(simOutGen['y'].ravel(),
+                                         simOutStep['y'].ravel(),
+                                         0.001) # tol
+        assert isEqual, msg
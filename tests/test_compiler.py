@@ -0,0 +1,313 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.compiler  as mComp
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildAccumulator(aName='acc1', aParent=None):
+    # [u]--->[Gain]--->[Sum]--------------->[y]
+    #                    ^           |
+    #                    |--[Delay]<-|
+    sys1 = mlib.Subsystem(aName, aParent)
+    u    = sys1.addInport('u', float)
+    y    = sys1.addOutport('y', float)
+
+    # Added out of order on purpose:
+    sum1   = sys1.addBlock(mlib.Sum('sum1', float, '++', sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1', float, 0.0, sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1', float, 2.0, sys1))
+
+    gain1.connectTo('u', u)
+    sum1.connectTo('u0', gain1.getOutport('y'))
+    sum1.connectTo('u1', delay1.getOutport('y'))
+    delay1.connectTo('u', sum1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+
+    return sys1
+
+class Test_compileModel:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_leaf(self):
+        gain1    = mlib.Gain('gain1', float, 2.0, None)
+        schedule = mComp.compileModel(gain1)
+
+        assert schedule.getBlocks()      == [gain1]
+        assert schedule.getExecuteList() == [gain1]
+        assert schedule.getUpdateList()  == []
+
+    def test_order(self):
+        sys1     = buildAccumulator()
+        schedule = sys1.compile()
+
+        names = [iBlock.getName() for iBlock in schedule.getExecuteList()]
+        assert names == ['gain1', 'sum1', 'delay1']
+
+        names = [iBlock.getName() for iBlock in schedule.getUpdateList()]
+        assert names == ['delay1']
+
+    def test_connections(self):
+        sys1     = buildAccumulator()
+        schedule = sys1.compile()
+
+        sumIdx   = schedule.getBlockIndex(sys1.getSubBlock('sum1'))
+        delayIdx = schedule.getBlockIndex(sys1.getSubBlock('delay1'))
+        gainIdx  = schedule.getBlockIndex(sys1.getSubBlock('gain1'))
+
+        links = {(c.dstBlock, c.dstPort): (c.srcBlock, c.srcPort)
+                 for c in schedule.getConnections()}
+
+        assert links[(sumIdx, 'u0')]  == (gainIdx, 'y')
+        assert links[(sumIdx, 'u1')]  == (delayIdx, 'y')
+        assert links[(delayIdx, 'u')] == (sumIdx, 'y')
+        assert links[(gainIdx, 'u')]  == (None, None)
+
+        assert schedule.getOutputs() == {'y': (sumIdx, 'y')}
+
+    def test_nested(self):
+        top  = mlib.Subsystem('top', None)
+        u    = top.addInport('u', float)
+        y    = top.addOutport('y', float)
+
+        acc1  = top.addBlock(buildAccumulator('acc1', top))
+        gain2 = top.addBlock(mlib.Gain('gain2', float, -1.0, top))
+
+        acc1.connectTo('u', u)
+        gain2.connectTo('u', acc1.getOutport('y'))
+        y.connectTo(gain2.getOutport('y'))
+
+        schedule = top.compile()
+        names    = [iBlock.getName() for iBlock in schedule.getExecuteList()]
+        assert names == ['gain1', 'sum1', 'delay1', 'gain2']
+
+    def test_algebraicLoop(self):
+        # [Sum]--->[Gain]--->[Sum] without Delay
+        sys1  = mlib.Subsystem('loop1', None)
+        u     = sys1.addInport('u', float)
+        sum1  = sys1.addBlock(mlib.Sum('sum1', float, '++', sys1))
+        gain1 = sys1.addBlock(mlib.Gain('gain1', float, 0.5, sys1))
+
+        sum1.connectTo('u0', u)
+        sum1.connectTo('u1', gain1.getOutport('y'))
+        gain1.connectTo('u', sum1.getOutport('y'))
+
+        with pytest.raises(AssertionError, match='Algebraic loop'):
+            sys1.compile()
+
+    def test_integratorLoop(self):
+        # Integrator breaks the loop through uDot:
+        # [Integrator]--->[Gain]--->[Integrator.uDot]
+        sys1  = mlib.Subsystem('decay1', None)
+        r     = sys1.addInport('r', bool)
+        IC    = sys1.addInport('IC', float)
+        y     = sys1.addOutport('y', float)
+        int1  = sys1.addBlock(mlib.Integrator('int1', 0.1, sys1))
+        gain1 = sys1.addBlock(mlib.Gain('gain1', float, -1.0, sys1))
+
+        int1.connectTo('r', r)
+        int1.connectTo('IC', IC)
+        int1.connectTo('uDot', gain1.getOutport('y'))
+        gain1.connectTo('u', int1.getOutport('y'))
+        y.connectTo(int1.getOutport('y'))
+
+        time  = np.arange(0.0, 1.0, 0.1, dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['r']    = np.zeros_like(time, dtype=bool)
+        simIn['IC']   = np.ones_like(time)
+        simIn['r'][0] = True
+
+        simOut    = sys1.sim(simIn)
+        outExpect = 0.9 ** np.arange(len(time))
+
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],
+                                         outExpect,
+                                         0.001) # tol
+        assert isEqual, msg
+
+    def test_updateOrder(self):
+        # Double integrator: int2 reads the state of int1 of the current
+        # step, whatever the order the blocks were added in
+        for isReversed in [False, True]:
+            sys1  = mlib.Subsystem('double1', None)
+            u     = sys1.addInport('u', float)
+            y     = sys1.addOutport('y', float)
+            rOff  = sys1.addBlock(mlib.Constant('rOff', bool, False, sys1))
+            ic0   = sys1.addBlock(mlib.Constant('ic0', float, 0.0, sys1))
+            int1  = mlib.Integrator('int1', 1.0, sys1)
+            int2  = mlib.Integrator('int2', 1.0, sys1)
+            for iBlock in ([int2, int1] if isReversed else [int1, int2]):
+                sys1.addBlock(iBlock)
+
+            for iBlock in [int1, int2]:
+                iBlock.connectTo('r', rOff.getOutport('y'))
+                iBlock.connectTo('IC', ic0.getOutport('y'))
+            int1.connectTo('uDot', u)
+            int2.connectTo('uDot', int1.getOutport('y'))
+            y.connectTo(int2.getOutport('y'))
+
+            simIn = dict()
+            simIn['time'] = np.arange(0.0, 5.0, 1.0, dtype=float)
+            simIn['u']    = np.ones_like(simIn['time'])
+            assert np.array_equal(sys1.sim(simIn)['y'], [0.0, 0.0, 1.0, 3.0, 6.0])
+
+            # Same as the state store:
+            sys1.reset()
+            sys1.createStateStore()
+            assert np.array_equal(sys1.sim(simIn)['y'], [0.0, 0.0, 1.0, 3.0, 6.0])
+
+class Test_Subsystem:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_basic(self):
+        sys1 = buildAccumulator()
+
+        assert sys1.getName()         == 'acc1'
+        assert sys1.getBlockType()    == 'Subsystem'
+
+        assert sys1.getInportNames()  == ['u']
+        assert sys1.getOutportNames() == ['y']
+        assert sys1.isStateful()
+
+    def test_run(self):
+        sys1 = buildAccumulator()
+
+        simIn = dict()
+        simIn['time'] = np.arange(0.0, 2.0, 0.1, dtype=float)
+        simIn['u']    = np.random.rand(*simIn['time'].shape)
+        simOut        = sys1.sim(simIn)
+
+        outExpect     = np.cumsum(simIn['u'] * 2.0)
+
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],
+                                         outExpect,
+                                         0.001) # tol
+        assert isEqual, msg
+
+class Test_multiRate:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,1.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def buildModel(self):
+        # [u]--->[Gain(fast)]-------------->[yFast]
+        #    \-->[Gain(0.1 s)]--->[Delay(0.1 s)]--->[ySlow, yDelay]
+        sys1   = mlib.Subsystem('rates1', None)
+        u      = sys1.addInport('u', float)
+        yFast  = sys1.addOutport('yFast', float)
+        ySlow  = sys1.addOutport('ySlow', float)
+        yDelay = sys1.addOutport('yDelay', float)
+
+        gain1  = sys1.addBlock(mlib.Gain('gain1', float, 2.0, sys1))
+        gain2  = sys1.addBlock(mlib.Gain('gain2', float, 3.0, sys1))
+        delay1 = sys1.addBlock(mlib.Delay('delay1', float, -1.0, sys1))
+        gain2.setSampleTime(0.1)
+        delay1.setSampleTime(0.1)
+
+        gain1.connectTo('u', u)
+        gain2.connectTo('u', u)
+        delay1.connectTo('u', gain2.getOutport('y'))
+        yFast.connectTo(gain1.getOutport('y'))
+        ySlow.connectTo(gain2.getOutport('y'))
+        yDelay.connectTo(delay1.getOutport('y'))
+        return sys1
+
+    def test_hits(self):
+        sys1   = self.buildModel()
+        simOut = sys1.sim(self.simIn)
+        u      = self.simIn['u']
+        hits   = (np.arange(len(u)) // 10) * 10
+
+        assert np.allclose(simOut['yFast'], 2.0 * u)
+        # Slow outputs hold between hits:
+        assert np.allclose(simOut['ySlow'], 3.0 * u[hits])
+        # Slow state changes on the next hit only:
+        assert np.allclose(simOut['yDelay'][:10], -1.0)
+        assert np.allclose(simOut['yDelay'][10:], 3.0 * u[hits[10:] - 10])
+
+        # Slow blocks execute once every 10 steps:
+        phases = sys1.getSchedule()._phases
+        assert len(phases) == 10
+        assert len(phases[0][0]) == 3 and len(phases[1][0]) == 1
+
+    def test_offset(self):
+        sys1 = self.buildModel()
+        sys1.getSubBlock('gain2').setSampleTime(0.1, 0.05)
+        sys1.getSubBlock('delay1').setSampleTime(0.1, 0.05)
+        sys1.getSubBlock('gain2').getOutport('y').setValue(0.0)
+
+        simOut = sys1.sim(self.simIn)
+        u      = self.simIn['u']
+        assert np.allclose(simOut['ySlow'][:5], 0.0)
+        assert np.allclose(simOut['ySlow'][5:15], 3.0 * u[5])
+        assert np.allclose(simOut['yDelay'][15:25], 3.0 * u[5])
+
+    def test_reset(self):
+        sys1   = self.buildModel()
+        first  = sys1.sim(self.simIn)
+        sys1.reset()
+        second = sys1.sim(self.simIn)
+        assert np.array_equal(first['yDelay'], second['yDelay'])
+
+    def test_invalid(self):
+        sys1 = self.buildModel()
+        sys1.getSubBlock('gain2').setSampleTime(0.015)
+        with pytest.raises(AssertionError, match='multiple of the base step'):
+            sys1.sim(self.simIn)
+
+        sys1 = self.buildModel()
+        with pytest.raises(AssertionError, match='stepped mode'):
+            sys1.sim(self.simIn, vectorized=True)
+
+    def test_subsystem(self):
+        sys1 = buildAccumulator()
+        sys1.setSampleTime(0.1)
+        assert all(iBlock.getSampleTime() == (0.1, 0.0) for iBlock in sys1.getSubBlocks())
@@ -0,0 +1,201 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildSupervisor():
+    # alarm = (u > 0.5) and (v > 0.5), y = alarm ? 1 : -v
+    # yLast = y on the previous step (Delay)
+    sys1   = mlib.Subsystem('supervisor1',None)
+    u      = sys1.addInport('u',float)
+    v      = sys1.addInport('v',float)
+    y      = sys1.addOutport('y',float)
+    yLast  = sys1.addOutport('yLast',float)
+
+    half   = sys1.addBlock(mlib.Constant('half',float,0.5,sys1))
+    one    = sys1.addBlock(mlib.Constant('one',float,1.0,sys1))
+    rel1   = sys1.addBlock(mlib.Relational('rel1',float,'>',sys1))
+    rel2   = sys1.addBlock(mlib.Relational('rel2',float,'>',sys1))
+    and1   = sys1.addBlock(mlib.Logical('and1','and',sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,-1.0,sys1))
+    sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+
+    rel1.connectTo('u0',u)
+    rel1.connectTo('u1',half.getOutport('y'))
+    rel2.connectTo('u0',v)
+    rel2.connectTo('u1',half.getOutport('y'))
+    and1.connectTo('u0',rel1.getOutport('y'))
+    and1.connectTo('u1',rel2.getOutport('y'))
+    gain1.connectTo('u',v)
+    sw1.connectTo('on',one.getOutport('y'))
+    sw1.connectTo('off',gain1.getOutport('y'))
+    sw1.connectTo('sw',and1.getOutport('y'))
+    delay1.connectTo('u',sw1.getOutport('y'))
+    y.connectTo(sw1.getOutport('y'))
+    yLast.connectTo(delay1.getOutport('y'))
+    return sys1
+
+def buildRates():
+    # [u]--->[Gain(fast)]-------------->[yFast]
+    #    \-->[Gain(0.1 s)]--->[Delay(0.1 s)]--->[ySlow, yDelay]
+    sys1   = mlib.Subsystem('rates1',None)
+    u      = sys1.addInport('u',float)
+    yFast  = sys1.addOutport('yFast',float)
+    ySlow  = sys1.addOutport('ySlow',float)
+    yDelay = sys1.addOutport('yDelay',float)
+
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+    gain2  = sys1.addBlock(mlib.Gain('gain2',float,3.0,sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,-1.0,sys1))
+    gain2.setSampleTime(0.1,0.05)
+    delay1.setSampleTime(0.1,0.05)
+    gain2.getOutport('y').setValue(0.0)
+
+    gain1.connectTo('u',u)
+    gain2.connectTo('u',u)
+    delay1.connectTo('u',gain2.getOutport('y'))
+    yFast.connectTo(gain1.getOutport('y'))
+    ySlow.connectTo(gain2.getOutport('y'))
+    yDelay.connectTo(delay1.getOutport('y'))
+    return sys1
+
+def buildDecay():
+    # x' = -x + u, x(0) = 0 (forward Euler, ts = 0.01)
+    sys1  = mlib.Subsystem('decay1',None)
+    u     = sys1.addInport('u',float)
+    y     = sys1.addOutport('y',float)
+    ic0   = sys1.addBlock(mlib.Constant('ic0',float,0.0,sys1))
+    rOff  = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+    int1  = sys1.addBlock(mlib.Integrator('int1',0.01,sys1))
+    gain1 = sys1.addBlock(mlib.Gain('gain1',float,-1.0,sys1))
+    sum1  = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+
+    int1.connectTo('r',rOff.getOutport('y'))
+    int1.connectTo('IC',ic0.getOutport('y'))
+    int1.connectTo('uDot',sum1.getOutport('y'))
+    gain1.connectTo('u',int1.getOutport('y'))
+    sum1.connectTo('u0',gain1.getOutport('y'))
+    sum1.connectTo('u1',u)
+    y.connectTo(int1.getOutport('y'))
+    return sys1
+
+class InPlaceGain(mlib.Gain):
+    # Gain writing into its previous output array
+    def execute(self):
+        self._outports['y'].getValue()[...] = self._inports['u'].getValue() * self._gain
+
+def buildInPlace():
+    # [u]--->[InPlaceGain]--->[Gain]--->[y]
+    sys1  = mlib.Subsystem('inPlace1',None)
+    u     = sys1.addInport('u',float)
+    y     = sys1.addOutport('y',float)
+    gain1 = sys1.addBlock(InPlaceGain('gain1',float,2.0,sys1))
+    gain2 = sys1.addBlock(mlib.Gain('gain2',float,3.0,sys1))
+    gain1.getOutport('y').setValue(np.zeros(2))
+    gain1.connectTo('u',u)
+    gain2.connectTo('u',gain1.getOutport('y'))
+    y.connectTo(gain2.getOutport('y'))
+    return sys1
+
+class Test_EventEngine:
+    def setup_class(self):
+        # Class setup: sparse input changes (every 100 and 250 samples)
+        time  = np.arange(0.0,20.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.repeat(np.random.rand(len(time) // 100),100)
+        simIn['v']    = np.repeat(np.random.rand(len(time) // 250),250)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_supervisor(self):
+        expected = buildSupervisor().sim(self.simIn)
+
+        sys1   = buildSupervisor()
+        simOut = sys1.sim(self.simIn,eventDriven=True)
+        for aName in ['y','yLast']:
+            assert np.array_equal(simOut[aName],expected[aName])
+
+        # Blocks only run around the input changes (the Delay sleeps
+        # while its state and input hold):
+        stats   = sys1.getSchedule().getEventStats()
+        stepsNo = len(self.simIn['time'])
+        assert stats['stepsNo'] == stepsNo
+        assert stats['eventStepsNo'] < stepsNo / 20
+        assert stats['updateCalls'] < stepsNo / 20
+        assert stats['executeCalls'] < stepsNo / 5
+
+    def test_rates(self):
+        simIn    = {'time':self.simIn['time'],'u':np.random.rand(len(self.simIn['time']))}
+        expected = buildRates().sim(simIn)
+        simOut   = buildRates().sim(simIn,eventDriven=True)
+        for aName in ['yFast','ySlow','yDelay']:
+            assert np.array_equal(simOut[aName],expected[aName])
+
+    def test_integrator(self):
+        simIn    = {'time':self.simIn['time'],'u':self.simIn['u']}
+        expected = buildDecay().sim(simIn)
+        sys1     = buildDecay()
+        simOut   = sys1.sim(simIn,eventDriven=True)
+        assert np.array_equal(simOut['y'],expected['y'])
+
+        # Final state is committed as in the stepped mode:
+        assert sys1.getSubBlock('int1').getOutport('y').getValue() == expected['y'][-1] + \
+               0.01 * (simIn['u'][-1] - expected['y'][-1])
+
+    def test_rerun(self):
+        # Compiled before the inputs are connected, run twice:
+        expected = buildSupervisor().sim(self.simIn)
+        for options in [{},{'solveLoops':True}]:
+            sys1 = buildSupervisor()
+            sys1.compile(**options)
+            for _ in range(2):
+                simOut = sys1.sim(self.simIn,eventDriven=True)
+                for aName in ['y','yLast']:
+                    assert np.array_equal(simOut[aName],expected[aName])
+                sys1.reset()
+
+        # Workers reset the model before every run:
+        simOutList = mHelp.runMany(buildSupervisor,[self.simIn] * 2,workers=1,
+                                   eventDriven=True)
+        for simOut in simOutList:
+            assert np.array_equal(simOut['y'],expected['y'])
+
+    def test_inPlace(self):
+        # Outputs updated in place are still compared with their old value:
+        simIn    = {'time':self.simIn['time'],'u':self.simIn['u']}
+        expected = buildInPlace().sim(simIn,lanesNo=2)
+        simOut   = buildInPlace().sim(simIn,lanesNo=2,eventDriven=True)
+        assert np.array_equal(simOut['y'],expected['y'])
+
+    def test_options(self):
+        # Batch and logging:
+        logging  = mHelp.LogSpec(signals=['y'],decimation=7,window=(1.0,15.0))
+        expected = buildSupervisor().sim(self.simIn,lanesNo=3,logging=logging)
+        simOut   = buildSupervisor().sim(self.simIn,lanesNo=3,logging=logging,eventDriven=True)
+        assert np.array_equal(simOut['time'],expected['time'])
+        assert np.array_equal(simOut['y'],expected['y'])
+
+        with pytest.raises(AssertionError, match='exclusive'):
+            buildSupervisor().sim(self.simIn,eventDriven=True,vectorized=True)
+
+        sys1 = buildDecay()
+        sys1.compile(solver='rk4')
+        with pytest.raises(AssertionError, match='euler'):
+            sys1.sim({'time':self.simIn['time'],'u':self.simIn['u']},eventDriven=True)
@@ -1,6 +1,50 @@
+import numpy        as np
+import pytest
 import msim.helpers as mHelp
 import msim.lib as mlib
 
+def buildSweepModel():
+    # [u]--->[Gain]--->[Integrator]--->[y]
+    sys1 = mlib.Subsystem('sweep1',None)
+    u    = sys1.addInport('u',float)
+    r    = sys1.addInport('r',bool)
+    y    = sys1.addOutport('y',float)
+    yDot = sys1.addOutport('yDot',float)
+
+    ic1   = sys1.addBlock(mlib.Constant('ic1',float,0.0,sys1))
+    gain1 = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+    int1  = sys1.addBlock(mlib.Integrator('int1',0.1,sys1))
+
+    gain1.connectTo('u',u)
+    int1.connectTo('uDot',gain1.getOutport('y'))
+    int1.connectTo('r',r)
+    int1.connectTo('IC',ic1.getOutport('y'))
+    y.connectTo(int1.getOutport('y'))
+    yDot.connectTo(gain1.getOutport('y'))
+    return sys1
+
+def buildChainModel():
+    # [u]--->[Delay]--->[Integrator]--->[Integrator]--->[y]
+    sys1 = mlib.Subsystem('chain1',None)
+    u    = sys1.addInport('u',float)
+    y    = sys1.addOutport('y',float)
+    v    = sys1.addOutport('v',float)
+
+    ic1    = sys1.addBlock(mlib.Constant('ic1',float,0.0,sys1))
+    r1     = sys1.addBlock(mlib.Constant('r1',bool,False,sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+    int1   = sys1.addBlock(mlib.Integrator('int1',0.1,sys1))
+    int2   = sys1.addBlock(mlib.Integrator('int2',0.1,sys1))
+
+    delay1.connectTo('u',u)
+    for iInt,uDot in [(int1,delay1.getOutport('y')),(int2,int1.getOutport('y'))]:
+        iInt.connectTo('uDot',uDot)
+        iInt.connectTo('r',r1.getOutport('y'))
+        iInt.connectTo('IC',ic1.getOutport('y'))
+    y.connectTo(int2.getOutport('y'))
+    v.connectTo(int1.getOutport('y'))
+    return sys1
+
 class Test_isMsimNumType:
     def setup_class(self):
         # Class setup:
@@ -127,6 +171,45 @@ class Test_simData:
         resultA = self.simExample.getSignalSample('a',1)    
         assert resultA == 1.0
 
+    def test_timeIndex(self):
+        assert self.simExample.getTimeIndex(0.25) == 2
+        assert self.simExample.getTimeIndex(-1.0) == 0
+        assert self.simExample.getTimeIndex([0.0,0.45,9.0]).tolist() == [0,4,5]
+
+        assert self.simExample.getSignalAt('b',0.31) == 9.0
+
+    def test_timeSlice(self):
+        simSlice = self.simExample.getTimeSlice(0.1,0.3)
+
+        assert simSlice.getSignalNames() == ['time','a','b']
+        assert simSlice.getColumn('a').tolist() == [1.0,2.0,3.0]
+        assert np.shares_memory(simSlice.getColumn('b'),self.simExample.getColumn('b'))
+
+    def test_interpolate(self):
+        result = self.simExample.interpolate('a',[0.05,0.25,1.0])
+        assert np.allclose(result,[0.5,2.5,5.0])
+
+        result = self.simExample.interpolate('a',[0.05,0.25],'previous')
+        assert result.tolist() == [0.0,2.0]
+
+        simFlags = mHelp.simData(time=np.array([0.0,1.0,2.0]),
+                                 flag=np.array([False,True,False]),
+                                 lanes=np.array([[0.0,1.0],[2.0,3.0],[4.0,5.0]]))
+        assert simFlags.interpolate('flag',[0.5,1.5]).tolist() == [False,True]
+        assert np.allclose(simFlags.interpolate('lanes',[0.5]),[[1.0,2.0]])
+
+    def test_resample(self):
+        simNew = self.simExample.resample(np.array([0.0,0.25]))
+
+        assert simNew.getSignalNames() == ['time','a','b']
+        assert np.allclose(simNew.getColumn('b'),[6.0,8.5])
+
+    def test_structuredArray(self):
+        result = self.simExample.toStructuredArray()
+
+        assert result.dtype.names == ('time','a','b')
+        assert result['b'][3] == 9.0
+
 class Test_assertEqual:
     def setup_class(self):
         # Class setup:
@@ -159,4 +242,457 @@ class Test_assertEqual:
         isEqual, msg = mHelp.verifyEqual(listA,listB,0.001)
         assert not isEqual
         assert msg == 'Index [2]: 2.0 is not equal to 2.01'
-        
\ No newline at end of file
+
+    def test_notEqualArray(self):
+        arrayA = np.zeros((4,2))
+        arrayB = np.zeros((4,2))
+        arrayB[3,1] = 1.0
+
+        isEqual, msg = mHelp.verifyEqual(arrayA,arrayB,0.001)
+        assert not isEqual
+        assert msg == 'Index [(3, 1)]: 0.0 is not equal to 1.0'
+
+class Test_compareSimOut:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_report(self):
+        simOutA = {'y':np.array([0.0,1.0,2.5,3.0,np.nan]),
+                   'b':np.array([True,False,True]),
+                   'n':np.array([1,2,3]),
+                   'l':np.zeros((3,2))}
+        simOutB = {'y':np.array([0.0,1.1,2.0,3.0,np.nan]),
+                   'b':np.array([True,True,True]),
+                   'n':np.array([1,2,3]),
+                   'l':np.array([[0.0,0.0],[0.0,0.0],[0.0,0.5]])}
+
+        reports = mHelp.compareSimOut(simOutA,simOutB,aTol=0.2)
+
+        assert not reports['y'].isEqual
+        assert reports['y'].mismatchNo == 1
+        assert reports['y'].firstIndex == 2
+        assert reports['y'].worstIndex == 2
+        assert abs(reports['y'].maxError - 0.5) < 1e-9
+
+        assert reports['b'].mismatchNo == 1
+        assert reports['b'].firstIndex == 1
+        assert reports['n'].isEqual
+        assert reports['n'].firstIndex is None
+        assert reports['l'].worstIndex == 2
+
+    def test_tolerances(self):
+        simOutA = {'y':np.array([100.0,np.nan]),'z':np.array([1.0])}
+        simOutB = {'y':np.array([101.0,np.nan]),'z':np.array([np.nan])}
+
+        assert not mHelp.compareSimOut(simOutA,simOutB,aTol=0.1)['y'].isEqual
+        assert mHelp.compareSimOut(simOutA,simOutB,aRelTol=0.01)['y'].isEqual
+        assert not mHelp.compareSimOut(simOutA,simOutB,equalNan=False)['y'].isEqual
+
+        report = mHelp.compareSimOut(simOutA,simOutB,aTol=10.0)['z']
+        assert not report.isEqual
+        assert report.maxError == np.inf
+        
+class Test_runVectorized:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,2.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u0']   = np.random.rand(*time.shape)
+        simIn['u1']   = np.random.rand(*time.shape)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def buildModel(self):
+        # [u0,u1]--->[Relational]--->[Switch]--->[Gain]--->[Sum]--->[y]
+        #                                  [Constant]---^   |
+        #                                    [Delay]<-------|--->[z]
+        sys1 = mlib.Subsystem('sys1',None)
+        u0   = sys1.addInport('u0',float)
+        u1   = sys1.addInport('u1',float)
+        y    = sys1.addOutport('y',float)
+        z    = sys1.addOutport('z',float)
+
+        gt1    = sys1.addBlock(mlib.Relational('gt1',float,'>',sys1))
+        sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+        gain1  = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+        const1 = sys1.addBlock(mlib.Constant('const1',float,0.5,sys1))
+        prod1  = sys1.addBlock(mlib.Product('prod1',float,'**',sys1))
+        sum1   = sys1.addBlock(mlib.Sum('sum1',float,'+-+',sys1))
+        delay1 = sys1.addBlock(mlib.Delay('delay1',float,1.0,sys1))
+
+        gt1.connectTo('u0',u0)
+        gt1.connectTo('u1',u1)
+        sw1.connectTo('sw',gt1.getOutport('y'))
+        sw1.connectTo('on',u0)
+        sw1.connectTo('off',u1)
+        gain1.connectTo('u',sw1.getOutport('y'))
+        prod1.connectTo('u0',gain1.getOutport('y'))
+        prod1.connectTo('u1',u1)
+        sum1.connectTo('u0',prod1.getOutport('y'))
+        sum1.connectTo('u1',const1.getOutport('y'))
+        sum1.connectTo('u2',delay1.getOutport('y'))
+        delay1.connectTo('u',sum1.getOutport('y'))
+        y.connectTo(prod1.getOutport('y'))
+        z.connectTo(sum1.getOutport('y'))
+        return sys1
+
+    def test_stateless(self):
+        sw1 = mlib.Switch('sw1',float,None)
+
+        simIn = dict()
+        simIn['time'] = self.simIn['time']
+        simIn['on']   = self.simIn['u0']
+        simIn['off']  = self.simIn['u1']
+        simIn['sw']   = self.simIn['u0'] > 0.5
+
+        simOut    = sw1.sim(simIn,vectorized=True)
+        outExpect = np.where(simIn['sw'],simIn['on'],simIn['off'])
+
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],outExpect,0.001)
+        assert isEqual, msg
+
+    def test_vectorizableBlocks(self):
+        sys1      = self.buildModel()
+        schedule  = sys1.compile()
+        vectorIdx = mHelp.getVectorizableBlocks(schedule)
+
+        names = {schedule.getBlocks()[i].getName() for i in vectorIdx}
+        assert names == {'gt1','sw1','gain1','const1','prod1'}
+
+    def test_matchesStepping(self):
+        simOutStep   = self.buildModel().sim(self.simIn)
+        simOutVector = self.buildModel().sim(self.simIn,vectorized=True)
+
+        for aName in ['y','z']:
+            isEqual, msg = mHelp.verifyEqual(simOutVector[aName],
+                                             simOutStep[aName],
+                                             0.001) # tol
+            assert isEqual, msg
+
+    def test_chainedStates(self):
+        # Every next state is computed before any is committed:
+        simIn = {'time':np.arange(0.0,1.0,0.1),'u':np.ones(10)}
+        simOutStep   = buildChainModel().sim(simIn)
+        simOutVector = buildChainModel().sim(simIn,vectorized=True)
+
+        assert np.allclose(simOutStep['y'][:5],[0.0,0.0,0.0,0.01,0.03])
+        for aName in ['y','v']:
+            assert np.allclose(simOutVector[aName],simOutStep[aName])
+
+class Test_runBatch:
+    def setup_class(self):
+        # Class setup:
+        self.time   = np.arange(0.0,2.0,0.1,dtype=float)
+        self.lanesNo = 3
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def buildModel(self, aTs, aThreshold, aInit):
+        # [u]-->[Relational]-->[Integrator.r]
+        # [u]-->[Integrator.uDot]-->[Switch.on]-->[y]
+        #       [Delay]------------>[Switch.off]
+        sys1 = mlib.Subsystem('sys1',None)
+        u    = sys1.addInport('u',float)
+        IC   = sys1.addInport('IC',float)
+        y    = sys1.addOutport('y',float)
+
+        thr1   = sys1.addBlock(mlib.Constant('thr1',float,aThreshold,sys1))
+        gt1    = sys1.addBlock(mlib.Relational('gt1',float,'>',sys1))
+        int1   = sys1.addBlock(mlib.Integrator('int1',aTs,sys1))
+        delay1 = sys1.addBlock(mlib.Delay('delay1',float,aInit,sys1))
+        sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+
+        gt1.connectTo('u0',u)
+        gt1.connectTo('u1',thr1.getOutport('y'))
+        int1.connectTo('uDot',u)
+        int1.connectTo('r',gt1.getOutport('y'))
+        int1.connectTo('IC',IC)
+        delay1.connectTo('u',int1.getOutport('y'))
+        sw1.connectTo('sw',gt1.getOutport('y'))
+        sw1.connectTo('on',int1.getOutport('y'))
+        sw1.connectTo('off',delay1.getOutport('y'))
+        y.connectTo(sw1.getOutport('y'))
+        return sys1
+
+    def test_gain(self):
+        gains = np.array([1.0,2.0,3.0])
+        gain1 = mlib.Gain('gain1',float,gains,None)
+
+        simIn = dict()
+        simIn['time'] = self.time
+        simIn['u']    = self.time ** 2
+        simOut        = gain1.sim(simIn,lanesNo=self.lanesNo)
+
+        assert simOut['y'].shape == (len(self.time),self.lanesNo)
+        for j in range(self.lanesNo):
+            isEqual, msg = mHelp.verifyEqual(simOut['y'][:,j],
+                                             simIn['u'] * gains[j],
+                                             0.001) # tol
+            assert isEqual, msg
+
+    def test_matchesSingleRuns(self):
+        ts        = np.array([0.1,0.2,0.5])
+        threshold = np.array([0.3,0.5,0.9])
+        init      = np.array([-1.0,0.0,1.0])
+
+        simIn = dict()
+        simIn['time'] = self.time
+        simIn['u']    = np.random.rand(*self.time.shape)
+        simIn['IC']   = np.random.rand(len(self.time),self.lanesNo)
+
+        for isVector in [False,True]:
+            batchModel = self.buildModel(ts,threshold,init)
+            simOut     = batchModel.sim(simIn,
+                                        vectorized=isVector,
+                                        lanesNo=self.lanesNo)
+
+            for j in range(self.lanesNo):
+                laneIn       = dict(simIn)
+                laneIn['IC'] = simIn['IC'][:,j]
+                laneModel    = self.buildModel(ts[j],threshold[j],init[j])
+                laneOut      = laneModel.sim(laneIn)
+
+                isEqual, msg = mHelp.verifyEqual(simOut['y'][:,j],
+                                                 laneOut['y'],
+                                                 0.001) # tol
+                assert isEqual, msg
+
+class Test_runMany:
+    def setup_class(self):
+        # Class setup:
+        self.simInList = []
+        for k in range(6):
+            time  = np.arange(0.0,1.0 + 0.1*k,0.1,dtype=float)
+            simIn = dict()
+            simIn['time'] = time
+            simIn['u']    = np.random.rand(*time.shape)
+            simIn['r']    = np.zeros_like(time,dtype=bool)
+            self.simInList.append(simIn)
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_rerun(self):
+        # Same model instance, fresh inputs and state:
+        model  = buildSweepModel()
+        simIn  = self.simInList[0]
+        first  = model.sim(simIn)
+        model.reset()
+        second = model.sim(simIn)
+
+        isEqual, msg = mHelp.verifyEqual(first['y'],second['y'],0.001)
+        assert isEqual, msg
+
+    def test_matchesRun(self):
+        simOutList = mHelp.runMany(buildSweepModel,self.simInList,workers=2)
+
+        assert len(simOutList) == len(self.simInList)
+        for simIn,simOut in zip(self.simInList,simOutList):
+            simOutExp = buildSweepModel().sim(simIn)
+            for aName in ['y','yDot']:
+                isEqual, msg = mHelp.verifyEqual(simOut[aName],
+                                                 simOutExp[aName],
+                                                 0.001) # tol
+                assert isEqual, msg
+
+class Test_runStream:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,10.0,0.1,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        simIn['r']    = np.random.rand(*time.shape) > 0.9
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_split(self):
+        chunks = list(mHelp.splitSimIn(self.simIn,30))
+
+        assert [len(chunk['time']) for chunk in chunks] == [30,30,30,10]
+        assert chunks[1]['u'][0] == self.simIn['u'][30]
+
+    def test_matchesRun(self):
+        simOut = buildSweepModel().sim(self.simIn)
+
+        for kwargs in [{},{'generated':True},{'vectorized':True}]:
+            model   = buildSweepModel()
+            chunks  = mHelp.splitSimIn(self.simIn,7)
+            outList = list(mHelp.runStream(model,chunks,**kwargs))
+
+            for aName in ['y','yDot']:
+                streamed = np.concatenate([out[aName] for out in outList])
+                isEqual, msg = mHelp.verifyEqual(streamed,simOut[aName],0.001)
+                assert isEqual, msg
+
+    def test_variableStep(self):
+        # The time between two chunks would not be integrated:
+        chunks = mHelp.splitSimIn(self.simIn,7)
+        with pytest.raises(AssertionError, match='does not run in chunks'):
+            list(mHelp.runStream(buildSweepModel(),chunks,variableStep=mHelp.VariableStep()))
+
+class Test_outDir:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,10.0,0.1,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        simIn['r']    = np.zeros_like(time,dtype=bool)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_record(self,tmp_path):
+        simOut  = buildSweepModel().sim(self.simIn)
+        simFile = buildSweepModel().sim(self.simIn,outDir=str(tmp_path))
+
+        assert simFile.getSignalNames() == ['time','y','yDot']
+        for aName in ['time','y','yDot']:
+            aData = simFile.getSignalData(aName)
+            assert isinstance(aData,np.memmap)
+            assert aData.dtype == simOut[aName].dtype
+            assert np.array_equal(aData,simOut[aName])
+
+    def test_reopen(self,tmp_path):
+        buildSweepModel().sim(self.simIn,outDir=str(tmp_path),
+                              lanesNo=2,generated=True)
+        simFile = mHelp.loadSimData(str(tmp_path))
+
+        assert simFile.getSignalData('y').shape == (len(self.simIn['time']),2)
+        assert simFile.getSignalSample('time',3) == self.simIn['time'][3]
+
+        # Stale files are ignored, a recording is not overwritten:
+        np.save(str(tmp_path / 'b.npy'),np.zeros(10))
+        assert mHelp.loadSimData(str(tmp_path)).getSignalNames() == ['time','y','yDot']
+        with pytest.raises(AssertionError, match='not empty'):
+            buildSweepModel().sim(self.simIn,outDir=str(tmp_path))
+
+    def test_stream(self,tmp_path):
+        # Every chunk keeps its own files:
+        chunks  = mHelp.splitSimIn(self.simIn,40)
+        simOut  = buildSweepModel().sim(self.simIn)
+        outList = list(mHelp.runStream(buildSweepModel(),chunks,outDir=str(tmp_path)))
+
+        assert len(outList) == 3
+        streamed = np.concatenate([out.getSignalData('y') for out in outList])
+        assert np.array_equal(streamed,simOut['y'])
+
+class Test_logging:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,10.0,0.1,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        simIn['r']    = np.zeros_like(time,dtype=bool)
+        self.simIn    = simIn
+        self.logSpec  = mHelp.LogSpec(signals=['y'],decimation=3,window=(1.0,5.0))
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_logSteps(self):
+        time = self.simIn['time']
+
+        assert len(mHelp.getLogSteps(time,None)) == len(time)
+        assert mHelp.getLogSteps(time,mHelp.LogSpec(decimation=40)).tolist() == [0,40,80]
+
+        logSteps = mHelp.getLogSteps(time,self.logSpec)
+        assert logSteps[0] == 10
+        assert time[logSteps[-1]] <= 5.0
+
+    def test_engines(self):
+        simOut   = buildSweepModel().sim(self.simIn)
+        logSteps = mHelp.getLogSteps(self.simIn['time'],self.logSpec)
+
+        for kwargs in [{},{'generated':True},{'vectorized':True}]:
+            simLog = buildSweepModel().sim(self.simIn,logging=self.logSpec,**kwargs)
+
+            assert list(simLog.keys()) == ['time','y']
+            assert np.array_equal(simLog['time'],self.simIn['time'][logSteps])
+            isEqual, msg = mHelp.verifyEqual(simLog['y'],simOut['y'][logSteps],0.001)
+            assert isEqual, msg
+
+    def test_runMany(self):
+        simOutList = mHelp.runMany(buildSweepModel,[self.simIn] * 2,workers=1,
+                                   logging=self.logSpec)
+        simOut     = buildSweepModel().sim(self.simIn,logging=self.logSpec)
+
+        for simLog in simOutList:
+            assert np.array_equal(simLog['time'],simOut['time'])
+            assert np.array_equal(simLog['y'],simOut['y'])
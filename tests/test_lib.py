@@ -117,7 +117,134 @@ class Test_Inport:
         assert inTier1.getValue()   == 2.0
         assert inTier2.getValue()   == 2.0
         assert inTier3.getValue()   == 2.0
-        
+
+    def test_rewire(self):
+        # Subscribers follow the port when it is connected again:
+        outSource1 = mlib.Outport(float,[])
+        outSource2 = mlib.Outport(float,[])
+        inTier1    = mlib.Inport(float,[])
+        inTier2    = mlib.Inport(float,[])
+
+        inTier2.connectTo(inTier1)
+        inTier1.connectTo(outSource1)
+        inTier1.connectTo(outSource2)
+
+        outSource1.setValue(1.0)
+        outSource2.setValue(2.0)
+
+        assert inTier2.getSource() == outSource2
+        assert inTier2.getValue()  == 2.0
+        assert len(outSource1._subscribers) == 0
+
+    def test_rewireTwice(self):
+        # A port connected elsewhere no longer follows its old source:
+        outSources = [mlib.Outport(float,[]) for i in range(3)]
+        inTier1    = mlib.Inport(float,[])
+        inTier2    = mlib.Inport(float,[])
+        for i,portH in enumerate(outSources):
+            portH.setValue(float(i))
+
+        inTier2.connectTo(inTier1)
+        inTier1.connectTo(outSources[0])
+        inTier2.connectTo(outSources[2])
+        inTier1.connectTo(outSources[1])
+
+        assert inTier2.getSource() == outSources[2]
+        assert inTier2.getValue()  == 2.0
+        assert inTier1.getValue()  == 1.0
+        assert len(inTier1._subscribers) == 0
+        assert all(len(portH._subscribers) == 1 for portH in outSources[1:])
+
+    def test_fanOut(self):
+        # Many subscribers: dict while connecting, tuple once compiled
+        sys1  = mlib.Subsystem('fan1',None)
+        u     = sys1.addInport('u',float)
+        gains = [sys1.addBlock(mlib.Gain('gain' + str(i),float,1.0,sys1)) for i in range(1000)]
+        for iGain in gains:
+            iGain.connectTo('u',u)
+            iGain.connectTo('u',u)
+        assert len(u._subscribers) == 1000
+
+        sys1.compile()
+        assert u._subscribers == tuple(iGain.getInport('u') for iGain in gains)
+
+        gains[0].connectTo('u',gains[1].getOutport('y'))
+        assert len(u._subscribers) == 999
+
+    def test_root(self):
+        # Every port reads the end of its chain directly:
+        outSource1 = mlib.Outport(float,[])
+        outSource2 = mlib.Outport(float,[])
+        inTiers    = [mlib.Inport(float,[]) for i in range(5)]
+
+        for i in range(1,5):
+            inTiers[i].connectTo(inTiers[i - 1])
+        inTiers[0].connectTo(outSource1)
+        outSource1.setValue(1.0)
+        outSource2.setValue(2.0)
+
+        assert all(portH.getRoot() is outSource1 for portH in inTiers)
+        assert inTiers[4].getValue() == 1.0
+
+        # Rewiring the middle of the chain updates the ports below:
+        inTiers[2].connectTo(outSource2)
+        assert inTiers[1].getRoot() is outSource1
+        assert inTiers[4].getRoot() is outSource2
+        assert inTiers[4].getValue() == 2.0
+
+    def test_loop(self):
+        inTier1 = mlib.Inport(float,[])
+        inTier2 = mlib.Inport(float,[])
+        inTier2.connectTo(inTier1)
+
+        try:
+            inTier1.connectTo(inTier2)
+            isLoopDetected = False
+        except AssertionError:
+            isLoopDetected = True
+        assert isLoopDetected
+
+class Test_PortTable:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_basic(self):
+        u0    = mlib.Inport(float,None)
+        u1    = mlib.Inport(float,None)
+        table = mlib.PortTable({'u0':u0,'u1':u1})
+
+        assert list(table.keys()) == ['u0','u1']
+        assert table['u1'] is u1
+        assert table.getIndex('u1') == 1
+        assert 'u0' in table and 'y' not in table
+        assert dict(table) == {'u0':u0,'u1':u1}
+        assert len(mlib.EMPTY_TABLE) == 0
+
+    def test_compact(self):
+        gain1 = mlib.Gain('gain1',float,2.0,None)
+        gain2 = mlib.Gain('gain2',float,3.0,None)
+
+        # No per-instance dictionaries:
+        assert not hasattr(gain1,'__dict__')
+        assert not hasattr(gain1.getInport('u'),'__dict__')
+        assert not hasattr(gain1.getOutport('y'),'__dict__')
+
+        # Blocks of the same type share the name -> index map:
+        assert gain1._inports._index is gain2._inports._index
+
 # -------------------------------------------------------------------------
 # Blocks
 # -------------------------------------------------------------------------
@@ -290,6 +417,10 @@ class Test_Delay:
         delay1.execute()
     
         assert outTest.getValue() == 4.0
+
+        # Back to initial value:
+        delay1.reset()
+        assert outTest.getValue() == 2.0
         
     def test_run(self):
         delay1 = mlib.Delay('delay1',# name
@@ -739,6 +870,9 @@ class Test_Integrator:
         int1.execute()
         assert outTest.getValue() == -10.0
 
+        int1.reset()
+        assert outTest.getValue() == 0.0
+
     def test_run(self):
         int1 = mlib.Integrator('Integrator1',1.0,None)
 
@@ -0,0 +1,136 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.compiler  as mComp
+import msim.loops     as mLoops
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildLinearLoop(aGain=0.5):
+    # [u]--->[Sum]--->[y]      y = u + aGain*y
+    #          ^--[Gain]<--|
+    sys1  = mlib.Subsystem('loop1',None)
+    u     = sys1.addInport('u',float)
+    y     = sys1.addOutport('y',float)
+    sum1  = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+    gain1 = sys1.addBlock(mlib.Gain('gain1',float,aGain,sys1))
+
+    sum1.connectTo('u0',u)
+    sum1.connectTo('u1',gain1.getOutport('y'))
+    gain1.connectTo('u',sum1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+def buildQuadraticLoop():
+    # y = u - 0.1*y*y, followed by an accumulator (Delay)
+    sys1   = mlib.Subsystem('loop2',None)
+    u      = sys1.addInport('u',float)
+    y      = sys1.addOutport('y',float)
+    z      = sys1.addOutport('z',float)
+    sum1   = sys1.addBlock(mlib.Sum('sum1',float,'+-',sys1))
+    prod1  = sys1.addBlock(mlib.Product('prod1',float,'**',sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,0.1,sys1))
+    sum2   = sys1.addBlock(mlib.Sum('sum2',float,'++',sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+
+    sum1.connectTo('u0',u)
+    sum1.connectTo('u1',gain1.getOutport('y'))
+    prod1.connectTo('u0',sum1.getOutport('y'))
+    prod1.connectTo('u1',sum1.getOutport('y'))
+    gain1.connectTo('u',prod1.getOutport('y'))
+    sum2.connectTo('u0',sum1.getOutport('y'))
+    sum2.connectTo('u1',delay1.getOutport('y'))
+    delay1.connectTo('u',sum2.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    z.connectTo(sum2.getOutport('y'))
+    return sys1
+
+class Test_AlgebraicLoop:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,1.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_detect(self):
+        sys1     = buildQuadraticLoop()
+        schedule = sys1.compile(solveLoops=True)
+        blocks   = schedule.getBlocks()
+
+        loops = mComp.findAlgebraicLoops(blocks,schedule.getConnections())
+        names = [sorted(blocks[i].getName() for i in iLoop) for iLoop in loops]
+        assert names == [['gain1','prod1','sum1']]
+
+        with pytest.raises(AssertionError, match=r'\[gain1, prod1, sum1\]|\[sum1, prod1, gain1\]'):
+            buildQuadraticLoop().compile()
+
+    def test_linear(self):
+        sys1   = buildLinearLoop()
+        sys1.compile(solveLoops=True)
+        simOut = sys1.sim(self.simIn)
+
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],2.0 * self.simIn['u'],1e-6)
+        assert isEqual, msg
+
+        # Anderson solves a linear loop in a few passes:
+        stats = sys1.getSchedule().getLoops()[0].getStats()
+        assert stats['solvesNo'] == len(self.simIn['time'])
+        assert stats['maxIterations'] <= 4
+        assert stats['tears'] == ['gain1.y'] or stats['tears'] == ['sum1.y']
+
+    def test_nonlinear(self):
+        sys1   = buildQuadraticLoop()
+        sys1.compile(solveLoops=True,tol=1e-12)
+        simOut = sys1.sim(self.simIn)
+
+        y = simOut['y']
+        assert np.allclose(y + 0.1 * y * y,self.simIn['u'],atol=1e-9)
+        assert np.allclose(simOut['z'],np.cumsum(y))
+
+        # Options are kept when the model is compiled again:
+        sys1.addBlock(mlib.Constant('c1',float,0.0,sys1))
+        assert len(sys1.getSchedule().getLoops()) == 1
+
+    def test_batch(self):
+        gains  = np.array([0.5,0.8])
+        sys1   = buildLinearLoop(gains)
+        sys1.compile(solveLoops=True)
+        simOut = sys1.sim(self.simIn,lanesNo=2)
+
+        for j in range(2):
+            expected = self.simIn['u'] / (1.0 - gains[j])
+            isEqual, msg = mHelp.verifyEqual(simOut['y'][:,j],expected,1e-6)
+            assert isEqual, msg
+
+    def test_notConverged(self):
+        # y = u + 2*y diverges with plain iteration:
+        sys1 = buildLinearLoop(2.0)
+        sys1.compile(solveLoops=True,memory=0,maxIterations=20)
+        with pytest.raises(AssertionError, match='did not converge'):
+            sys1.sim(self.simIn)
+
+    def test_tearOrder(self):
+        # Chain 0 -> 1 -> 2 -> 0: one tear
+        blocks       = [mlib.Gain('g' + str(i),float,1.0,None) for i in range(3)]
+        dependencies = [{(2,'y')},{(0,'y')},{(1,'y')}]
+
+        order, tears = mLoops.getTearOrder(blocks,dependencies)
+        assert order == [0,1,2]
+        assert tears == [(2,'y')]
@@ -0,0 +1,153 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.lti       as mLti
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildOscillator(aSize, aTs=0.01):
+    # Chain of damped oscillators (two Integrators each) driven by u:
+    # [u]-->[Sum]-->[Integrator v]-->[Integrator x]-->[y_i]
+    #         ^--[Gain -k]--x  ^--[Gain -c]--v
+    sys1  = mlib.Subsystem('osc1',None)
+    u     = sys1.addInport('u',float)
+    reset = sys1.addBlock(mlib.Constant('reset',bool,False,sys1))
+    zero  = sys1.addBlock(mlib.Constant('zero',float,0.0,sys1))
+    bias  = sys1.addBlock(mlib.Constant('bias',float,0.1,sys1))
+
+    force = u
+    for i in range(aSize):
+        tag   = str(i)
+        sum1  = sys1.addBlock(mlib.Sum('sum' + tag,float,'+--+',sys1))
+        intV  = sys1.addBlock(mlib.Integrator('v' + tag,aTs,sys1))
+        intX  = sys1.addBlock(mlib.Integrator('x' + tag,aTs,sys1))
+        gainK = sys1.addBlock(mlib.Gain('k' + tag,float,1.0 + i,sys1))
+        gainC = sys1.addBlock(mlib.Gain('c' + tag,float,0.2,sys1))
+
+        sum1.connectTo('u0',force)
+        sum1.connectTo('u1',gainK.getOutport('y'))
+        sum1.connectTo('u2',gainC.getOutport('y'))
+        sum1.connectTo('u3',bias.getOutport('y'))
+        intV.connectTo('uDot',sum1.getOutport('y'))
+        intX.connectTo('uDot',intV.getOutport('y'))
+        gainK.connectTo('u',intX.getOutport('y'))
+        gainC.connectTo('u',intV.getOutport('y'))
+        for intH in [intV,intX]:
+            intH.connectTo('r',reset.getOutport('y'))
+            intH.connectTo('IC',zero.getOutport('y'))
+
+        y = sys1.addOutport('y' + tag,float)
+        y.connectTo(intX.getOutport('y'))
+        force = intX.getOutport('y')
+    return sys1
+
+def buildAccumulator():
+    # [u]-->[Gain]-->[Sum]-->[y]
+    #                  ^--[Delay]<--|
+    sys1   = mlib.Subsystem('acc1',None)
+    u      = sys1.addInport('u',float)
+    y      = sys1.addOutport('y',float)
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+    sum1   = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.5,sys1))
+
+    gain1.connectTo('u',u)
+    sum1.connectTo('u0',gain1.getOutport('y'))
+    sum1.connectTo('u1',delay1.getOutport('y'))
+    delay1.connectTo('u',sum1.getOutport('y'))
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+def connectInputs(aBlock):
+    simPorts = {aName:mlib.Outport(aBlock.getInport(aName).getType(),None)
+                for aName in aBlock.getInportNames()}
+    for aName,portH in simPorts.items():
+        aBlock.getInport(aName).connectTo(portH)
+    return simPorts
+
+class Test_extractStateSpace:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,5.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.sin(time)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_matrices(self):
+        sys1       = buildAccumulator()
+        stateSpace = mLti.extractStateSpace(sys1,connectInputs(sys1))
+
+        assert stateSpace.A.tolist() == [[1.0]]
+        assert stateSpace.B.tolist() == [[2.0]]
+        assert stateSpace.C.tolist() == [[1.0]]
+        assert stateSpace.D.tolist() == [[2.0]]
+        assert stateSpace.getState().tolist() == [0.5]
+
+    def test_matchesStepping(self):
+        # Reference uses the state store (simultaneous update)
+        stepModel = buildOscillator(5)
+        stepModel.createStateStore()
+        simOutStep = stepModel.sim(self.simIn)
+        simOutLti  = buildOscillator(5).sim(self.simIn,lti=True)
+
+        for i in range(5):
+            aName = 'y' + str(i)
+            isEqual, msg = mHelp.verifyEqual(simOutLti[aName],
+                                             simOutStep[aName],
+                                             1e-9) # tol
+            assert isEqual, msg
+
+    def test_accumulator(self):
+        simOutStep = buildAccumulator().sim(self.simIn)
+        simOutLti  = buildAccumulator().sim(self.simIn,lti=True)
+
+        isEqual, msg = mHelp.verifyEqual(simOutLti['y'],simOutStep['y'],1e-9)
+        assert isEqual, msg
+
+    def test_nonlinear(self):
+        sys1 = mlib.Subsystem('sys1',None)
+        u    = sys1.addInport('u',float)
+        r    = sys1.addInport('r',bool)
+        y    = sys1.addOutport('y',float)
+        gt1  = sys1.addBlock(mlib.Relational('gt1',float,'>',sys1))
+        int1 = sys1.addBlock(mlib.Integrator('int1',0.1,sys1))
+
+        gt1.connectTo('u0',u)
+        gt1.connectTo('u1',u)
+        int1.connectTo('uDot',u)
+        int1.connectTo('r',r)
+        int1.connectTo('IC',u)
+        y.connectTo(int1.getOutport('y'))
+
+        schedule = sys1.compile()
+        names    = [iBlock.getName() for iBlock in mLti.getNonlinearBlocks(schedule)]
+        assert names == ['gt1','int1']
+
+        with pytest.raises(AssertionError, match='not linear'):
+            mLti.extractStateSpace(sys1,connectInputs(sys1))
+
+    def test_logging(self):
+        logSpec  = mHelp.LogSpec(signals=['y2'],decimation=10)
+        logSteps = mHelp.getLogSteps(self.simIn['time'],logSpec)
+
+        simOut = buildOscillator(3).sim(self.simIn,lti=True)
+        simLog = buildOscillator(3).sim(self.simIn,lti=True,logging=logSpec)
+
+        assert list(simLog.keys()) == ['time','y2']
+        assert np.array_equal(simLog['y2'],simOut['y2'][logSteps])
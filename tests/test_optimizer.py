@@ -0,0 +1,103 @@
+import numpy          as np
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.profiler  as mProf
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildModel():
+    # [c1]->[g1]->[sum1]<-[c2]            (constant: 2*3 + 1 = 7)
+    #               |
+    # [u]-------->[sum2]->[gA]->[gB]->[gC]->[delay1]->[y]
+    #  \--->[gDead]->[delayDead]           (not observed)
+    sys1      = mlib.Subsystem('sys1',None)
+    u         = sys1.addInport('u',float)
+    y         = sys1.addOutport('y',float)
+
+    c1        = sys1.addBlock(mlib.Constant('c1',float,3.0,sys1))
+    c2        = sys1.addBlock(mlib.Constant('c2',float,1.0,sys1))
+    g1        = sys1.addBlock(mlib.Gain('g1',float,2.0,sys1))
+    sum1      = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+    sum2      = sys1.addBlock(mlib.Sum('sum2',float,'++',sys1))
+    gA        = sys1.addBlock(mlib.Gain('gA',float,0.5,sys1))
+    gB        = sys1.addBlock(mlib.Gain('gB',float,-4.0,sys1))
+    gC        = sys1.addBlock(mlib.Gain('gC',float,0.25,sys1))
+    delay1    = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+    gDead     = sys1.addBlock(mlib.Gain('gDead',float,10.0,sys1))
+    delayDead = sys1.addBlock(mlib.Delay('delayDead',float,0.0,sys1))
+
+    g1.connectTo('u',c1.getOutport('y'))
+    sum1.connectTo('u0',g1.getOutport('y'))
+    sum1.connectTo('u1',c2.getOutport('y'))
+    sum2.connectTo('u0',u)
+    sum2.connectTo('u1',sum1.getOutport('y'))
+    gA.connectTo('u',sum2.getOutport('y'))
+    gB.connectTo('u',gA.getOutport('y'))
+    gC.connectTo('u',gB.getOutport('y'))
+    delay1.connectTo('u',gC.getOutport('y'))
+    gDead.connectTo('u',u)
+    delayDead.connectTo('u',gDead.getOutport('y'))
+    y.connectTo(delay1.getOutport('y'))
+    return sys1
+
+class Test_Optimization:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,1.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_report(self):
+        sys1     = buildModel()
+        schedule = sys1.compile(optimize=True)
+
+        report = schedule.getOptimization().getReport()
+        assert report['folded']  == ['g1','sum1']
+        assert sorted(report['removed']) == ['delayDead','gDead']
+        assert report['fused']   == [['gA','gB','gC']]
+
+        # Without the option nothing changes:
+        assert buildModel().compile().getOptimization() is None
+
+    def test_results(self):
+        expected = buildModel().sim(self.simIn)
+
+        sys1   = buildModel()
+        sys1.compile(optimize=True)
+        simOut = sys1.sim(self.simIn)
+
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],expected['y'],1e-12)
+        assert isEqual, msg
+        assert np.allclose(simOut['y'][1:],-0.5 * (self.simIn['u'][:-1] + 7.0))
+
+        # Batch runs use the same calls:
+        sys1.reset()
+        simOut = sys1.sim(self.simIn,lanesNo=2)
+        assert np.allclose(simOut['y'][:,1],expected['y'])
+
+    def test_calls(self):
+        # Only the remaining blocks are called (fused chain as its last Gain):
+        sys1 = buildModel()
+        sys1.compile(optimize=True)
+        with mProf.Profiler(sys1) as profiler:
+            sys1.sim(self.simIn)
+
+        names = sorted(iStats['name'].split('/')[-1] for iStats in profiler.getStats()
+                       if iStats['executeCalls'] + iStats['updateCalls'] > 0)
+        assert names == ['c1','c2','delay1','gC','sum2']
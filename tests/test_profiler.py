@@ -0,0 +1,158 @@
+import json
+import pytest
+import numpy          as np
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.profiler  as mProf
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildModel():
+    # [u]--->[Gain]--->[Product]--->[Integrator]--->[y]
+    #    \-------------^
+    sys1  = mlib.Subsystem('sys1',None)
+    u     = sys1.addInport('u',float)
+    y     = sys1.addOutport('y',float)
+
+    ic1   = sys1.addBlock(mlib.Constant('ic1',float,0.0,sys1))
+    r1    = sys1.addBlock(mlib.Constant('r1',bool,False,sys1))
+    gain1 = sys1.addBlock(mlib.Gain('gain1',float,2.0,sys1))
+    prod1 = sys1.addBlock(mlib.Product('prod1',float,'**',sys1))
+    int1  = sys1.addBlock(mlib.Integrator('int1',0.1,sys1))
+
+    gain1.connectTo('u',u)
+    prod1.connectTo('u0',gain1.getOutport('y'))
+    prod1.connectTo('u1',u)
+    int1.connectTo('uDot',prod1.getOutport('y'))
+    int1.connectTo('r',r1.getOutport('y'))
+    int1.connectTo('IC',ic1.getOutport('y'))
+    y.connectTo(int1.getOutport('y'))
+    return sys1
+
+class Test_Profiler:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,1.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_stats(self):
+        sys1 = buildModel()
+        with mProf.Profiler(sys1) as profiler:
+            simOut = sys1.sim(self.simIn)
+
+        stats = {iStats['name']:iStats for iStats in profiler.getStats()}
+        samplesNo = len(self.simIn['time'])
+
+        assert stats['sys1/prod1']['type'] == 'Product'
+        assert stats['sys1/prod1']['executeCalls'] == samplesNo
+        assert stats['sys1/prod1']['portReads'] == 2 * samplesNo
+        assert stats['sys1/int1']['updateCalls'] == samplesNo
+        assert stats['sys1/gain1']['executeTime'] > 0.0
+
+        # Profiling does not change the results:
+        isEqual, msg = mHelp.verifyEqual(simOut['y'],
+                                         buildModel().sim(self.simIn)['y'],
+                                         0.001) # tol
+        assert isEqual, msg
+
+    def test_stop(self):
+        sys1     = buildModel()
+        profiler = mProf.Profiler(sys1)
+        calls    = list(sys1.getSchedule()._executeCalls)
+
+        profiler.start()
+        assert type(sys1.getSubBlock('gain1').getInport('u')) is mlib.Inport
+
+        # Other models are not profiled:
+        sys2 = buildModel()
+        sys2.sim(self.simIn)
+        assert sys2.getSchedule().getWrapper() is None
+        with pytest.raises(AssertionError, match='already started'):
+            profiler.start()
+        with pytest.raises(AssertionError, match='already wrapped'):
+            mProf.Profiler(sys1).start()
+        profiler.stop()
+
+        # Nothing is wrapped once stopped:
+        assert sys1.getSchedule().getWrapper() is None
+        assert sys1.getSchedule()._executeCalls == calls
+        sys1.sim(self.simIn)
+        assert all(iStats['executeCalls'] == 0 for iStats in profiler.getStats())
+
+        # Stopped on errors too:
+        with pytest.raises(RuntimeError):
+            with mProf.Profiler(sys1):
+                raise RuntimeError('Failed run')
+        assert sys1.getSchedule().getWrapper() is None
+        assert sys1.getSchedule()._executeCalls == calls
+
+    def test_loop(self):
+        # [u]--->[Sum]--->[y], Sum.u1 = 0.5*y
+        sys1  = mlib.Subsystem('loop1',None)
+        u     = sys1.addInport('u',float)
+        y     = sys1.addOutport('y',float)
+        sum1  = sys1.addBlock(mlib.Sum('sum1',float,'+-',sys1))
+        gain1 = sys1.addBlock(mlib.Gain('gain1',float,0.5,sys1))
+        sum1.connectTo('u0',u)
+        sum1.connectTo('u1',gain1.getOutport('y'))
+        gain1.connectTo('u',sum1.getOutport('y'))
+        y.connectTo(sum1.getOutport('y'))
+        sys1.compile(solveLoops=True)
+
+        with mProf.Profiler(sys1) as profiler:
+            sys1.sim(self.simIn)
+
+        # Inports of both blocks on every loop pass:
+        iLoop = sys1.getSchedule().getLoops()[0]
+        stats = {iStats['name']:iStats for iStats in profiler.getStats()}
+        assert stats[iLoop.getName()]['portReads'] == 3 * iLoop.getStats()['iterationsNo']
+
+    def test_stateStore(self):
+        sys1 = buildModel()
+        sys1.createStateStore()
+        with mProf.Profiler(sys1) as profiler:
+            sys1.sim(self.simIn)
+
+        stats = {iStats['name']:iStats for iStats in profiler.getStats()}
+        assert stats['stateStore']['updateCalls'] == len(self.simIn['time'])
+
+    def test_output(self, tmp_path):
+        sys1 = buildModel()
+        with mProf.Profiler(sys1) as profiler:
+            sys1.sim(self.simIn)
+
+        names = [iStats['name'] for iStats in profiler.getStats('name')]
+        assert names == sorted(names)
+
+        table = profiler.getTable(rowsNo=2)
+        assert table.splitlines()[0].startswith('Block')
+        assert len(table.splitlines()) == 4
+
+        # Percent of the whole run, not of the rows shown:
+        percents = [float(iLine.split()[-1]) for iLine in profiler.getTable().splitlines()[2:]]
+        assert abs(sum(percents) - 100.0) < 1.0
+        assert [float(iLine.split()[-1]) for iLine in table.splitlines()[2:]] == percents[:2]
+
+        aPath = str(tmp_path / 'profile.json')
+        profiler.dump(aPath)
+        with open(aPath) as aFile:
+            dumped = json.load(aFile)
+        assert len(dumped) == 5
+        assert 'executePerCall' in dumped[0]
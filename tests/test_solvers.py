@@ -0,0 +1,293 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+import msim.profiler  as mProf
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildOscillator(aTs):
+    # x1' = x2, x2' = -x1 + u, x1(0) = 1  (x1 = cos(t) for u = 0)
+    # A Delay of x1 checks discrete states hold during the stages
+    sys1   = mlib.Subsystem('osc1',None)
+    u      = sys1.addInport('u',float)
+    y      = sys1.addOutport('y',float)
+    z      = sys1.addOutport('z',float)
+
+    ic1    = sys1.addBlock(mlib.Constant('ic1',float,1.0,sys1))
+    ic0    = sys1.addBlock(mlib.Constant('ic0',float,0.0,sys1))
+    r1     = sys1.addBlock(mlib.Delay('r1',bool,True,sys1))
+    rOff   = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+    int1   = sys1.addBlock(mlib.Integrator('int1',aTs,sys1))
+    int2   = sys1.addBlock(mlib.Integrator('int2',aTs,sys1))
+    gain1  = sys1.addBlock(mlib.Gain('gain1',float,-1.0,sys1))
+    sum1   = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+    delay1 = sys1.addBlock(mlib.Delay('delay1',float,0.0,sys1))
+
+    # Reset on the first step sets the initial conditions:
+    r1.connectTo('u',rOff.getOutport('y'))
+    int1.connectTo('uDot',int2.getOutport('y'))
+    int1.connectTo('r',r1.getOutport('y'))
+    int1.connectTo('IC',ic1.getOutport('y'))
+    gain1.connectTo('u',int1.getOutport('y'))
+    sum1.connectTo('u0',gain1.getOutport('y'))
+    sum1.connectTo('u1',u)
+    int2.connectTo('uDot',sum1.getOutport('y'))
+    int2.connectTo('r',r1.getOutport('y'))
+    int2.connectTo('IC',ic0.getOutport('y'))
+    delay1.connectTo('u',int1.getOutport('y'))
+    y.connectTo(int1.getOutport('y'))
+    z.connectTo(delay1.getOutport('y'))
+    return sys1
+
+def getError(aSolver, aTs):
+    time  = np.arange(0.0,5.0,aTs)
+    simIn = {'time':time,'u':np.zeros_like(time)}
+    sys1  = buildOscillator(aTs)
+    sys1.compile(solver=aSolver)
+    simOut = sys1.sim(simIn)
+
+    # Discrete state follows the integrator output by one step:
+    assert np.allclose(simOut['z'][1:],simOut['y'][:-1])
+    return np.max(np.abs(simOut['y'] - np.cos(time)))
+
+class Test_FixedStepSolver:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_order(self):
+        # Error drops with the order of the method:
+        errors = {aSolver:[getError(aSolver,aTs) for aTs in [0.1,0.05]]
+                  for aSolver in ['euler','heun','rk4']}
+
+        assert errors['euler'][0] > 0.1
+        assert errors['heun'][0]  < 0.01
+        assert errors['rk4'][0]   < 1e-5
+        assert 3.0 < errors['heun'][0] / errors['heun'][1] < 5.0
+        assert 12.0 < errors['rk4'][0] / errors['rk4'][1] < 20.0
+
+    def test_largerStep(self):
+        # RK4 with a 20x larger step beats Euler:
+        assert getError('rk4',0.2) < getError('euler',0.01)
+
+    def test_stages(self):
+        sys1     = buildOscillator(0.1)
+        schedule = sys1.compile(solver='rk4')
+        solver   = schedule.getSolver()
+
+        names = sorted(iCall.__self__.getName() for iCall in solver._stageCalls)
+        assert names == ['gain1','sum1']
+        assert [iBlock.getName() for iBlock in solver.getIntegrators()] == ['int1','int2'] or \
+               [iBlock.getName() for iBlock in solver.getIntegrators()] == ['int2','int1']
+
+    def test_invalid(self):
+        with pytest.raises(AssertionError, match='Unknown solver'):
+            buildOscillator(0.1).compile(solver='rk45')
+
+        time  = np.arange(0.0,1.0,0.1)
+        simIn = {'time':time,'u':np.zeros_like(time)}
+        sys1  = buildOscillator(0.1)
+        sys1.compile(solver='heun')
+        with pytest.raises(AssertionError, match='stepped mode'):
+            sys1.sim(simIn,generated=True)
+
+    def test_profiler(self):
+        time  = np.arange(0.0,1.0,0.1)
+        simIn = {'time':time,'u':np.zeros_like(time)}
+        sys1  = buildOscillator(0.1)
+        sys1.compile(solver='rk4')
+        with mProf.Profiler(sys1) as profiler:
+            sys1.sim(simIn)
+
+        stats = {iStats['name']:iStats for iStats in profiler.getStats()}
+        assert stats['solver']['updateCalls'] == len(time)
+
+class Test_VariableStepSolver:
+    def setup_class(self):
+        # Class setup:
+        pass
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def buildDecay(self):
+        # x' = -x + u, x(0) = 0
+        sys1  = mlib.Subsystem('decay1',None)
+        u     = sys1.addInport('u',float)
+        y     = sys1.addOutport('y',float)
+        ic0   = sys1.addBlock(mlib.Constant('ic0',float,0.0,sys1))
+        rOff  = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+        int1  = sys1.addBlock(mlib.Integrator('int1',0.01,sys1))
+        gain1 = sys1.addBlock(mlib.Gain('gain1',float,-1.0,sys1))
+        sum1  = sys1.addBlock(mlib.Sum('sum1',float,'++',sys1))
+
+        int1.connectTo('r',rOff.getOutport('y'))
+        int1.connectTo('IC',ic0.getOutport('y'))
+        int1.connectTo('uDot',sum1.getOutport('y'))
+        gain1.connectTo('u',int1.getOutport('y'))
+        sum1.connectTo('u0',gain1.getOutport('y'))
+        sum1.connectTo('u1',u)
+        y.connectTo(int1.getOutport('y'))
+        return sys1
+
+    def test_oscillator(self):
+        time   = np.arange(0.0,5.0,0.01)
+        simIn  = {'time':time,'u':np.zeros_like(time)}
+        sys1   = buildOscillator(0.01)
+        # Initial state instead of the reset Delay (discrete state):
+        sys1.getSubBlock('delay1').getInport('u').connectTo(sys1.getSubBlock('ic0').getOutport('y'))
+        with pytest.raises(AssertionError, match='only supports Integrator'):
+            sys1.sim(simIn,variableStep=mHelp.VariableStep())
+
+    def test_accuracy(self):
+        # Step input at t = 1 s, long quiescent tail:
+        time  = np.arange(0.0,50.0,0.01)
+        simIn = {'time':time,'u':(time >= 1.0).astype(float)}
+
+        sys1   = self.buildDecay()
+        simOut = sys1.sim(simIn,variableStep=mHelp.VariableStep(rtol=1e-8,atol=1e-10))
+
+        # The input ramps between the samples 0.99 and 1.0 (linear input),
+        # about a step delayed by half a sample:
+        expected = np.where(time >= 1.0,1.0 - np.exp(-(time - 0.995)),0.0)
+        assert np.max(np.abs(simOut['y'] - expected)) < 1e-4
+        assert np.allclose(simOut['time'],time)
+
+        # Far fewer steps than samples:
+        stats = sys1.getSchedule().getVariableStepStats()
+        assert stats['stepsNo'] < len(time) / 10
+
+    def test_dense(self):
+        # Output times between steps follow the solution:
+        time  = np.linspace(0.0,2.0,401)
+        simIn = {'time':time,'u':np.ones_like(time)}
+
+        sys1   = self.buildDecay()
+        simOut = sys1.sim(simIn,variableStep=mHelp.VariableStep(rtol=1e-9,atol=1e-12))
+        assert np.max(np.abs(simOut['y'] - (1.0 - np.exp(-time)))) < 1e-7
+
+        stats = sys1.getSchedule().getVariableStepStats()
+        assert stats['stepsNo'] < 100
+
+        # Final state is kept by the block:
+        assert abs(sys1.getSubBlock('int1').getOutport('y').getValue() - (1.0 - np.exp(-2.0))) < 1e-7
+
+    def test_logging(self):
+        time  = np.linspace(0.0,2.0,401)
+        simIn = {'time':time,'u':np.ones_like(time)}
+
+        simOut = self.buildDecay().sim(simIn,variableStep=mHelp.VariableStep(),
+                                       logging=mHelp.LogSpec(decimation=100))
+        assert len(simOut['y']) == 5
+        assert np.allclose(simOut['y'],1.0 - np.exp(-time[::100]),atol=1e-5)
+
+        # Integrated from the first sample, not from the window start:
+        sys1   = self.buildDecay()
+        simOut = sys1.sim(simIn,variableStep=mHelp.VariableStep(),
+                          logging=mHelp.LogSpec(window=(0.5,0.9)))
+        assert np.allclose(simOut['time'],time[100:181])
+        assert np.allclose(simOut['y'],1.0 - np.exp(-time[100:181]),atol=1e-5)
+        assert abs(sys1.getSubBlock('int1').getOutport('y').getValue() - (1.0 - np.exp(-2.0))) < 1e-5
+
+    def buildSwitched(self):
+        # Clock x' = 1, y' = 1 until x > 0.7, then y' = -2
+        #   y(t) = t (t <= 0.7), 2.1 - 2t (t > 0.7)
+        sys1   = mlib.Subsystem('switched1',None)
+        u      = sys1.addInport('u',float)
+        y      = sys1.addOutport('y',float)
+        ic0    = sys1.addBlock(mlib.Constant('ic0',float,0.0,sys1))
+        rOff   = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+        one    = sys1.addBlock(mlib.Constant('one',float,1.0,sys1))
+        down   = sys1.addBlock(mlib.Constant('down',float,-2.0,sys1))
+        limit  = sys1.addBlock(mlib.Constant('limit',float,0.7,sys1))
+        clock1 = sys1.addBlock(mlib.Integrator('clock1',0.01,sys1))
+        int1   = sys1.addBlock(mlib.Integrator('int1',0.01,sys1))
+        rel1   = sys1.addBlock(mlib.Relational('rel1',float,'>',sys1))
+        sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+
+        for iInt in [clock1,int1]:
+            iInt.connectTo('r',rOff.getOutport('y'))
+            iInt.connectTo('IC',ic0.getOutport('y'))
+        clock1.connectTo('uDot',one.getOutport('y'))
+        rel1.connectTo('u0',clock1.getOutport('y'))
+        rel1.connectTo('u1',limit.getOutport('y'))
+        sw1.connectTo('on',down.getOutport('y'))
+        sw1.connectTo('off',one.getOutport('y'))
+        sw1.connectTo('sw',rel1.getOutport('y'))
+        int1.connectTo('uDot',sw1.getOutport('y'))
+        y.connectTo(int1.getOutport('y'))
+        return sys1
+
+    def test_zeroCrossing(self):
+        time     = np.linspace(0.0,1.0,11)
+        simIn    = {'time':time,'u':np.zeros_like(time)}
+        expected = np.where(time <= 0.7,time,2.1 - 2.0 * time)
+
+        # Modes held during a step, the switch is located inside the step:
+        sys1   = self.buildSwitched()
+        simOut = sys1.sim(simIn,variableStep=mHelp.VariableStep())
+        assert np.max(np.abs(simOut['y'] - expected)) < 1e-8
+
+        stats = sys1.getSchedule().getVariableStepStats()
+        assert stats['eventsNo'] == 1
+        assert stats['rejectedNo'] == 0
+        assert stats['stepsNo'] < 10
+
+        # Without events, the switch waits for the end of a step:
+        sys1   = self.buildSwitched()
+        simOut = sys1.sim(simIn,variableStep=mHelp.VariableStep(zeroCrossing=False))
+        assert np.max(np.abs(simOut['y'] - expected)) > 1e-6
+
+    def test_chattering(self):
+        # Relay feedback: x' = 1 while x <= 0.55, -1 above. The event
+        # comes back right after every step
+        sys1   = mlib.Subsystem('relay1',None)
+        u      = sys1.addInport('u',float)
+        y      = sys1.addOutport('y',float)
+        ic0    = sys1.addBlock(mlib.Constant('ic0',float,0.0,sys1))
+        rOff   = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+        up     = sys1.addBlock(mlib.Constant('up',float,1.0,sys1))
+        down   = sys1.addBlock(mlib.Constant('down',float,-1.0,sys1))
+        limit  = sys1.addBlock(mlib.Constant('limit',float,0.55,sys1))
+        int1   = sys1.addBlock(mlib.Integrator('int1',0.01,sys1))
+        rel1   = sys1.addBlock(mlib.Relational('rel1',float,'>',sys1))
+        sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+
+        int1.connectTo('r',rOff.getOutport('y'))
+        int1.connectTo('IC',ic0.getOutport('y'))
+        int1.connectTo('uDot',sw1.getOutport('y'))
+        rel1.connectTo('u0',int1.getOutport('y'))
+        rel1.connectTo('u1',limit.getOutport('y'))
+        sw1.connectTo('on',down.getOutport('y'))
+        sw1.connectTo('off',up.getOutport('y'))
+        sw1.connectTo('sw',rel1.getOutport('y'))
+        y.connectTo(int1.getOutport('y'))
+
+        time  = np.linspace(0.0,1.0,11)
+        simIn = {'time':time,'u':np.zeros_like(time)}
+        with pytest.raises(AssertionError, match='Chattering: 21 consecutive events at t = 0.55'):
+            sys1.sim(simIn,variableStep=mHelp.VariableStep(maxEvents=20))
@@ -0,0 +1,165 @@
+import numpy          as np
+import msim.lib       as mlib
+import msim.helpers   as mHelp
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildBank(aSize, aTs=0.1):
+    # [u]--->[Gain_i]--->[Integrator_i]--->[Delay_i]--->[Sum]--->[y]
+    sys1 = mlib.Subsystem('bank1',None)
+    u    = sys1.addInport('u',float)
+    r    = sys1.addInport('r',bool)
+    y    = sys1.addOutport('y',float)
+
+    ic1  = sys1.addBlock(mlib.Constant('ic1',float,1.0,sys1))
+    sum1 = sys1.addBlock(mlib.Sum('sum1',float,'+' * aSize,sys1))
+    for i in range(aSize):
+        gain1  = sys1.addBlock(mlib.Gain('gain' + str(i),float,float(i),sys1))
+        int1   = sys1.addBlock(mlib.Integrator('int' + str(i),aTs,sys1))
+        delay1 = sys1.addBlock(mlib.Delay('delay' + str(i),float,-1.0,sys1))
+
+        gain1.connectTo('u',u)
+        int1.connectTo('uDot',gain1.getOutport('y'))
+        int1.connectTo('r',r)
+        int1.connectTo('IC',ic1.getOutport('y'))
+        delay1.connectTo('u',int1.getOutport('y'))
+        sum1.connectTo('u' + str(i),delay1.getOutport('y'))
+
+    y.connectTo(sum1.getOutport('y'))
+    return sys1
+
+class Test_StateStore:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,2.0,0.1,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(*time.shape)
+        simIn['r']    = np.zeros_like(time,dtype=bool)
+        simIn['r'][5] = True
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_slots(self):
+        sys1  = buildBank(3)
+        store = sys1.createStateStore()
+
+        assert store.getSlotsNo() == 6
+        assert sorted(store.getState().tolist()) == [-1.0]*3 + [0.0]*3
+
+        slot = store.getSlot(sys1.getSubBlock('delay1'))
+        assert sys1.getSubBlock('delay1').getOutport('y').getValue() == -1.0
+        assert store.getState()[slot] == -1.0
+
+    def test_matchesBlocks(self):
+        simOutBlocks = buildBank(4).sim(self.simIn)
+
+        sys1 = buildBank(4)
+        sys1.createStateStore()
+        simOutStore = sys1.sim(self.simIn)
+
+        isEqual, msg = mHelp.verifyEqual(simOutStore['y'],
+                                         simOutBlocks['y'],
+                                         0.001) # tol
+        assert isEqual, msg
+
+    def test_resetSnapshot(self):
+        sys1     = buildBank(2)
+        store    = sys1.createStateStore()
+        initial  = store.getState()
+
+        first    = sys1.sim(self.simIn)
+        snapshot = store.getState()
+        assert not np.array_equal(snapshot,initial)
+
+        sys1.reset()
+        assert np.array_equal(store.getState(),initial)
+        second   = sys1.sim(self.simIn)
+        assert np.array_equal(first['y'],second['y'])
+
+        store.setState(snapshot)
+        int0 = sys1.getSubBlock('int0')
+        assert int0.getOutport('y').getValue() == snapshot[store.getSlot(int0)]
+
+    def test_batch(self):
+        ts = np.array([0.1,0.2,0.3])
+
+        sys1 = buildBank(2,ts)
+        sys1.createStateStore(lanesNo=3)
+        simOut = sys1.sim(self.simIn,lanesNo=3)
+
+        for j in range(3):
+            laneOut = buildBank(2,ts[j]).sim(self.simIn)
+            isEqual, msg = mHelp.verifyEqual(simOut['y'][:,j],
+                                             laneOut['y'],
+                                             0.001) # tol
+            assert isEqual, msg
+
+    def test_initialAfterRun(self):
+        # Reset restores the block initial values, not the state at the
+        # time the store was created:
+        sys1   = mlib.Subsystem('delay1',None)
+        u      = sys1.addInport('u',float)
+        y      = sys1.addOutport('y',float)
+        delay1 = sys1.addBlock(mlib.Delay('delay1',float,5.0,sys1))
+        delay1.connectTo('u',u)
+        y.connectTo(delay1.getOutport('y'))
+
+        simIn = {'time':np.arange(0.0,0.3,0.1),'u':np.array([1.0,2.0,3.0])}
+        sys1.sim(simIn)
+        store = sys1.createStateStore()
+        assert store.getState()[0] == 3.0
+
+        sys1.reset()
+        assert store.getState()[0] == 5.0
+        assert delay1.getOutport('y').getValue() == 5.0
+
+    def test_types(self):
+        # int/bool states keep their own buffers and exact values:
+        sys1   = mlib.Subsystem('types1',None)
+        u      = sys1.addInport('u',int)
+        b      = sys1.addInport('b',bool)
+        y      = sys1.addOutport('y',int)
+        z      = sys1.addOutport('z',bool)
+        delay1 = sys1.addBlock(mlib.Delay('delay1',int,2**60 + 1,sys1))
+        delay2 = sys1.addBlock(mlib.Delay('delay2',bool,True,sys1))
+        delay1.connectTo('u',u)
+        delay2.connectTo('u',b)
+        y.connectTo(delay1.getOutport('y'))
+        z.connectTo(delay2.getOutport('y'))
+
+        store = sys1.createStateStore()
+        assert store.getSlotsNo() == 0
+        assert delay1.getOutport('y').getValue() == 2**60 + 1
+        assert delay2.getOutport('y').getValue() is True
+
+        simIn  = {'time':np.arange(0.0,0.3,0.1),'u':np.array([1,2,3]) + 2**60,
+                  'b':np.array([False,True,False])}
+        simOut = sys1.sim(simIn)
+        assert simOut['y'].tolist() == [2**60 + 1,2**60 + 1,2**60 + 2]
+        sys1.reset()
+        assert delay1.getOutport('y').getValue() == 2**60 + 1
+
+    def test_recompile(self):
+        # compile() keeps the store and the current state:
+        sys1  = buildBank(2)
+        sys1.createStateStore()
+        sys1.sim(self.simIn)
+        state = sys1.getSchedule().getStateStore().getState()
+
+        schedule = sys1.compile()
+        assert schedule.getStateStore() is not None
+        assert np.array_equal(schedule.getStateStore().getState(),state)
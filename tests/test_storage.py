@@ -0,0 +1,214 @@
+import numpy          as np
+import pytest
+import msim.lib       as mlib
+import msim.compiler  as mComp
+import msim.storage   as mStorage
+
+# -------------------------------------------------------------------------
+# Models
+# -------------------------------------------------------------------------
+
+def buildPlant():
+    # acc1: nested accumulator of 2*u
+    # y = (u > v) xor (v <= 0.5) ? acc1 : u / (v + 1)
+    # z = integral of y (IC 0.5), w = 3*u every 0.05 s, k = int counter
+    sys1   = mlib.Subsystem('plant1',None)
+    u      = sys1.addInport('u',float)
+    v      = sys1.addInport('v',float)
+    y      = sys1.addOutport('y',float)
+    z      = sys1.addOutport('z',float)
+    w      = sys1.addOutport('w',float)
+    k      = sys1.addOutport('k',int)
+
+    acc1   = sys1.addBlock(mlib.Subsystem('acc1',sys1))
+    accU   = acc1.addInport('u',float)
+    accY   = acc1.addOutport('y',float)
+    gain1  = acc1.addBlock(mlib.Gain('gain1',float,2.0,acc1))
+    sum1   = acc1.addBlock(mlib.Sum('sum1',float,'++',acc1))
+    delay1 = acc1.addBlock(mlib.Delay('delay1',float,0.0,acc1))
+    gain1.connectTo('u',accU)
+    sum1.connectTo('u0',gain1.getOutport('y'))
+    sum1.connectTo('u1',delay1.getOutport('y'))
+    delay1.connectTo('u',sum1.getOutport('y'))
+    accY.connectTo(sum1.getOutport('y'))
+    accU.connectTo(u)
+
+    half   = sys1.addBlock(mlib.Constant('half',float,0.5,sys1))
+    one    = sys1.addBlock(mlib.Constant('one',float,-1.0,sys1))
+    rOff   = sys1.addBlock(mlib.Constant('rOff',bool,False,sys1))
+    rel1   = sys1.addBlock(mlib.Relational('rel1',float,'>',sys1))
+    rel2   = sys1.addBlock(mlib.Relational('rel2',float,'<=',sys1))
+    xor1   = sys1.addBlock(mlib.Logical('xor1','xor',sys1))
+    sum2   = sys1.addBlock(mlib.Sum('sum2',float,'+-',sys1))
+    prod1  = sys1.addBlock(mlib.Product('prod1',float,'*/',sys1))
+    sw1    = sys1.addBlock(mlib.Switch('sw1',float,sys1))
+    int1   = sys1.addBlock(mlib.Integrator('int1',0.01,sys1))
+    gain3  = sys1.addBlock(mlib.Gain('gain3',float,3.0,sys1))
+    gain3.setSampleTime(0.05,0.02)
+    gain3.getOutport('y').setValue(0.0)
+
+    rel1.connectTo('u0',u)
+    rel1.connectTo('u1',v)
+    rel2.connectTo('u0',v)
+    rel2.connectTo('u1',half.getOutport('y'))
+    xor1.connectTo('u0',rel1.getOutport('y'))
+    xor1.connectTo('u1',rel2.getOutport('y'))
+    sum2.connectTo('u0',v)
+    sum2.connectTo('u1',one.getOutport('y'))
+    prod1.connectTo('u0',u)
+    prod1.connectTo('u1',sum2.getOutport('y'))
+    sw1.connectTo('on',accY)
+    sw1.connectTo('off',prod1.getOutport('y'))
+    sw1.connectTo('sw',xor1.getOutport('y'))
+    int1.connectTo('r',rOff.getOutport('y'))
+    int1.connectTo('IC',half.getOutport('y'))
+    int1.connectTo('uDot',sw1.getOutport('y'))
+    gain3.connectTo('u',u)
+
+    # Integer counter: k = k + 2*3
+    cInt   = sys1.addBlock(mlib.Constant('cInt',int,3,sys1))
+    gInt   = sys1.addBlock(mlib.Gain('gInt',int,2,sys1))
+    sumInt = sys1.addBlock(mlib.Sum('sumInt',int,'++',sys1))
+    dInt   = sys1.addBlock(mlib.Delay('dInt',int,1,sys1))
+    gInt.connectTo('u',cInt.getOutport('y'))
+    sumInt.connectTo('u0',gInt.getOutport('y'))
+    sumInt.connectTo('u1',dInt.getOutport('y'))
+    dInt.connectTo('u',sumInt.getOutport('y'))
+
+    y.connectTo(sw1.getOutport('y'))
+    z.connectTo(int1.getOutport('y'))
+    w.connectTo(gain3.getOutport('y'))
+    k.connectTo(sumInt.getOutport('y'))
+    return sys1
+
+class MyGain(mlib.Gain):
+    # Block type the storage does not know
+    def __init__(self,aName,aType,aGain,aParent):
+        mlib.Gain.__init__(self,aName,aType,aGain,aParent)
+        self._blockType = 'MyGain'
+
+class Test_storage:
+    def setup_class(self):
+        # Class setup:
+        time  = np.arange(0.0,5.0,0.01,dtype=float)
+        simIn = dict()
+        simIn['time'] = time
+        simIn['u']    = np.random.rand(len(time))
+        simIn['v']    = np.random.rand(len(time))
+        self.simIn    = simIn
+
+    def teardown_class(self):
+        # Class teardown:
+        pass
+
+    def setup(self):
+        # Method setup:
+        pass
+
+    def teardown(self):
+        # Method teardown:
+        pass
+
+    def test_roundTrip(self, tmp_path, monkeypatch):
+        aPath = str(tmp_path / 'plant1.npz')
+        sys1  = buildPlant()
+        sys1.compile()
+        mStorage.saveModel(sys1,aPath)
+
+        # The saved order is used, no sort:
+        def sortBlocks(*args):
+            raise RuntimeError('Sorted again')
+        monkeypatch.setattr(mComp,'sortBlocks',sortBlocks)
+        sys2 = mStorage.loadModel(aPath)
+        monkeypatch.undo()
+
+        assert sys2._schedule is not None
+        names = [iBlock.getName() for iBlock in sys2.getSchedule().getExecuteList()]
+        assert names == [iBlock.getName() for iBlock in sys1.getSchedule().getExecuteList()]
+        assert sys2.getSubBlock('gain3').getSampleTime() == (0.05,0.02)
+        assert sys2.getSubBlock('acc1').getSampleTime() is None
+        assert sys2.getOutport('k').getType() is int
+
+        expected = buildPlant().sim(self.simIn)
+        simOut   = sys2.sim(self.simIn)
+        for aName in ['y','z','w','k']:
+            assert np.array_equal(simOut[aName],expected[aName])
+
+    def test_state(self, tmp_path):
+        # States and outputs are saved with their current values:
+        aPath = str(tmp_path / 'plant1.npz')
+        sys1  = buildPlant()
+        sys1.sim(self.simIn)
+        mStorage.saveModel(sys1,aPath)
+        sys2  = mStorage.loadModel(aPath)
+
+        for aName in ['int1','dInt','gain3']:
+            aValue = sys2.getSubBlock(aName).getOutport('y').getValue()
+            assert aValue == sys1.getSubBlock(aName).getOutport('y').getValue()
+        assert type(sys2.getSubBlock('dInt').getOutport('y').getValue()) is int
+        assert sys2.getSubBlock('acc1').getSubBlock('delay1').getOutport('y').getValue() == \
+               sys1.getSubBlock('acc1').getSubBlock('delay1').getOutport('y').getValue()
+
+        # Not compiled: stays uncompiled
+        mStorage.saveModel(buildPlant(),aPath)
+        assert mStorage.loadModel(aPath)._schedule is None
+
+    def test_memmap(self, tmp_path):
+        aPath = str(tmp_path / 'gains.npz')
+        gains = np.random.rand(20000)
+        sys1  = mlib.Subsystem('gains1',None)
+        u     = sys1.addInport('u',float)
+        y     = sys1.addOutport('y',float)
+        gain1 = sys1.addBlock(mlib.Gain('gain1',float,gains,sys1))
+        gain1.connectTo('u',u)
+        y.connectTo(gain1.getOutport('y'))
+        sys1.compile(optimize=True)
+        mStorage.saveModel(sys1,aPath)
+
+        sys2  = mStorage.loadModel(aPath)
+        gain2 = sys2.getSubBlock('gain1')
+        assert isinstance(gain2._gain,np.memmap)
+        assert np.array_equal(gain2._gain,gains)
+        assert sys2._compileOptions == {'optimize':True}
+        assert sys2._schedule.getOptimization() is not None
+
+        sys2.getInport('u').connectTo(mlib.Constant('c1',float,2.0,None).getOutport('y'))
+        sys2.execute()
+        assert np.array_equal(sys2.getOutport('y').getValue(),2.0 * gains)
+
+        sys3 = mStorage.loadModel(aPath,mmap=False)
+        assert not isinstance(sys3.getSubBlock('gain1')._gain,np.memmap)
+
+    def test_options(self, tmp_path):
+        aPath = str(tmp_path / 'plant1.npz')
+
+        # Loops are solved again on load:
+        sys1  = buildPlant()
+        sys1.compile(solveLoops=True)
+        mStorage.saveModel(sys1,aPath)
+        sys2  = mStorage.loadModel(aPath)
+        assert sys2._compileOptions == {'solveLoops':True}
+        assert sys2._schedule is not None
+
+        # Blocks created with another parent, rewiring after load:
+        sys1  = mlib.Subsystem('loose1',None)
+        u     = sys1.addInport('u',float)
+        v     = sys1.addInport('v',float)
+        y     = sys1.addOutport('y',float)
+        gain1 = sys1.addBlock(mlib.Gain('gain1',float,2.0,None))
+        gain2 = sys1.addBlock(mlib.Gain('gain2',float,3.0,None))
+        gain2.connectTo('u',gain1.getInport('u'))
+        gain1.connectTo('u',u)
+        y.connectTo(gain2.getOutport('y'))
+        mStorage.saveModel(sys1,aPath)
+        sys2  = mStorage.loadModel(aPath)
+        assert sys2.getSubBlock('gain1')._parent is sys2
+
+        sys2.getSubBlock('gain2').connectTo('u',sys2.getInport('v'))
+        sys2.getSubBlock('gain1').connectTo('u',sys2.getOutport('y'))
+        assert sys2.getSubBlock('gain2').getInport('u').getRoot() is sys2.getInport('v')
+
+        sys1 = mlib.Subsystem('custom1',None)
+        sys1.addBlock(MyGain('gain1',float,2.0,sys1))
+        with pytest.raises(AssertionError, match='Cannot save'):
+            mStorage.saveModel(sys1,aPath)